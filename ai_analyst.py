@@ -1,27 +1,79 @@
-import google.generativeai as genai
+import hashlib
 import logging
 import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from config import DATABASE_FILE_PATH, GEMINI_MODEL_NAME, AI_REQUESTS_PER_MINUTE, AI_MAX_WORKERS
+from database import get_connection
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger()
 
-def analyze_stock_with_gemini(symbol, fundamental_data, api_key):
+# Bump whenever build_prompt changes so cached analyses of the old prompt are not reused
+PROMPT_VERSION = 1
+
+ANALYSIS_UPSERT = '''
+    INSERT INTO ai_analyses (key, symbol, model, prompt_version, analysis)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(key) DO UPDATE SET
+        analysis = excluded.analysis,
+        created_at = CURRENT_TIMESTAMP
+'''
+
+
+class GeminiClient:
     """
-    Analyzes stock fundamentals using Google Gemini model.
+    Google Gemini model configured once and reused for every request.
+
+    Any object with a generate(prompt) method returning text can be passed as client
+    instead, e.g. a local stub in tests.
     """
-    if not api_key:
-        return "⚠️ Please provide a Gemini API Key in the sidebar to use AI features."
 
-    try:
+    def __init__(self, api_key, model_name=GEMINI_MODEL_NAME):
+        import google.generativeai as genai
+
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-flash-latest') # Using Gemini Flash Latest
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
 
-        # Construct Prompt
-        metrics_str = json.dumps(fundamental_data, indent=2)
-        prompt = f"""
+@lru_cache(maxsize=None)
+def get_client(api_key, model_name=GEMINI_MODEL_NAME):
+    # One client per key and model for the whole process
+    return GeminiClient(api_key, model_name)
+
+
+class RateLimiter:
+    """Spaces calls at least 60 / requests_per_minute seconds apart across threads."""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def build_prompt(symbol, fundamental_data):
+    # Construct Prompt
+    metrics_str = json.dumps(fundamental_data, indent=2)
+    return f"""
         Act as a professional financial analyst. I will provide you with fundamental data for a stock.
-        
+
         Stock Symbol: {symbol}
         Data:
         {metrics_str}
@@ -30,13 +82,109 @@ def analyze_stock_with_gemini(symbol, fundamental_data, api_key):
         1. A brief "Fundamental Strength" summary (3-4 bullet points).
         2. Key Risks (if any).
         3. A "Value Verdict": [Undervalued / Fairly Valued / Overvalued] based on P/E, P/B vs general industry standards.
-        
+
         Keep it concise and actionable for a trader looking for breakout candidates.
         """
 
-        response = model.generate_content(prompt)
-        return response.text
 
+def analysis_key(symbol, fundamental_data, model_name=GEMINI_MODEL_NAME, prompt_version=PROMPT_VERSION):
+    # Same symbol, same fundamentals, same prompt and model -> same analysis
+    payload = json.dumps([symbol, fundamental_data, prompt_version, model_name], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_cached_analyses(requests, model_name=GEMINI_MODEL_NAME, db_path=None):
+    # Stored analyses for {symbol: fundamental_data}: {symbol: analysis}, misses left out
+    keys = {analysis_key(symbol, data, model_name): symbol for symbol, data in requests.items()}
+    if not keys:
+        return {}
+    cursor = get_connection(db_path or DATABASE_FILE_PATH).cursor()
+    cursor.execute(f"SELECT key, analysis FROM ai_analyses WHERE key IN ({', '.join('?' * len(keys))})",
+                   list(keys))
+    return {keys[key]: analysis for key, analysis in cursor.fetchall()}
+
+
+def store_analysis(conn, symbol, fundamental_data, analysis, model_name=GEMINI_MODEL_NAME):
+    conn.execute(ANALYSIS_UPSERT, (analysis_key(symbol, fundamental_data, model_name), symbol, model_name,
+                                   PROMPT_VERSION, analysis))
+    conn.commit()
+
+
+def analysis_failed(analysis):
+    # The warning and error messages returned in place of an analysis
+    return analysis.startswith(('⚠️', '❌'))
+
+
+def analyze_stock_with_gemini(symbol, fundamental_data, api_key, client=None, model_name=GEMINI_MODEL_NAME,
+                              db_path=None, refresh=False):
+    """
+    Analyzes stock fundamentals using Google Gemini model.
+
+    A stored analysis of the same payload is returned without calling the model unless refresh is set,
+    in which case a new one is generated and replaces it.
+    """
+    if not refresh:
+        cached = load_cached_analyses({symbol: fundamental_data}, model_name, db_path).get(symbol)
+        if cached is not None:
+            return cached
+
+    if client is None and not api_key:
+        return "⚠️ Please provide a Gemini API Key in the sidebar to use AI features."
+
+    try:
+        client = client or get_client(api_key, model_name)
+        analysis = client.generate(build_prompt(symbol, fundamental_data))
     except Exception as e:
         logger.error(f"Gemini AI Error: {str(e)}")
         return f"❌ AI Analysis Failed: {str(e)}"
+
+    try:
+        store_analysis(get_connection(db_path or DATABASE_FILE_PATH), symbol, fundamental_data, analysis, model_name)
+    except sqlite3.Error as e:
+        logger.error(f"Error storing AI analysis for {symbol}: {e}")
+    return analysis
+
+
+def analyze_many(requests, api_key, client=None, model_name=GEMINI_MODEL_NAME, db_path=None,
+                 max_workers=AI_MAX_WORKERS, requests_per_minute=AI_REQUESTS_PER_MINUTE, progress_callback=None):
+    # Batch mode for {symbol: fundamental_data}. Cached analyses are returned straight away, the rest
+    # run concurrently under the rate limit and are stored from this thread as they finish.
+    # Returns {symbol: analysis or error message}; progress_callback(done, total, symbol) per symbol.
+    results = load_cached_analyses(requests, model_name, db_path)
+    pending = [symbol for symbol in requests if symbol not in results]
+    logger.info(f"AI analyses: {len(results)} of {len(requests)} cached, {len(pending)} to request")
+    if not pending:
+        return results
+
+    if client is None and not api_key:
+        results.update({symbol: "⚠️ Please provide a Gemini API Key in the sidebar to use AI features."
+                        for symbol in pending})
+        return results
+
+    client = client or get_client(api_key, model_name)
+    limiter = RateLimiter(requests_per_minute)
+    conn = get_connection(db_path or DATABASE_FILE_PATH)
+
+    def generate(symbol):
+        limiter.wait()
+        return client.generate(build_prompt(symbol, requests[symbol]))
+
+    done = len(results)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(generate, symbol): symbol for symbol in pending}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                results[symbol] = future.result()
+            except Exception as e:
+                logger.error(f"Gemini AI Error for {symbol}: {str(e)}")
+                results[symbol] = f"❌ AI Analysis Failed: {str(e)}"
+            else:
+                try:
+                    store_analysis(conn, symbol, requests[symbol], results[symbol], model_name)
+                except sqlite3.Error as e:
+                    logger.error(f"Error storing AI analysis for {symbol}: {e}")
+            done += 1
+            if progress_callback:
+                progress_callback(done, len(requests), symbol)
+    return results
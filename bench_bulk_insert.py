@@ -0,0 +1,77 @@
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from multi_year_breakout import HISTORICAL_DATA_UPSERT, frame_to_rows
+
+# Roughly 15 years of trading days per symbol
+ROWS_PER_SYMBOL = 3700
+SYMBOLS = 20
+
+
+def create_table(conn):
+    conn.execute('''
+        CREATE TABLE historical_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            date DATE,
+            high REAL,
+            low REAL,
+            close REAL,
+            adjusted_close REAL,
+            volume INTEGER,
+            UNIQUE(symbol, date)
+        )
+    ''')
+
+
+def synthetic_frame(rows, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(rows).cumsum()
+    return pd.DataFrame({
+        'High': close + 1,
+        'Low': close - 1,
+        'Close': close,
+        'Adj Close': close,
+        'Volume': rng.integers(1000, 100000, rows),
+    }, index=pd.bdate_range('2010-01-01', periods=rows))
+
+
+def store_iterrows(cursor, symbol, df):
+    # The previous row-by-row path
+    for index, row in df.iterrows():
+        cursor.execute(HISTORICAL_DATA_UPSERT, (symbol, index.date(), row['High'], row['Low'], row['Close'],
+                                                row['Adj Close'], row['Volume']))
+
+
+def store_executemany(cursor, symbol, df):
+    cursor.executemany(HISTORICAL_DATA_UPSERT, frame_to_rows(symbol, df))
+
+
+def run(store, frames):
+    conn = sqlite3.connect(':memory:')
+    create_table(conn)
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    for symbol, df in frames.items():
+        store(cursor, symbol, df)
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    rows = conn.execute('SELECT COUNT(*) FROM historical_data').fetchone()[0]
+    conn.close()
+    return elapsed, rows
+
+
+if __name__ == "__main__":
+    frames = {f"SYM{i}": synthetic_frame(ROWS_PER_SYMBOL, i) for i in range(SYMBOLS)}
+
+    old_time, old_rows = run(store_iterrows, frames)
+    new_time, new_rows = run(store_executemany, frames)
+    assert old_rows == new_rows
+
+    print(f"{SYMBOLS} symbols x {ROWS_PER_SYMBOL} rows")
+    print(f"iterrows + execute: {old_time:.3f}s ({old_time / SYMBOLS * 1000:.1f} ms/symbol)")
+    print(f"executemany:        {new_time:.3f}s ({new_time / SYMBOLS * 1000:.1f} ms/symbol)")
+    print(f"speedup:            {old_time / new_time:.1f}x")
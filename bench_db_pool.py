@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import database
+
+# One breakout scan reads every symbol's history once
+SYMBOLS = 500
+BARS = 250
+QUERY = '''
+    SELECT date, high, low, close, volume FROM historical_data
+    WHERE symbol = ? AND date BETWEEN ? AND ?
+    ORDER BY date
+'''
+
+
+def create_fixture(path):
+    conn = database.connect(path)
+    database.migrate(conn)
+    dates = pd.bdate_range('2024-01-01', periods=BARS).strftime('%Y-%m-%d')
+    conn.executemany('INSERT INTO historical_data (symbol, date, high, low, close, adjusted_close, volume) '
+                     'VALUES (?, ?, 1, 1, 1, 1, 1)',
+                     [(f"SYM{i}", date) for i in range(SYMBOLS) for date in dates])
+    conn.commit()
+    conn.close()
+
+
+def read_with_new_connections(path):
+    # The previous pattern: connect, query, close for every symbol
+    for i in range(SYMBOLS):
+        conn = sqlite3.connect(path)
+        try:
+            pd.read_sql_query(QUERY, conn, params=(f"SYM{i}", '2024-01-01', '2025-12-31'))
+        finally:
+            conn.close()
+
+
+def read_with_pooled_connection(path):
+    for i in range(SYMBOLS):
+        pd.read_sql_query(QUERY, database.get_connection(path), params=(f"SYM{i}", '2024-01-01', '2025-12-31'))
+
+
+def rerun_script(path, reruns):
+    # Streamlit runs every rerun on a new thread, each reading one symbol
+    for i in range(reruns):
+        thread = threading.Thread(target=lambda: pd.read_sql_query(
+            QUERY, database.get_connection(path), params=(f"SYM{i}", '2024-01-01', '2025-12-31')))
+        thread.start()
+        thread.join()
+
+
+def rerun_in_session(path, reruns):
+    # The same reruns inside one Streamlit session
+    from streamlit.testing.v1 import AppTest
+
+    def script(path):
+        import streamlit as st
+
+        import bench_db_pool
+        i = st.session_state.setdefault('rerun', 0)
+        st.session_state['rerun'] = i + 1
+        bench_db_pool.pd.read_sql_query(bench_db_pool.QUERY, bench_db_pool.database.get_connection(path),
+                                        params=(f"SYM{i}", '2024-01-01', '2025-12-31'))
+
+    app = AppTest.from_function(script, args=(path,))
+    for _ in range(reruns):
+        app.run()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        create_fixture(path)
+
+        start = time.perf_counter()
+        read_with_new_connections(path)
+        per_call_time = time.perf_counter() - start
+
+        database.get_connection(path)  # Open and migrate outside the timing
+        database.reset_db_stats()
+        start = time.perf_counter()
+        read_with_pooled_connection(path)
+        pooled_time = time.perf_counter() - start
+        stats = database.get_db_stats()
+        database.close_connections()
+
+        reruns = 50
+        database.reset_db_stats()
+        rerun_script(path, reruns)
+        thread_opened = database.get_db_stats()['connections_opened']
+        rerun_in_session(path, reruns)
+        session_opened = database.get_db_stats()['connections_opened'] - thread_opened
+
+    print(f"{SYMBOLS} symbols x {BARS} bars")
+    print(f"connection per call: {per_call_time:.3f}s ({SYMBOLS} connections opened)")
+    print(f"pooled connection:   {pooled_time:.3f}s ({stats['connections_opened']} opened, "
+          f"{stats['queries']} queries in {stats['query_seconds']:.3f}s)")
+    print(f"speedup: {per_call_time / pooled_time:.1f}x")
+    print(f"{reruns} Streamlit reruns: {thread_opened} connections per thread, {session_opened} per session")
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+# Modules each tab imports before it can render, on top of main.py itself
+TAB_IMPORTS = {
+    'Display Watchlist': ['logging_utils', 'watchlist_display', 'watchlist_management'],
+    'Manage Watchlists': ['pickle', 'streamlit_authenticator', 'watchlist_management'],
+    'Multi Year Breakout Stocks': ['pandas', 'multi_year_breakout'],
+}
+# Cold-start import budget per tab (time to first render is dominated by imports)
+FIRST_RENDER_BUDGET_SECONDS = {
+    'Display Watchlist': 1.3,
+    'Manage Watchlists': 1.6,
+    'Multi Year Breakout Stocks': 1.3,
+}
+# Must not be imported by main.py or the Display Watchlist tab
+LAZY_MODULES = ['yfinance', 'streamlit_authenticator', 'multi_year_breakout', 'google.generativeai', 'apscheduler']
+SLOWEST_SHOWN = 8
+
+
+def import_times(modules):
+    # Run `python -X importtime` in a fresh interpreter and return {module: (self_us, cumulative_us, depth)}
+    code = '; '.join(['import main'] + [f'import {module}' for module in modules])
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return times
+
+
+if __name__ == "__main__":
+    over_budget = []
+    for tab, modules in TAB_IMPORTS.items():
+        times = import_times(modules)
+        # Top-level entries already include everything they import
+        total = sum(cumulative for _, cumulative, depth in times.values() if depth == 0) / 1e6
+        budget = FIRST_RENDER_BUDGET_SECONDS[tab]
+        print(f"{tab}: {total:.3f}s of imports (budget {budget:.1f}s)")
+        top_level = sorted(((cumulative, name) for name, (_, cumulative, depth) in times.items() if depth == 0),
+                           reverse=True)
+        for cumulative, name in top_level[:SLOWEST_SHOWN]:
+            print(f"    {cumulative / 1e6:.3f}s  {name}")
+        if tab == 'Display Watchlist':
+            loaded = [module for module in LAZY_MODULES if module in times]
+            if loaded:
+                print(f"    eagerly imported: {', '.join(loaded)}")
+                over_budget.append(tab)
+        if total > budget:
+            over_budget.append(tab)
+
+    if over_budget:
+        print(f"Over budget: {', '.join(dict.fromkeys(over_budget))}")
+        sys.exit(1)
@@ -0,0 +1,71 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from database import close_connections, get_connection
+from parquet_store import export_parquet, import_parquet, read_prices
+
+# Roughly 15 years of trading days per symbol; pass a smaller symbol count for a quick run
+ROWS_PER_SYMBOL = 3700
+SYMBOLS = 2000
+
+
+def create_source(db_path, symbols):
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range(end='2025-12-31', periods=ROWS_PER_SYMBOL).strftime('%Y-%m-%d')
+    conn = get_connection(db_path)
+    for i in range(symbols):
+        close = 100 + rng.standard_normal(ROWS_PER_SYMBOL).cumsum()
+        conn.executemany('''
+            INSERT INTO historical_data (symbol, date, high, low, close, adjusted_close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', zip([f"SYM{i:04d}"] * ROWS_PER_SYMBOL, dates, (close + 1).tolist(), (close - 1).tolist(),
+                 close.tolist(), close.tolist(), [1000] * ROWS_PER_SYMBOL))
+        conn.execute('INSERT INTO cache_info (symbol, last_updated, history_start) VALUES (?, ?, ?)',
+                     (f"SYM{i:04d}", '2025-12-31 16:00:00', dates[0]))
+    conn.commit()
+
+
+def timed(label, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    print(f"{label:<40} {time.perf_counter() - start:7.2f}s")
+    return result
+
+
+if __name__ == "__main__":
+    symbols = int(sys.argv[1]) if len(sys.argv) > 1 else SYMBOLS
+    workdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(workdir, 'source.db')
+        directory = os.path.join(workdir, 'export')
+        timed(f"build source ({symbols} x {ROWS_PER_SYMBOL} rows)", create_source, source, symbols)
+
+        timed("full export by year", export_parquet, source, directory, 'year', full=True)
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory)
+                   for name in names)
+        print(f"{'export size':<40} {size / 2 ** 20:7.1f} MiB (SQLite {os.path.getsize(source) / 2 ** 20:.1f} MiB)")
+
+        conn = sqlite3.connect(source)
+        conn.execute("INSERT INTO historical_data (symbol, date, close) VALUES ('SYM0000', '2026-01-02', 1.0)")
+        conn.commit()
+        conn.close()
+        timed("incremental export (one new bar)", export_parquet, source, directory, 'year')
+
+        timed("read 1 symbol, 1 year, close only", read_prices, directory, ['date', 'close'], ['SYM0001'],
+              '2024-01-01', '2024-12-31')
+        timed("read all symbols, 1 year, close only", read_prices, directory, ['symbol', 'date', 'close'], None,
+              '2024-01-01', '2024-12-31')
+
+        target = os.path.join(workdir, 'target.db')
+        get_connection(target)
+        timed("seed empty database from export", import_parquet, directory, target)
+    finally:
+        close_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
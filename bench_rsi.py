@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from get_nse_data import calculate_rsi, rsi_matrix
+
+# One watchlist refresh: ~1,000 calendar days (about 700 bars) of closes per symbol
+ROWS = 700
+SYMBOLS = 100
+PERIOD = 14
+
+
+def loop_rsi(close, period=PERIOD):
+    # The previous per-bar implementation
+    delta = close.diff()
+    gains = delta.where(delta > 0, 0)
+    losses = -delta.where(delta < 0, 0)
+    avg_gains = gains.iloc[:period].mean()
+    avg_losses = losses.iloc[:period].mean()
+    rs_values = []
+    for i in range(period, len(gains)):
+        avg_gains = (avg_gains * (period - 1) + gains.iloc[i]) / period
+        avg_losses = (avg_losses * (period - 1) + losses.iloc[i]) / period
+        rs_values.append(100 - (100 / (1 + avg_gains / avg_losses)))
+    return pd.Series(rs_values, index=close.index[period:])
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    closes = pd.DataFrame(100 + rng.standard_normal((ROWS, SYMBOLS)).cumsum(axis=0),
+                          index=pd.bdate_range('2021-01-01', periods=ROWS),
+                          columns=[f"SYM{i}" for i in range(SYMBOLS)])
+
+    start = time.perf_counter()
+    loop = {symbol: loop_rsi(closes[symbol]) for symbol in closes.columns}
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = {symbol: calculate_rsi(closes[[symbol]].rename(columns={symbol: 'Close'}))
+                  for symbol in closes.columns}
+    series_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = rsi_matrix(closes)
+    matrix_time = time.perf_counter() - start
+
+    for symbol in closes.columns:
+        np.testing.assert_allclose(vectorized[symbol], loop[symbol], rtol=1e-9)
+        np.testing.assert_allclose(matrix[symbol].iloc[PERIOD:], loop[symbol], rtol=1e-9)
+
+    print(f"{SYMBOLS} symbols x {ROWS} bars")
+    print(f"loop (per symbol):       {loop_time:.3f}s ({loop_time / SYMBOLS * 1000:.2f} ms/symbol)")
+    print(f"vectorized (per symbol): {series_time:.3f}s ({series_time / SYMBOLS * 1000:.2f} ms/symbol)")
+    print(f"rsi_matrix (all at once): {matrix_time:.3f}s")
+    print(f"speedup: {loop_time / series_time:.1f}x per symbol, {loop_time / matrix_time:.1f}x as a matrix")
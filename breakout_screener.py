@@ -0,0 +1,304 @@
+import logging
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config import DATABASE_FILE_PATH
+from price_store import get_price_store, to_day_number
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+SCREEN_COLUMNS = ['historical_high', 'historical_high_with_buffer', 'previous_high', 'current_price',
+                  'current_price_with_buffer', 'is_breakout']
+
+
+def load_price_matrix(symbols, start_date, end_date, store=None):
+    # Align the universe on one date axis: returns (day numbers, {column: dates x symbols matrix}).
+    # Days a symbol has no stored row are NaN.
+    store = store or get_price_store(db_path=DATABASE_FILE_PATH)
+    universe = store.load_universe(list(symbols), start_date, end_date)
+
+    days = np.unique(np.concatenate([columns['date'] for columns in universe.values()] or [np.array([], np.int32)]))
+    matrix = {name: np.full((len(days), len(symbols)), np.nan) for name in ('high', 'close')}
+    for j, symbol in enumerate(symbols):
+        columns = universe.get(symbol)
+        if columns is None or len(columns['date']) == 0:
+            continue
+        rows = np.searchsorted(days, columns['date'])
+        for name in matrix:
+            matrix[name][rows, j] = columns[name]
+    return days, matrix
+
+
+def window_max(values, lo, hi):
+    # Column-wise max over rows [lo, hi), NaN where the window has no data
+    if hi <= lo:
+        return np.full(values.shape[1], np.nan)
+    window = values[lo:hi]
+    result = np.where(np.isnan(window), -np.inf, window).max(axis=0)
+    result[np.isneginf(result)] = np.nan
+    return result
+
+
+def last_valid(values, lo, hi):
+    # Column-wise last non-NaN value in rows [lo, hi)
+    result = np.full(values.shape[1], np.nan)
+    if hi <= lo:
+        return result
+    valid = ~np.isnan(values[lo:hi])
+    has_value = valid.any(axis=0)
+    last_row = lo + (hi - lo - 1) - np.argmax(valid[::-1], axis=0)
+    result[has_value] = values[last_row[has_value], np.flatnonzero(has_value)]
+    return result
+
+
+def screen_matrix(symbols, days, matrix, years_gap=5, buffer=0.05, weeks_back=0, current_date=None):
+    # Multi-year breakout rule for every symbol at once, same windows as compute_breakout_metrics
+    current_date = current_date or datetime.today()
+    end_date = current_date - timedelta(days=current_date.weekday() + 1 + (weeks_back * 7))  # Exclude current week
+    gap_start = current_date - timedelta(days=365 * years_gap)
+    current_week_start = current_date - timedelta(days=current_date.weekday() + (weeks_back * 7))
+
+    # A stored day D compares against a timestamp T like D >= ceil(T) and D <= floor(T)
+    end_row = np.searchsorted(days, to_day_number(end_date), side='right')
+    gap_row = np.searchsorted(days, to_day_number(gap_start, round_up=True), side='left')
+    end_exclusive_row = np.searchsorted(days, to_day_number(end_date, round_up=True), side='left')
+    week_row = np.searchsorted(days, to_day_number(current_week_start, round_up=True), side='left')
+    today_row = np.searchsorted(days, to_day_number(current_date), side='right')
+
+    high, close = matrix['high'], matrix['close']
+    has_row = ~(np.isnan(high) & np.isnan(close))
+    enough_data = has_row[:end_row].sum(axis=0) >= 2
+
+    historical_high = window_max(high, gap_row, min(end_exclusive_row, end_row))
+    previous_high = window_max(high, 0, min(gap_row, end_row))
+    current_price = last_valid(close, week_row, today_row)
+
+    historical_high_with_buffer = historical_high * (1 - buffer)
+    current_price_with_buffer = current_price * (1 + buffer)
+    with np.errstate(invalid='ignore'):
+        is_breakout = (historical_high_with_buffer < previous_high) & (current_price_with_buffer > previous_high)
+
+    result = pd.DataFrame({
+        'historical_high': historical_high,
+        'historical_high_with_buffer': historical_high_with_buffer,
+        'previous_high': previous_high,
+        'current_price': current_price,
+        'current_price_with_buffer': current_price_with_buffer,
+        'is_breakout': is_breakout & enough_data,
+    }, index=pd.Index(list(symbols), name='symbol'))
+
+    # Same as the per-symbol path: no metrics when there is not enough history
+    result.loc[~enough_data, SCREEN_COLUMNS[:-1]] = np.nan
+    return result
+
+
+def screen_breakouts(symbols, years_gap=5, buffer=0.05, weeks_back=0, current_date=None, store=None):
+    # Load the universe once and evaluate the breakout rule for all symbols with NumPy reductions.
+    # Returns (breakout symbols, metrics frame indexed by symbol).
+    current_date = current_date or datetime.today()
+    symbols = list(dict.fromkeys(symbols))
+
+    started = time.perf_counter()
+    days, matrix = load_price_matrix(symbols, current_date - timedelta(days=365 * (years_gap + 10)), current_date,
+                                     store=store)
+    loaded = time.perf_counter()
+    result = screen_matrix(symbols, days, matrix, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back,
+                           current_date=current_date)
+    logger.info(f"Screened {len(symbols)} symbols x {len(days)} days: load {loaded - started:.3f}s, "
+                f"compute {time.perf_counter() - loaded:.3f}s")
+
+    return list(result.index[result['is_breakout']]), result
+
+
+def windows_max(values, lo, hi):
+    # Column-wise max for many row windows [lo[k], hi[k]) in one np.maximum.reduceat call.
+    # Returns a (windows x symbols) array, NaN for empty windows.
+    filled = np.vstack([np.where(np.isnan(values), -np.inf, values), np.full((1, values.shape[1]), -np.inf)])
+    lo, hi = np.asarray(lo), np.asarray(hi)
+    bounds = np.empty(2 * len(lo), dtype=np.intp)
+    bounds[0::2] = lo
+    bounds[1::2] = hi
+    result = np.maximum.reduceat(filled, bounds, axis=0)[0::2]
+    result[hi <= lo] = -np.inf
+    result[np.isneginf(result)] = np.nan
+    return result
+
+
+def sweep_matrix(days, matrix, years_gap=5, buffer=0.05, weeks=52, current_date=None, as_of=False):
+    # Breakout metrics for every week in one pass, each returned as a (weeks x symbols) array.
+    # Row k matches screen_matrix with weeks_back=k, or with as_of=True, screen_matrix run on the
+    # date k weeks before current_date.
+    current_date = current_date or datetime.today()
+    high, close = matrix['high'], matrix['close']
+    has_row = ~(np.isnan(high) & np.isnan(close))
+    row_count = np.vstack([np.zeros((1, high.shape[1]), dtype=np.int64), np.cumsum(has_row, axis=0)])
+    # Row of the latest close at or before each row
+    last_close_row = np.maximum.accumulate(np.where(~np.isnan(close), np.arange(len(days))[:, None], -1), axis=0)
+
+    def rows(dates, side, round_up=False):
+        return np.searchsorted(days, [to_day_number(date, round_up=round_up) for date in dates], side=side)
+
+    offsets = range(weeks)
+    if as_of:
+        anchors = [current_date - timedelta(days=7 * k) for k in offsets]
+        weekday_offsets = [0] * weeks
+    else:
+        anchors = [current_date] * weeks
+        weekday_offsets = [7 * k for k in offsets]
+
+    end_dates = [a - timedelta(days=a.weekday() + 1 + w) for a, w in zip(anchors, weekday_offsets)]
+    week_starts = [a - timedelta(days=a.weekday() + w) for a, w in zip(anchors, weekday_offsets)]
+    load_row = rows([a - timedelta(days=365 * (years_gap + 10)) for a in anchors], 'left', round_up=True)
+    gap_row = rows([a - timedelta(days=365 * years_gap) for a in anchors], 'left', round_up=True)
+    end_row = rows(end_dates, 'right')
+    end_exclusive_row = np.minimum(rows(end_dates, 'left', round_up=True), end_row)
+    week_row = rows(week_starts, 'left', round_up=True)
+    today_row = rows(anchors, 'right')
+
+    enough_data = (row_count[end_row] - row_count[load_row]) >= 2
+
+    if as_of:
+        # Sliding windows: one reduceat over all week windows
+        historical_high = windows_max(high, gap_row, end_exclusive_row)
+        previous_high = windows_max(high, load_row, np.minimum(gap_row, end_row))
+    else:
+        # Windows share their start, so cumulative maxima answer every week at once
+        filled = np.where(np.isnan(high), -np.inf, high)
+        gap = gap_row[0]
+        from_gap = np.maximum.accumulate(filled[gap:], axis=0) if len(filled) > gap else np.empty((0, high.shape[1]))
+        from_start = np.maximum.accumulate(filled, axis=0)
+        historical_high = np.full((weeks, high.shape[1]), np.nan)
+        previous_high = np.full((weeks, high.shape[1]), np.nan)
+        for k in offsets:
+            if end_exclusive_row[k] > gap:
+                historical_high[k] = from_gap[end_exclusive_row[k] - 1 - gap]
+            if min(gap, end_row[k]) > 0:
+                previous_high[k] = from_start[min(gap, end_row[k]) - 1]
+        historical_high[np.isneginf(historical_high)] = np.nan
+        previous_high[np.isneginf(previous_high)] = np.nan
+
+    # Latest close inside [week start, anchor]
+    current_price = np.full((weeks, high.shape[1]), np.nan)
+    if len(days):
+        latest_row = last_close_row[np.maximum(today_row - 1, 0)]
+        in_week = (latest_row >= week_row[:, None]) & (today_row[:, None] > 0)
+        current_price[in_week] = close[latest_row[in_week], np.nonzero(in_week)[1]]
+
+    historical_high_with_buffer = historical_high * (1 - buffer)
+    current_price_with_buffer = current_price * (1 + buffer)
+    with np.errstate(invalid='ignore'):
+        is_breakout = (historical_high_with_buffer < previous_high) & (current_price_with_buffer > previous_high)
+
+    return {
+        'historical_high': historical_high,
+        'previous_high': previous_high,
+        'current_price': current_price,
+        'is_breakout': is_breakout & enough_data,
+    }
+
+
+def sweep_breakouts(symbols, years_gap=5, buffer=0.05, weeks=52, current_date=None, as_of=False, store=None):
+    # Breakout signal for every symbol and every week from a single load of the universe.
+    # Returns a symbol x weeks_back boolean frame; with as_of=True column k is the signal a scan
+    # run k weeks before current_date would have produced.
+    current_date = current_date or datetime.today()
+    symbols = list(dict.fromkeys(symbols))
+    history_days = 365 * (years_gap + 10) + (7 * weeks if as_of else 0)
+
+    started = time.perf_counter()
+    days, matrix = load_price_matrix(symbols, current_date - timedelta(days=history_days), current_date, store=store)
+    signals = sweep_matrix(days, matrix, years_gap=years_gap, buffer=buffer, weeks=weeks,
+                           current_date=current_date, as_of=as_of)
+    logger.info(f"Swept {len(symbols)} symbols over {weeks} weeks in {time.perf_counter() - started:.3f}s")
+
+    return pd.DataFrame(signals['is_breakout'].T, index=pd.Index(symbols, name='symbol'),
+                        columns=pd.RangeIndex(weeks, name='weeks_back'))
+
+
+def grid_matrix(days, matrix, years_gaps, buffers, weeks_back=0, current_date=None):
+    # Evaluate every (years_gap, buffer) pair on one loaded matrix. Window maxima are computed
+    # once per gap and all buffers are applied by broadcasting; arrays are (symbols x gaps x buffers).
+    current_date = current_date or datetime.today()
+    years_gaps = [int(gap) for gap in years_gaps]
+    buffers = np.asarray(buffers, dtype=np.float64)
+    high, close = matrix['high'], matrix['close']
+    has_row = ~(np.isnan(high) & np.isnan(close))
+    row_count = np.vstack([np.zeros((1, high.shape[1]), dtype=np.int64), np.cumsum(has_row, axis=0)])
+
+    end_date = current_date - timedelta(days=current_date.weekday() + 1 + (weeks_back * 7))  # Exclude current week
+    current_week_start = current_date - timedelta(days=current_date.weekday() + (weeks_back * 7))
+    end_row = np.searchsorted(days, to_day_number(end_date), side='right')
+    end_exclusive_row = min(np.searchsorted(days, to_day_number(end_date, round_up=True), side='left'), end_row)
+    week_row = np.searchsorted(days, to_day_number(current_week_start, round_up=True), side='left')
+    today_row = np.searchsorted(days, to_day_number(current_date), side='right')
+
+    # Each gap has its own load window and split point
+    load_rows = np.searchsorted(days, [to_day_number(current_date - timedelta(days=365 * (gap + 10)), round_up=True)
+                                       for gap in years_gaps], side='left')
+    gap_rows = np.searchsorted(days, [to_day_number(current_date - timedelta(days=365 * gap), round_up=True)
+                                      for gap in years_gaps], side='left')
+
+    historical_high = windows_max(high, gap_rows, np.full(len(years_gaps), end_exclusive_row)).T
+    previous_high = windows_max(high, load_rows, np.minimum(gap_rows, end_row)).T
+    enough_data = ((row_count[end_row] - row_count[load_rows]) >= 2).T
+    current_price = np.where(enough_data, last_valid(close, week_row, today_row)[:, None], np.nan)
+    historical_high[~enough_data] = np.nan
+    previous_high[~enough_data] = np.nan
+
+    # Broadcast buffers over the last axis
+    historical_high_with_buffer = historical_high[:, :, None] * (1 - buffers)
+    current_price_with_buffer = current_price[:, :, None] * (1 + buffers)
+    with np.errstate(invalid='ignore'):
+        is_breakout = (historical_high_with_buffer < previous_high[:, :, None]) & \
+                      (current_price_with_buffer > previous_high[:, :, None])
+
+    shape = (high.shape[1], len(years_gaps), len(buffers))
+    return {
+        'historical_high': np.broadcast_to(historical_high[:, :, None], shape),
+        'historical_high_with_buffer': historical_high_with_buffer,
+        'previous_high': np.broadcast_to(previous_high[:, :, None], shape),
+        'current_price': np.broadcast_to(current_price[:, :, None], shape),
+        'current_price_with_buffer': current_price_with_buffer,
+        'is_breakout': is_breakout,
+    }
+
+
+def evaluate_parameter_grid(symbols, years_gaps, buffers, weeks_back=0, current_date=None, store=None):
+    # Results cube for every symbol x years_gap x buffer from a single load of the universe.
+    # Returns a long frame indexed by (symbol, years_gap, buffer), ready for export.
+    current_date = current_date or datetime.today()
+    symbols = list(dict.fromkeys(symbols))
+    years_gaps = sorted(set(int(gap) for gap in years_gaps))
+    buffers = sorted(set(float(buffer) for buffer in buffers))
+
+    started = time.perf_counter()
+    days, matrix = load_price_matrix(symbols, current_date - timedelta(days=365 * (max(years_gaps) + 10)),
+                                     current_date, store=store)
+    cube = grid_matrix(days, matrix, years_gaps, buffers, weeks_back=weeks_back, current_date=current_date)
+    logger.info(f"Evaluated {len(symbols)} symbols x {len(years_gaps)} gaps x {len(buffers)} buffers "
+                f"in {time.perf_counter() - started:.3f}s")
+
+    index = pd.MultiIndex.from_product([symbols, years_gaps, buffers], names=['symbol', 'years_gap', 'buffer'])
+    return pd.DataFrame({name: values.reshape(-1) for name, values in cube.items()}, index=index)
+
+
+if __name__ == "__main__":
+    # python breakout_screener.py [years_gap] [buffer] -- screens every symbol in the price store
+    store = get_price_store(db_path=DATABASE_FILE_PATH)
+    if hasattr(store, 'symbols'):
+        all_symbols = store.symbols()
+    else:
+        conn = sqlite3.connect(DATABASE_FILE_PATH)
+        all_symbols = [row[0] for row in conn.execute('SELECT symbol FROM cache_info ORDER BY symbol')]
+        conn.close()
+
+    args = sys.argv[1:]
+    breakouts, _ = screen_breakouts(all_symbols, years_gap=int(args[0]) if args else 5,
+                                    buffer=float(args[1]) if len(args) > 1 else 0.05, store=store)
+    print(",".join(breakouts))
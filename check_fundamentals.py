@@ -1,20 +1,26 @@
-import yfinance as yf
+import argparse
 import json
 
-def check_fundamentals(symbol):
-    print(f"Fetching fundamentals for {symbol}...")
-    ticker = yf.Ticker(symbol)
-    info = ticker.info
-    
-    # Filter for key fundamental metrics
-    keys_of_interest = [
-        'trailingPE', 'forwardPE', 'priceToBook', 'returnOnEquity', 
-        'debtToEquity', 'profitMargins', 'revenueGrowth', 'operatingMargins',
-        'freeCashflow', 'marketCap', 'longName', 'sector'
-    ]
-    
-    filtered_info = {k: info.get(k) for k in keys_of_interest}
+from fundamentals import FUNDAMENTAL_FIELDS, get_fundamentals, prefetch_fundamentals
+
+
+def check_fundamentals(symbol, refresh=False):
+    # Served from the fundamentals cache while fresh, see config.FUNDAMENTALS_TTL_DAYS
+    symbol = symbol.upper().removesuffix('.NS')
+    print(f"Fundamentals for {symbol}...")
+    filtered_info = get_fundamentals(symbol, FUNDAMENTAL_FIELDS, refresh=refresh)
     print(json.dumps(filtered_info, indent=2))
 
+
 if __name__ == "__main__":
-    check_fundamentals("RELIANCE.NS")
+    parser = argparse.ArgumentParser(description="Show cached fundamentals, fetching only stale fields from Yahoo.")
+    parser.add_argument('symbols', nargs='*', default=['RELIANCE'], help="NSE symbols (the .NS suffix is optional)")
+    parser.add_argument('--refresh', action='store_true', help="Ignore the cache and fetch again")
+    args = parser.parse_args()
+
+    symbols = [symbol.upper().removesuffix('.NS') for symbol in args.symbols]
+    if len(symbols) > 1 and not args.refresh:
+        # Fill the cache for the whole list concurrently before printing
+        prefetch_fundamentals(symbols)
+    for symbol in symbols:
+        check_fundamentals(symbol, refresh=args.refresh)
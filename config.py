@@ -1 +1,90 @@
 DATABASE_FILE_PATH = "buy_low_sell_high.db"
+
+# Number of symbols fetched per multi-ticker download in the breakout scanner
+BULK_DOWNLOAD_CHUNK_SIZE = 50
+
+# Parallel breakout scan: download workers (each fetching BULK_DOWNLOAD_CHUNK_SIZE symbols per request),
+# retries with exponential backoff and the timeout of one request
+SCAN_MAX_WORKERS = 8
+SCAN_RETRIES = 2
+SCAN_RETRY_BACKOFF_SECONDS = 1.0
+SCAN_SYMBOL_TIMEOUT_SECONDS = 60
+
+# Price history backend for the breakout scanner: "sqlite" (default), "mmap" or "parquet".
+# The mmap store is a read-only snapshot built with `python price_store.py`; symbols synced
+# after it was built are read from SQLite until it is rebuilt.
+PRICE_STORE_BACKEND = "sqlite"
+PRICE_STORE_DIRECTORY = "price_store"
+# Partitioned Parquet export of historical_data (`python parquet_store.py export|import`),
+# also readable as the "parquet" price store backend. Partition by "year" or "symbol";
+# smaller row groups let date and symbol filters skip more of each file.
+PARQUET_DIRECTORY = "parquet_export"
+PARQUET_PARTITION_BY = "year"
+PARQUET_ROW_GROUP_SIZE = 65536
+
+# SQLite tuning applied by database.connect: page cache size in KiB.
+# Set HISTORICAL_DATA_WITHOUT_ROWID to rebuild historical_data clustered on (symbol, date)
+# on the next migration (or run `python database.py --without-rowid` once).
+SQLITE_CACHE_SIZE_KB = 65536
+HISTORICAL_DATA_WITHOUT_ROWID = False
+# Prepared statements kept per pooled connection (database.get_connection)
+SQLITE_STATEMENT_CACHE_SIZE = 256
+
+# Rendered watchlist and breakout views kept by st.cache_data (one entry per watchlist and data version)
+VIEW_CACHE_MAX_ENTRIES = 64
+# Rows per page of the Display Watchlist table; pages are read with LIMIT/OFFSET
+WATCHLIST_PAGE_SIZE = 50
+
+# Watchlist indicators (50/200 DMA, RSI) are computed from this many calendar days of stored closes
+INDICATOR_LOOKBACK_DAYS = 1000
+RSI_PERIOD = 14
+
+# NSE session calendar (IST). Holidays are full trading holidays from the NSE circular;
+# extend the list every year.
+MARKET_OPEN_TIME = (9, 15)
+MARKET_CLOSE_TIME = (15, 30)
+NSE_HOLIDAYS = [
+    "2025-02-26", "2025-03-14", "2025-03-31", "2025-04-10", "2025-04-14", "2025-04-18", "2025-05-01",
+    "2025-08-15", "2025-08-27", "2025-10-02", "2025-10-21", "2025-10-22", "2025-11-05", "2025-12-25",
+    "2026-01-26", "2026-03-03", "2026-03-26", "2026-03-31", "2026-04-03", "2026-04-14", "2026-05-01",
+    "2026-05-28", "2026-06-26", "2026-09-14", "2026-10-02", "2026-10-20", "2026-11-10", "2026-11-24",
+    "2026-12-25",
+]
+
+# Watchlist refresh scheduler: interval while the market is open, and the delay after the close
+# for the single end-of-day run (Yahoo settles the daily bar a little after 15:30)
+REFRESH_INTERVAL_MINUTES = 15
+POST_CLOSE_REFRESH_DELAY_MINUTES = 30
+
+# Out-of-process refresh worker (refresh_worker.py): queue poll interval, and how long a job may
+# stay 'running' before a restarted worker assumes its owner died and re-queues it
+WORKER_POLL_SECONDS = 5
+WORKER_STALE_JOB_MINUTES = 60
+
+# Fundamentals cache (fundamentals.py): days each field stays fresh. Price-based ratios move daily,
+# reported financials quarterly and the company profile hardly ever.
+FUNDAMENTALS_TTL_DAYS = {
+    'marketCap': 1,
+    'trailingPE': 1,
+    'forwardPE': 1,
+    'priceToBook': 1,
+    'returnOnEquity': 90,
+    'debtToEquity': 90,
+    'profitMargins': 90,
+    'operatingMargins': 90,
+    'revenueGrowth': 90,
+    'earningsGrowth': 90,
+    'freeCashflow': 90,
+    'dividendYield': 7,
+    'longName': 365,
+    'sector': 365,
+    'industry': 365,
+}
+# Fields Yahoo left out are cached as missing only this long, in case the response was throttled
+FUNDAMENTALS_MISSING_TTL_DAYS = 1
+FUNDAMENTALS_PREFETCH_WORKERS = 4
+
+# AI analyst (ai_analyst.py): Gemini model, and the request budget of the "Analyze all breakouts" batch
+GEMINI_MODEL_NAME = 'gemini-flash-latest'
+AI_REQUESTS_PER_MINUTE = 10
+AI_MAX_WORKERS = 4
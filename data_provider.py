@@ -0,0 +1,86 @@
+import logging
+
+import pandas as pd
+
+from nifty_indices import nifty_indices
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+
+def load_yfinance():
+    # yfinance (and its HTTP stack) is imported on the first download, not when the app starts
+    import yfinance as yf
+    return yf
+
+
+class YFinanceProvider:
+    """
+    Daily OHLCV and latest-quote source backed by Yahoo Finance.
+
+    Any object with the same download(tickers, start, end) and latest_quotes(tickers)
+    methods can be passed to the ingestion and indicator functions instead, e.g. a local
+    fake in tests. info(ticker) is only needed by the fundamentals cache.
+    """
+
+    def download(self, tickers, start, end):
+        # One multi-ticker request for the whole chunk
+        yf = load_yfinance()
+        return yf.download(tickers, start=start, end=end, group_by='ticker', threads=True, progress=False)
+
+    def latest_quotes(self, tickers):
+        # Last traded price per ticker: {ticker: (session date, price)}. The daily bar of a
+        # session in progress carries the live price, so a few daily rows are enough.
+        yf = load_yfinance()
+        frame = yf.download(tickers, period='5d', interval='1d', group_by='ticker', threads=True, progress=False)
+        quotes = {}
+        for ticker, df in split_by_ticker(frame, list(tickers)).items():
+            closes = flatten_columns(df)['Close'].dropna()
+            if not closes.empty:
+                date = pd.Timestamp(closes.index[-1])
+                if date.tzinfo is not None:
+                    date = date.tz_localize(None)
+                quotes[ticker] = (date.normalize(), float(closes.iloc[-1]))
+        return quotes
+
+    def info(self, ticker):
+        # Company profile and fundamentals; one of the slowest Yahoo endpoints
+        return load_yfinance().Ticker(ticker).info
+
+
+def yahoo_ticker(symbol):
+    # Nifty indices have their own Yahoo tickers, NSE stocks take the '.NS' suffix
+    return nifty_indices.get(symbol, symbol + '.NS')
+
+
+def flatten_columns(df):
+    # yfinance >= 0.2.66 might return MultiIndex (Price, Ticker) or Index with tuples
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    else:
+        # Fallback for weird tuple-index cases that aren't strict MultiIndex
+        df.columns = [c[0] if isinstance(c, tuple) else c for c in df.columns]
+    return df
+
+
+def split_by_ticker(frame, tickers):
+    # Split a multi-ticker download into one OHLCV frame per ticker
+    if frame is None or frame.empty:
+        return {}
+
+    if not isinstance(frame.columns, pd.MultiIndex):
+        # A single ticker can come back without the ticker level
+        return {tickers[0]: frame} if len(tickers) == 1 else {}
+
+    # group_by='ticker' gives (Ticker, Price), the default layout gives (Price, Ticker)
+    ticker_level = 0 if set(tickers) & set(frame.columns.get_level_values(0)) else 1
+
+    frames = {}
+    for ticker in tickers:
+        if ticker not in frame.columns.get_level_values(ticker_level):
+            logger.warning(f"No columns returned for {ticker} in batch download")
+            continue
+        df = frame.xs(ticker, axis=1, level=ticker_level).dropna(how='all')
+        if not df.empty:
+            frames[ticker] = df
+    return frames
@@ -0,0 +1,458 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from config import DATABASE_FILE_PATH, SQLITE_CACHE_SIZE_KB, SQLITE_STATEMENT_CACHE_SIZE, \
+    HISTORICAL_DATA_WITHOUT_ROWID
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+
+def create_base_schema(cursor):
+    # Version 1: the tables as the app originally created them
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historical_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            date DATE,
+            high REAL,
+            low REAL,
+            close REAL,
+            adjusted_close REAL,
+            volume INTEGER,
+            UNIQUE(symbol, date)  -- Ensure unique entries for symbol and date
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_info (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            last_updated DATE,
+            history_start DATE,  -- Earliest date requested from the data source
+            UNIQUE(symbol)  -- Ensure unique entries for symbol
+        )
+    ''')
+
+    # Older databases were created without history_start
+    cursor.execute('PRAGMA table_info(cache_info)')
+    if 'history_start' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE cache_info ADD COLUMN history_start DATE')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS watchlist_names (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS watchlist_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stock_symbol TEXT UNIQUE,
+            stock_price REAL,
+            per_change REAL,
+            dma_200_close REAL,
+            percent_away_from_dma_200 REAL,
+            dma_50_close REAL,
+            price_50dma_200dma REAL,
+            rsi REAL,
+            rsi_rank INTEGER,
+            dma_200_rank INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS watchlist_stock_mapping (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            watchlist_id INTEGER,
+            stock_id INTEGER,
+            FOREIGN KEY (watchlist_id) REFERENCES watchlist_names (id),
+            FOREIGN KEY (stock_id) REFERENCES watchlist_data (id)
+        )
+    ''')
+
+
+def create_watchlist_indexes(cursor):
+    # Version 2: every watchlist render and refresh joins names -> mapping -> data
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_watchlist_names_name ON watchlist_names (name)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_watchlist_stock_mapping_watchlist
+        ON watchlist_stock_mapping (watchlist_id, stock_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_watchlist_stock_mapping_stock
+        ON watchlist_stock_mapping (stock_id, watchlist_id)
+    ''')
+
+
+def create_indicator_state_table(cursor):
+    # Version 3: rolling indicator state per symbol for incremental watchlist refreshes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS indicator_state (
+            symbol TEXT PRIMARY KEY,
+            last_date DATE,  -- Last bar folded into the state
+            bars INTEGER,
+            prev_close REAL,
+            last_close REAL,
+            sum_50 REAL,
+            sum_200 REAL,
+            closes_window TEXT,  -- JSON list of the last 200 closes
+            avg_gain REAL,  -- Wilder averages (running sums while seeding)
+            avg_loss REAL,
+            updated_at DATETIME
+        )
+    ''')
+
+
+# Per-watchlist ranks kept on the mapping rows, one RANK() partition per watchlist
+MAPPING_RANK_UPDATE = '''
+    UPDATE watchlist_stock_mapping
+    SET rsi_rank = ranked.rsi_rank,
+        dma_200_rank = ranked.dma_200_rank
+    FROM (
+        SELECT wsm.id,
+               CASE WHEN wd.rsi IS NOT NULL
+                    THEN RANK() OVER (PARTITION BY wsm.watchlist_id ORDER BY wd.rsi IS NULL, wd.rsi) END AS rsi_rank,
+               CASE WHEN wd.percent_away_from_dma_200 IS NOT NULL
+                    THEN RANK() OVER (PARTITION BY wsm.watchlist_id
+                                      ORDER BY wd.percent_away_from_dma_200 IS NULL,
+                                      wd.percent_away_from_dma_200) END AS dma_200_rank
+        FROM watchlist_stock_mapping AS wsm
+        JOIN watchlist_data AS wd ON wsm.stock_id = wd.id
+        JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+        {where}
+    ) AS ranked
+    WHERE watchlist_stock_mapping.id = ranked.id
+'''
+
+
+def update_mapping_ranks(cursor, watchlist_name=None):
+    # Rank one watchlist, or every watchlist at once when no name is given
+    if watchlist_name is None:
+        cursor.execute(MAPPING_RANK_UPDATE.format(where=''))
+    else:
+        cursor.execute(MAPPING_RANK_UPDATE.format(where='WHERE wn.name = ?'), (watchlist_name,))
+
+
+def add_watchlist_rank_columns(cursor):
+    # Version 4: per-watchlist ranks; watchlist_data holds one row per stock shared by all watchlists
+    cursor.execute('PRAGMA table_info(watchlist_stock_mapping)')
+    columns = [column[1] for column in cursor.fetchall()]
+    for column in ('rsi_rank', 'dma_200_rank'):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE watchlist_stock_mapping ADD COLUMN {column} INTEGER')
+    # Rank the existing watchlists from their stored metrics so they do not show blank ranks until a refresh
+    update_mapping_ranks(cursor)
+
+
+def create_refresh_jobs_table(cursor):
+    # Version 5: refresh jobs queued by the UI and executed by refresh_worker.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS refresh_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,  -- 'all' or 'watchlist'
+            watchlist_name TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, done, failed
+            requested_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            finished_at DATETIME,
+            worker TEXT,
+            error TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_refresh_jobs_status ON refresh_jobs (status, id)')
+
+
+def create_data_version_table(cursor):
+    # Version 6: counter bumped by every write the watchlist views depend on; cached views key on it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+
+
+def create_fundamentals_table(cursor):
+    # Version 7: fundamentals cache, one row per symbol and field so each field can expire on its own
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fundamentals (
+            symbol TEXT NOT NULL,
+            field TEXT NOT NULL,
+            value TEXT,  -- JSON encoded; null when Yahoo has no value for the field
+            fetched_at DATETIME NOT NULL,  -- UTC
+            PRIMARY KEY (symbol, field)
+        ) WITHOUT ROWID
+    ''')
+
+
+def create_ai_analyses_table(cursor):
+    # Version 8: AI analyses keyed by a hash of symbol, fundamentals payload, prompt version and model
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_analyses (
+            key TEXT PRIMARY KEY,  -- sha256, see ai_analyst.analysis_key
+            symbol TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            analysis TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+
+
+# Ordered (version, description, function) list. Never edit an applied migration, append a new one.
+MIGRATIONS = [
+    (1, "base schema", create_base_schema),
+    (2, "watchlist join indexes", create_watchlist_indexes),
+    (3, "indicator state", create_indicator_state_table),
+    (4, "per-watchlist ranks", add_watchlist_rank_columns),
+    (5, "refresh job queue", create_refresh_jobs_table),
+    (6, "data version counter", create_data_version_table),
+    (7, "fundamentals cache", create_fundamentals_table),
+    (8, "AI analysis cache", create_ai_analyses_table),
+]
+
+
+def get_data_version(cursor):
+    cursor.execute('SELECT version FROM data_version WHERE id = 1')
+    return cursor.fetchone()[0]
+
+
+def bump_data_version(cursor):
+    # Part of the caller's transaction, so readers see the new version together with the new data
+    cursor.execute('UPDATE data_version SET version = version + 1 WHERE id = 1')
+
+
+def apply_pragmas(conn):
+    # Per-connection settings; journal_mode=WAL is stored in the database file itself
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+def is_without_rowid(cursor, table):
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    row = cursor.fetchone()
+    return row is not None and 'WITHOUT ROWID' in row[0].upper()
+
+
+def convert_historical_data_to_without_rowid(conn):
+    # Rebuild historical_data clustered on (symbol, date) so a symbol's history is contiguous.
+    # The surrogate id is dropped; nothing reads it.
+    cursor = conn.cursor()
+    if is_without_rowid(cursor, 'historical_data'):
+        return False
+
+    logger.info("Rebuilding historical_data as a WITHOUT ROWID table keyed on (symbol, date)")
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute('''
+            CREATE TABLE historical_data_clustered (
+                symbol TEXT NOT NULL,
+                date DATE NOT NULL,
+                high REAL,
+                low REAL,
+                close REAL,
+                adjusted_close REAL,
+                volume INTEGER,
+                PRIMARY KEY (symbol, date)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO historical_data_clustered (symbol, date, high, low, close, adjusted_close, volume)
+            SELECT symbol, date, high, low, close, adjusted_close, volume FROM historical_data
+            WHERE symbol IS NOT NULL AND date IS NOT NULL
+        ''')
+        cursor.execute('DROP TABLE historical_data')
+        cursor.execute('ALTER TABLE historical_data_clustered RENAME TO historical_data')
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return True
+
+
+def migrate(conn, without_rowid=HISTORICAL_DATA_WITHOUT_ROWID):
+    # Bring the schema up to the latest version recorded in PRAGMA user_version
+    cursor = conn.cursor()
+    if not conn.in_transaction:
+        # WAL persists in the database file, so databases opened with plain sqlite3.connect get it too
+        cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA user_version')
+    current_version = cursor.fetchone()[0]
+
+    for version, description, apply in MIGRATIONS:
+        if version <= current_version:
+            continue
+        logger.info(f"Applying schema migration {version}: {description}")
+        try:
+            apply(cursor)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Schema migration {version} failed: {e}")
+            raise
+
+    if without_rowid:
+        convert_historical_data_to_without_rowid(conn)
+    return conn
+
+
+def connect(db_path=None):
+    # Open a connection with the tuned pragmas applied
+    return apply_pragmas(sqlite3.connect(db_path or DATABASE_FILE_PATH))
+
+
+# Counters for the pooled connections, see get_db_stats
+db_stats = {
+    'connections_opened': 0,
+    'connections_reused': 0,
+    'schema_inits': 0,
+    'queries': 0,
+    'query_seconds': 0.0,
+}
+stats_lock = threading.Lock()
+
+# One pooled connection per thread and database file
+pool = threading.local()
+# Streamlit runs every rerun on a new thread, so script runs share one connection per browser session
+SESSION_POOL_KEY = '_db_connections'
+# Database files this process has already migrated
+schema_ready = set()
+schema_lock = threading.Lock()
+
+
+def record_query(seconds):
+    with stats_lock:
+        db_stats['queries'] += 1
+        db_stats['query_seconds'] += seconds
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that adds each statement's run time to db_stats."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(time.perf_counter() - started)
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection handed out by get_connection; every cursor it creates is timed."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def database_path(conn):
+    # File behind a connection's main database
+    return conn.execute('PRAGMA database_list').fetchone()[2]
+
+
+def init_schema(conn, db_path=None):
+    # Run the migrations once per process and database file rather than on every call or rerun
+    key = os.path.abspath(db_path or database_path(conn))
+    with schema_lock:
+        if key in schema_ready:
+            return False
+        migrate(conn)
+        schema_ready.add(key)
+    with stats_lock:
+        db_stats['schema_inits'] += 1
+    return True
+
+
+def session_connections():
+    # Connections of the Streamlit session running this thread, or None outside a script run.
+    # They live in session_state so they outlive the rerun's thread and go away with the session.
+    if 'streamlit' not in sys.modules:
+        return None
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None
+    if SESSION_POOL_KEY not in ctx.session_state:
+        ctx.session_state[SESSION_POOL_KEY] = {}
+    return ctx.session_state[SESSION_POOL_KEY]
+
+
+def get_connection(db_path=None):
+    # This thread's pooled connection to db_path, or the session's inside a Streamlit script run.
+    # Pragmas are applied when it is opened and the schema is migrated once per process.
+    # Callers commit or roll back but never close it.
+    db_path = db_path or DATABASE_FILE_PATH
+    key = os.path.abspath(db_path)
+    connections = session_connections()
+    if connections is None:
+        if not hasattr(pool, 'connections'):
+            pool.connections = {}
+        connections = pool.connections
+    conn = connections.get(key)
+    if conn is not None:
+        try:
+            conn.total_changes  # Raises once a caller has closed it anyway
+            with stats_lock:
+                db_stats['connections_reused'] += 1
+            return conn
+        except sqlite3.ProgrammingError:
+            pass
+
+    # A session's reruns use it from different threads, one run at a time
+    conn = apply_pragmas(sqlite3.connect(db_path, factory=PooledConnection,
+                                         cached_statements=SQLITE_STATEMENT_CACHE_SIZE,
+                                         check_same_thread=False))
+    connections[key] = conn
+    with stats_lock:
+        db_stats['connections_opened'] += 1
+    init_schema(conn, db_path)
+    return conn
+
+
+def close_connections():
+    # Close this thread's pooled connections
+    for conn in getattr(pool, 'connections', {}).values():
+        conn.close()
+    pool.connections = {}
+
+
+def get_db_stats():
+    with stats_lock:
+        return dict(db_stats)
+
+
+def reset_db_stats():
+    with stats_lock:
+        for name in db_stats:
+            db_stats[name] = 0.0 if name == 'query_seconds' else 0
+
+
+if __name__ == "__main__":
+    # python database.py [--without-rowid] -- migrate the configured database
+    conn = connect()
+    migrate(conn, without_rowid=HISTORICAL_DATA_WITHOUT_ROWID or '--without-rowid' in sys.argv[1:])
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA user_version')
+    print(f"Schema version: {cursor.fetchone()[0]}")
+    conn.close()
@@ -0,0 +1,139 @@
+import json
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+from config import DATABASE_FILE_PATH, FUNDAMENTALS_MISSING_TTL_DAYS, FUNDAMENTALS_PREFETCH_WORKERS, \
+    FUNDAMENTALS_TTL_DAYS
+from data_provider import YFinanceProvider, yahoo_ticker
+from database import close_connections, get_connection
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+# Every field stored for a symbol; one .info call refreshes all of them
+FUNDAMENTAL_FIELDS = list(FUNDAMENTALS_TTL_DAYS)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+SYMBOL_BATCH = 500  # symbols per IN (...) query
+
+FUNDAMENTALS_UPSERT = '''
+    INSERT INTO fundamentals (symbol, field, value, fetched_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(symbol, field) DO UPDATE SET
+        value = excluded.value,
+        fetched_at = excluded.fetched_at
+'''
+
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def is_fresh(field, value, fetched_at, now):
+    ttl_days = FUNDAMENTALS_TTL_DAYS.get(field, 1)
+    if value is None:
+        ttl_days = min(ttl_days, FUNDAMENTALS_MISSING_TTL_DAYS)
+    age = now - datetime.strptime(fetched_at, TIMESTAMP_FORMAT)
+    return age < timedelta(days=ttl_days)
+
+
+def load_fundamentals(cursor, symbols, fields, now=None):
+    # Cached values still within their TTL: {symbol: {field: value}}. Stale or missing fields are left out.
+    now = now or utc_now()
+    cached = {symbol: {} for symbol in symbols}
+    for i in range(0, len(symbols), SYMBOL_BATCH):
+        batch = list(symbols[i:i + SYMBOL_BATCH])
+        cursor.execute(f'''
+            SELECT symbol, field, value, fetched_at FROM fundamentals
+            WHERE symbol IN ({', '.join('?' * len(batch))}) AND field IN ({', '.join('?' * len(fields))})
+        ''', (*batch, *fields))
+        for symbol, field, value, fetched_at in cursor.fetchall():
+            value = json.loads(value)
+            if is_fresh(field, value, fetched_at, now):
+                cached[symbol][field] = value
+    return cached
+
+
+def store_fundamentals(cursor, symbol, info, now=None):
+    # Every field is written, including the ones Yahoo left out, so a missing value is cached too
+    # (for FUNDAMENTALS_MISSING_TTL_DAYS at most)
+    fetched_at = (now or utc_now()).strftime(TIMESTAMP_FORMAT)
+    cursor.executemany(FUNDAMENTALS_UPSERT, [(symbol, field, json.dumps(info.get(field)), fetched_at)
+                                             for field in FUNDAMENTAL_FIELDS])
+
+
+def fetch_info(provider, symbol):
+    # Raises ValueError when Yahoo returns none of the fields (an empty or rate-limited response),
+    # so nothing is cached for the symbol
+    info = provider.info(yahoo_ticker(symbol)) or {}
+    fields = {field: info.get(field) for field in FUNDAMENTAL_FIELDS}
+    if all(value is None for value in fields.values()):
+        raise ValueError(f"no fundamentals returned for {symbol}")
+    return fields
+
+
+def get_fundamentals(symbol, fields=None, provider=None, db_path=None, refresh=False, now=None):
+    # Fields for one symbol, served from the fundamentals table while fresh. A stale or missing
+    # field costs one .info call, which refreshes every field of the symbol.
+    fields = fields or FUNDAMENTAL_FIELDS
+    conn = get_connection(db_path or DATABASE_FILE_PATH)
+    cached = {} if refresh else load_fundamentals(conn.cursor(), [symbol], fields, now)[symbol]
+    if len(cached) == len(fields):
+        return cached
+
+    try:
+        info = fetch_info(provider or YFinanceProvider(), symbol)
+    except Exception as e:
+        logger.error(f"Error fetching fundamentals for {symbol}: {str(e)}")
+        return cached
+
+    try:
+        store_fundamentals(conn.cursor(), symbol, info, now)
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Error storing fundamentals for {symbol}: {e}")
+    return {field: info.get(field) for field in fields}
+
+
+def prefetch_fundamentals(symbols, fields=None, provider=None, db_path=None, max_workers=FUNDAMENTALS_PREFETCH_WORKERS,
+                          now=None):
+    # Fill the cache for a whole list. The .info calls run on a small pool and the rows are
+    # written from this thread as each symbol arrives. Returns the symbols that were fetched.
+    fields = fields or FUNDAMENTAL_FIELDS
+    provider = provider or YFinanceProvider()
+    symbols = list(dict.fromkeys(symbols))
+    conn = get_connection(db_path or DATABASE_FILE_PATH)
+    cursor = conn.cursor()
+    cached = load_fundamentals(cursor, symbols, fields, now)
+    stale = [symbol for symbol in symbols if len(cached[symbol]) < len(fields)]
+    logger.info(f"Fundamentals: {len(symbols) - len(stale)} of {len(symbols)} symbols fresh in the cache")
+
+    fetched = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch_info, provider, symbol): symbol for symbol in stale}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                store_fundamentals(cursor, symbol, future.result(), now)
+                conn.commit()
+                fetched.append(symbol)
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error prefetching fundamentals for {symbol}: {str(e)}")
+    return fetched
+
+
+def prefetch_in_background(symbols, **kwargs):
+    # Run prefetch_fundamentals on a daemon thread so the page renders while the cache fills
+    def run():
+        try:
+            prefetch_fundamentals(symbols, **kwargs)
+        finally:
+            close_connections()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
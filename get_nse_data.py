@@ -1,46 +1,71 @@
 import datetime
-import yfinance as yf
+import numpy as np
 import pandas as pd
 
-from nifty_indices import nifty_indices
+from data_provider import YFinanceProvider, flatten_columns, load_yfinance, yahoo_ticker
+
+
+def rsi_matrix(closes, period=14):
+    # Wilder RSI for every column of a close matrix (rows are dates, columns symbols).
+    # Each column is seeded with the mean gain/loss of its first `period` bars and then
+    # smoothed with the recurrence avg = (avg * (period - 1) + x) / period, which is an
+    # EWM with alpha = 1 / period. Leading NaNs (shorter histories) are allowed.
+    is_series = isinstance(closes, pd.Series)
+    frame = pd.DataFrame(closes)
+    delta = frame.diff()
+    gains = delta.where(delta > 0, 0).to_numpy(dtype=float)
+    losses = -delta.where(delta < 0, 0).to_numpy(dtype=float)
+
+    rows = len(frame)
+    valid = frame.notna().to_numpy()
+    seed_row = valid.argmax(axis=0) + period - 1
+    seed_row[~valid.any(axis=0)] = rows
+    position = np.arange(rows)[:, None]
+    seeded = seed_row < rows
+
+    averages = []
+    for values in (gains, losses):
+        # Mean of the first `period` values of each column (the first bar's gain is 0)
+        window = (position >= seed_row - period + 1) & (position <= seed_row)
+        seed = np.where(window, values, 0).sum(axis=0) / period
+        values[position < seed_row] = np.nan
+        values[seed_row[seeded], np.flatnonzero(seeded)] = seed[seeded]
+        averages.append(pd.DataFrame(values).ewm(alpha=1 / period, adjust=False).mean().to_numpy())
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - (100 / (1 + averages[0] / averages[1]))
+    # The seed bar itself has no RSI, matching the loop version
+    rsi[position <= seed_row] = np.nan
+
+    if is_series:
+        return pd.Series(rsi[:, 0], index=closes.index, name=closes.name)
+    if isinstance(closes, pd.DataFrame):
+        return pd.DataFrame(rsi, index=closes.index, columns=closes.columns)
+    return rsi
 
 
 def calculate_rsi(data, period=14):
     close = data['Close']
-    delta = close.diff()
-    gains = delta.where(delta > 0, 0)
-    losses = -delta.where(delta < 0, 0)
-
-    # Calculate initial average gains and losses
-    avg_gains = gains.iloc[:period].mean()
-    avg_losses = losses.iloc[:period].mean()
-
-    rs_values = []
-
-    for i in range(period, len(gains)):
-        avg_gains = (avg_gains * (period - 1) + gains.iloc[i]) / period
-        avg_losses = (avg_losses * (period - 1) + losses.iloc[i]) / period
-
-        rs = avg_gains / avg_losses
-        rsi = 100 - (100 / (1 + rs))
-        rs_values.append(rsi)
-
-    return pd.Series(rs_values, index=close.index[period:])
+    if isinstance(close, pd.DataFrame):
+        # yfinance can return a one-column frame for a single ticker
+        close = close.iloc[:, 0]
+    return rsi_matrix(close, period=period).iloc[period:]
 
 def get_historical_data(stock_symbol, lookback_days=1000):
     try:
 
-        # Check if the stock_symbol matches any Nifty index
-        if stock_symbol in nifty_indices:
-            stock_name = nifty_indices[stock_symbol]
-        else:
-            # If no match is found, add ".NS" to the symbol
-            stock_name = stock_symbol + '.NS'
+        # Nifty indices map to their own Yahoo tickers, stocks get the ".NS" suffix
+        stock_name = yahoo_ticker(stock_symbol)
 
         end_date = datetime.date.today() - datetime.timedelta(days=1)
         start_date = end_date - datetime.timedelta(days=lookback_days)
         print(f'Getting historical data for {stock_name} from {start_date} to {end_date}')
-        stock_data = pd.concat([yf.download(stock_name, start=start_date, end=end_date), yf.download(stock_name, interval='1m').iloc[-1:]])
+        stock_data = flatten_columns(load_yfinance().download(stock_name, start=start_date, end=end_date, progress=False))
+
+        # Today's live price from the quote stage instead of a full day of one-minute bars
+        quote = YFinanceProvider().latest_quotes([stock_name]).get(stock_name)
+        if quote is not None and (stock_data.empty or quote[0] > stock_data.index[-1]):
+            stock_data.loc[quote[0], 'Close'] = quote[1]
 
         if stock_data.empty:
             print(f"No data available for {stock_name} starting from {start_date}.")
@@ -0,0 +1,335 @@
+import json
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config import DATABASE_FILE_PATH, BULK_DOWNLOAD_CHUNK_SIZE, INDICATOR_LOOKBACK_DAYS, RSI_PERIOD, \
+    SCAN_MAX_WORKERS
+from data_provider import YFinanceProvider, yahoo_ticker
+from database import get_connection
+from get_nse_data import rsi_matrix
+from market_calendar import IST, last_settled_session, to_ist
+from multi_year_breakout import concurrent_sync_stock_history
+from price_store import SQLitePriceStore
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+# Stored closes re-checked against indicator_state before folding in new bars
+REVISION_CHECK_BARS = 5
+
+# Same column names get_nse_data.get_historical_data produces for the last row
+INDICATOR_COLUMNS = ['Close', '% change for that Day', '200 DMA (close)', 'Price % from 200 DMA',
+                     '50 DMA (close)', 'Price < 50DMA < 200DMA', 'RSI']
+
+
+def load_close_histories(symbols, start_date, end_date, db_path=DATABASE_FILE_PATH):
+    # Daily closes per symbol from historical_data: {symbol: Series indexed by date}
+    universe = SQLitePriceStore(db_path).load_universe(list(symbols), start_date, end_date)
+    return {symbol: pd.Series(columns['close'], index=pd.to_datetime(columns['date'], unit='D'))
+            for symbol, columns in universe.items()}
+
+
+def fetch_latest_quotes(symbols, provider=None, chunk_size=BULK_DOWNLOAD_CHUNK_SIZE):
+    # Latest-quote stage: live prices for a whole watchlist from one batched provider call
+    # per chunk. Returns {symbol: (date, price)}; symbols without a quote are left out.
+    provider = provider or YFinanceProvider()
+    symbols = list(dict.fromkeys(symbols))
+    quotes = {}
+    for i in range(0, len(symbols), chunk_size):
+        chunk = symbols[i:i + chunk_size]
+        tickers = [yahoo_ticker(symbol) for symbol in chunk]
+        try:
+            chunk_quotes = provider.latest_quotes(tickers)
+        except Exception as e:
+            logger.error(f"Latest quote request failed for {', '.join(chunk)}: {str(e)}")
+            continue
+        for symbol, ticker in zip(chunk, tickers):
+            if ticker in chunk_quotes:
+                date, price = chunk_quotes[ticker]
+                quotes[symbol] = (pd.Timestamp(date).normalize(), float(price))
+    logger.info(f"Fetched latest quotes for {len(quotes)} of {len(symbols)} symbols")
+    return quotes
+
+
+def apply_latest_bar(closes, latest_bar):
+    # Append today's live price, or overwrite the stored bar for the same day
+    if latest_bar is None:
+        return closes
+    date, price = latest_bar
+    closes = closes.copy()
+    closes.loc[pd.Timestamp(date)] = price
+    return closes.sort_index()
+
+
+def aligned_close_matrix(histories):
+    # Right-align every symbol's closes so the last row holds each symbol's latest bar.
+    # Rolling windows and the RSI recurrence only depend on bar order, not on dates.
+    length = max((len(closes) for closes in histories.values()), default=0)
+    matrix = np.full((length, len(histories)), np.nan)
+    for column, closes in enumerate(histories.values()):
+        if len(closes):
+            matrix[length - len(closes):, column] = closes.to_numpy(dtype=float)
+    return pd.DataFrame(matrix, columns=list(histories))
+
+
+def compute_indicators(closes, rsi_period=RSI_PERIOD):
+    # Latest watchlist indicators for every column of a right-aligned close matrix
+    if closes.empty:
+        return pd.DataFrame(columns=INDICATOR_COLUMNS)
+
+    last_close = closes.iloc[-1]
+    previous_close = closes.shift(1).iloc[-1]
+    dma_200 = closes.rolling(window=200).mean().iloc[-1]
+    dma_50 = closes.rolling(window=50).mean().iloc[-1]
+
+    indicators = pd.DataFrame({
+        'Close': last_close,
+        '% change for that Day': (last_close / previous_close - 1) * 100,
+        '200 DMA (close)': dma_200,
+        'Price % from 200 DMA': (last_close - dma_200) / dma_200 * 100,
+        '50 DMA (close)': dma_50,
+        'Price < 50DMA < 200DMA': (last_close < dma_50) & (dma_50 < dma_200),
+        'RSI': rsi_matrix(closes, period=rsi_period).iloc[-1],
+    })
+    return indicators[INDICATOR_COLUMNS]
+
+
+def watchlist_indicators(symbols, sync=True, live=True, provider=None, db_path=DATABASE_FILE_PATH,
+                         lookback_days=INDICATOR_LOOKBACK_DAYS, current_date=None, max_workers=SCAN_MAX_WORKERS,
+                         progress_callback=None):
+    # Indicators for a list of symbols from the local store. Only the missing tail of each
+    # history is downloaded (on a worker pool), live prices come from one batched quote stage, then
+    # everything is computed locally in one pass.
+    symbols = list(dict.fromkeys(symbols))
+    current_date = current_date or to_ist()  # IST wall clock, whatever the container timezone
+    start_date = current_date - timedelta(days=lookback_days)
+
+    if sync:
+        concurrent_sync_stock_history(symbols, start_date, current_date, max_workers=max_workers, provider=provider,
+                                      progress_callback=progress_callback)
+
+    stored = load_close_histories(symbols, start_date, current_date, db_path=db_path)
+    histories = {symbol: stored[symbol] for symbol in symbols if symbol in stored}
+    missing = [symbol for symbol in symbols if symbol not in stored]
+    if missing:
+        logger.warning(f"No stored history for {', '.join(missing)}")
+
+    if live:
+        quotes = fetch_latest_quotes(list(histories), provider=provider)
+        histories = {symbol: apply_latest_bar(closes, quotes.get(symbol)) for symbol, closes in histories.items()}
+
+    indicators = compute_indicators(aligned_close_matrix(histories))
+    logger.info(f"Computed indicators for {len(indicators)} of {len(symbols)} symbols")
+    return indicators
+
+
+def new_indicator_state(symbol):
+    # Empty rolling state; advance_indicator_state folds closes into it one bar at a time
+    return {
+        'symbol': symbol,
+        'last_date': None,
+        'bars': 0,
+        'prev_close': None,
+        'last_close': None,
+        'sum_50': 0.0,
+        'sum_200': 0.0,
+        'closes_window': deque(maxlen=200),
+        'avg_gain': 0.0,
+        'avg_loss': 0.0,
+    }
+
+
+def advance_indicator_state(state, bars, rsi_period=RSI_PERIOD):
+    # Fold (date, close) bars into the state in O(1) per bar
+    window = state['closes_window']
+    for date, close in bars:
+        close = float(close)
+        previous = state['last_close']
+        gain = max(close - previous, 0.0) if previous is not None else 0.0
+        loss = max(previous - close, 0.0) if previous is not None else 0.0
+
+        # Wilder averages: plain sums for the first `rsi_period` bars, then the recurrence
+        state['bars'] += 1
+        if state['bars'] < rsi_period:
+            state['avg_gain'] += gain
+            state['avg_loss'] += loss
+        elif state['bars'] == rsi_period:
+            state['avg_gain'] = (state['avg_gain'] + gain) / rsi_period
+            state['avg_loss'] = (state['avg_loss'] + loss) / rsi_period
+        else:
+            state['avg_gain'] = (state['avg_gain'] * (rsi_period - 1) + gain) / rsi_period
+            state['avg_loss'] = (state['avg_loss'] * (rsi_period - 1) + loss) / rsi_period
+
+        # Rolling sums: add the new close, drop the one leaving each window
+        if len(window) >= 50:
+            state['sum_50'] -= window[-50]
+        if len(window) == window.maxlen:
+            state['sum_200'] -= window[0]
+        window.append(close)
+        state['sum_50'] += close
+        state['sum_200'] += close
+
+        state['prev_close'] = previous
+        state['last_close'] = close
+        state['last_date'] = pd.Timestamp(date).strftime('%Y-%m-%d')
+    return state
+
+
+def copy_indicator_state(state):
+    copy = dict(state)
+    copy['closes_window'] = deque(state['closes_window'], maxlen=state['closes_window'].maxlen)
+    return copy
+
+
+def state_indicators(state, rsi_period=RSI_PERIOD):
+    # Indicator values for the latest bar folded into the state
+    window = state['closes_window']
+    close = state['last_close'] if state['last_close'] is not None else np.nan
+    previous = state['prev_close'] if state['prev_close'] is not None else np.nan
+    dma_200 = state['sum_200'] / 200 if len(window) >= 200 else np.nan
+    dma_50 = state['sum_50'] / 50 if len(window) >= 50 else np.nan
+
+    rsi = np.nan
+    if state['bars'] > rsi_period:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - (100 / (1 + np.float64(state['avg_gain']) / np.float64(state['avg_loss'])))
+
+    return {
+        'Close': close,
+        '% change for that Day': (close / previous - 1) * 100,
+        '200 DMA (close)': dma_200,
+        'Price % from 200 DMA': (close - dma_200) / dma_200 * 100,
+        '50 DMA (close)': dma_50,
+        'Price < 50DMA < 200DMA': bool(close < dma_50 < dma_200),
+        'RSI': float(rsi),
+    }
+
+
+def load_indicator_state(cursor, symbol):
+    cursor.execute('''
+        SELECT last_date, bars, prev_close, last_close, sum_50, sum_200, closes_window, avg_gain, avg_loss
+        FROM indicator_state WHERE symbol = ?
+    ''', (symbol,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    state = new_indicator_state(symbol)
+    state.update(zip(['last_date', 'bars', 'prev_close', 'last_close', 'sum_50', 'sum_200'], row[:6]))
+    state['closes_window'].extend(json.loads(row[6]))
+    state['avg_gain'], state['avg_loss'] = row[7], row[8]
+    return state
+
+
+def save_indicator_state(cursor, state):
+    cursor.execute('''
+        INSERT OR REPLACE INTO indicator_state
+            (symbol, last_date, bars, prev_close, last_close, sum_50, sum_200, closes_window, avg_gain, avg_loss,
+             updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (state['symbol'], state['last_date'], state['bars'], state['prev_close'], state['last_close'],
+          state['sum_50'], state['sum_200'], json.dumps(list(state['closes_window'])), state['avg_gain'],
+          state['avg_loss'], datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S')))
+
+
+def state_is_current(cursor, state):
+    # The last few closes folded into the state must still match historical_data; the sync
+    # re-fetches an overlap of recent days and may have revised them
+    cursor.execute('''
+        SELECT close FROM historical_data
+        WHERE symbol = ? AND date <= ?
+        ORDER BY date DESC LIMIT ?
+    ''', (state['symbol'], state['last_date'], REVISION_CHECK_BARS))
+    stored = [row[0] for row in cursor.fetchall()][::-1]
+    folded = list(state['closes_window'])[-len(stored):] if stored else []
+    return len(stored) == min(REVISION_CHECK_BARS, state['bars']) and stored == folded
+
+
+def update_indicator_state(cursor, symbol, final_date, start_date):
+    # Bring one symbol's persisted state up to final_date. Only bars after the state's
+    # last_date are read; a revised or missing state is rebuilt from start_date.
+    # Returns (state, whether any bar was folded in).
+    final_date = pd.Timestamp(final_date).strftime('%Y-%m-%d')
+    state = load_indicator_state(cursor, symbol)
+
+    if state is not None and state_is_current(cursor, state):
+        cursor.execute('''
+            SELECT date, close FROM historical_data
+            WHERE symbol = ? AND date > ? AND date <= ?
+            ORDER BY date
+        ''', (symbol, state['last_date'], final_date))
+        new_bars = cursor.fetchall()
+        if not new_bars:
+            return state, False
+        logger.info(f"Folding {len(new_bars)} new bars into the indicator state for {symbol}")
+    else:
+        logger.info(f"Rebuilding the indicator state for {symbol} from {pd.Timestamp(start_date).date()}")
+        state = new_indicator_state(symbol)
+        cursor.execute('''
+            SELECT date, close FROM historical_data
+            WHERE symbol = ? AND date >= ? AND date <= ?
+            ORDER BY date
+        ''', (symbol, pd.Timestamp(start_date).strftime('%Y-%m-%d'), final_date))
+        new_bars = cursor.fetchall()
+        if not new_bars:
+            return None, False
+
+    advance_indicator_state(state, new_bars)
+    save_indicator_state(cursor, state)
+    return state, True
+
+
+def incremental_watchlist_indicators(symbols, sync=True, live=True, provider=None, db_path=DATABASE_FILE_PATH,
+                                     lookback_days=INDICATOR_LOOKBACK_DAYS, current_date=None,
+                                     max_workers=SCAN_MAX_WORKERS, only_changed=False, progress_callback=None):
+    # Same output as watchlist_indicators, but each symbol's completed sessions are folded into
+    # indicator_state once. Bars of a session still in progress (stored or live) are applied to a
+    # copy of the state and never persisted. With only_changed, symbols with no new bar since the
+    # last run are left out.
+    symbols = list(dict.fromkeys(symbols))
+    current_date = current_date or to_ist()  # IST wall clock, whatever the container timezone
+    start_date = current_date - timedelta(days=lookback_days)
+    # A bar only becomes final once it has settled after the close
+    final_date = last_settled_session(current_date).date()
+
+    if sync:
+        concurrent_sync_stock_history(symbols, start_date, current_date, max_workers=max_workers, provider=provider,
+                                      progress_callback=progress_callback)
+
+    quotes = fetch_latest_quotes(symbols, provider=provider) if live else {}
+
+    records = {}
+    conn = get_connection(db_path)
+    try:
+        cursor = conn.cursor()
+        for symbol in symbols:
+            state, changed = update_indicator_state(cursor, symbol, final_date, start_date)
+            if state is None:
+                logger.warning(f"No stored history for {symbol}")
+                continue
+
+            cursor.execute('''
+                SELECT date, close FROM historical_data
+                WHERE symbol = ? AND date > ?
+                ORDER BY date
+            ''', (symbol, state['last_date']))
+            pending = dict(cursor.fetchall())
+            latest_bar = quotes.get(symbol)
+            if latest_bar is not None and latest_bar[0].strftime('%Y-%m-%d') > state['last_date']:
+                pending[latest_bar[0].strftime('%Y-%m-%d')] = latest_bar[1]
+
+            if pending:
+                state = advance_indicator_state(copy_indicator_state(state), sorted(pending.items()))
+            elif only_changed and not changed:
+                continue
+            records[symbol] = state_indicators(state)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logger.info(f"Computed indicators for {len(records)} of {len(symbols)} symbols from stored state")
+    return pd.DataFrame.from_dict(records, orient='index', columns=INDICATOR_COLUMNS)
@@ -0,0 +1,72 @@
+import logging
+import sqlite3
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+JOB_COLUMNS = ['id', 'kind', 'watchlist_name', 'status', 'requested_at', 'started_at', 'finished_at', 'worker',
+               'error']
+
+
+def enqueue_refresh(cursor, kind='all', watchlist_name=None):
+    # Queue a refresh for refresh_worker.py. An identical job still waiting is reused.
+    cursor.execute('''
+        SELECT id FROM refresh_jobs
+        WHERE status = 'queued' AND kind = ? AND watchlist_name IS ?
+        ORDER BY id LIMIT 1
+    ''', (kind, watchlist_name))
+    row = cursor.fetchone()
+    if row is not None:
+        return row[0]
+
+    cursor.execute('INSERT INTO refresh_jobs (kind, watchlist_name) VALUES (?, ?)', (kind, watchlist_name))
+    cursor.connection.commit()
+    logger.info(f"Queued refresh job {cursor.lastrowid} ({kind} {watchlist_name or ''})")
+    return cursor.lastrowid
+
+
+def claim_next_job(conn, worker):
+    # Atomically move the oldest queued job to running and return it as a dict, or None
+    cursor = conn.execute('''
+        UPDATE refresh_jobs
+        SET status = 'running', started_at = CURRENT_TIMESTAMP, worker = ?
+        WHERE id = (SELECT id FROM refresh_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+        RETURNING id, kind, watchlist_name, status, requested_at, started_at, finished_at, worker, error
+    ''', (worker,))
+    row = cursor.fetchone()
+    conn.commit()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def finish_job(conn, job_id, error=None):
+    conn.execute('''
+        UPDATE refresh_jobs
+        SET status = ?, finished_at = CURRENT_TIMESTAMP, error = ?
+        WHERE id = ?
+    ''', ('failed' if error else 'done', error, job_id))
+    conn.commit()
+
+
+def requeue_stale_jobs(conn, minutes):
+    # Jobs left running by a worker that died go back to the queue
+    cursor = conn.execute('''
+        UPDATE refresh_jobs
+        SET status = 'queued', started_at = NULL, worker = NULL
+        WHERE status = 'running' AND started_at < datetime('now', ?)
+    ''', (f'-{int(minutes)} minutes',))
+    conn.commit()
+    return cursor.rowcount
+
+
+def get_recent_jobs(cursor, limit=10):
+    try:
+        cursor.execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM refresh_jobs ORDER BY id DESC LIMIT ?', (limit,))
+        return [dict(zip(JOB_COLUMNS, row)) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error reading refresh jobs: {e}")
+        return []
+
+
+def get_queue_depth(cursor):
+    cursor.execute("SELECT COUNT(*) FROM refresh_jobs WHERE status = 'queued'")
+    return cursor.fetchone()[0]
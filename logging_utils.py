@@ -1,10 +1,14 @@
 import streamlit as st
+from streamlit import runtime
 
 def get_log_messages():
     log_messages = st.session_state.get("log_messages", "")
     return log_messages
 
 def update_log_messages(log_message):
+    # Session state only exists inside a Streamlit session; the refresh worker just logs
+    if not runtime.exists():
+        return
     log_messages = get_log_messages()
     log_messages += "\n" + log_message
     st.session_state.log_messages = log_messages
@@ -1,25 +1,18 @@
-import datetime
 import logging
-import pickle
-import sqlite3
-from pathlib import Path
 
 from dotenv import load_dotenv
 load_dotenv()
 
-import pandas as pd
 import streamlit as st
-import streamlit_authenticator as stauth
-import yfinance as yf
 
 # Constants
-from config import DATABASE_FILE_PATH
-from logging_utils import get_log_messages
-from multi_year_breakout import process_csv, display_breakout_stocks, create_tradingview_link, process_manual_input, \
-    create_stocks_table
-from watchlist_display import display_watchlist_data
-from watchlist_management import get_watchlists, create_watchlist_tables, manage_watchlists
-from datetime import datetime, timedelta
+from config import DATABASE_FILE_PATH, SCAN_MAX_WORKERS
+from database import get_connection
+from datetime import datetime
+
+# Everything else is imported inside the tab that needs it: the Display Watchlist tab only reads
+# SQLite, so yfinance, streamlit_authenticator and the breakout scanner load on first use.
+# bench_importtime.py keeps the time to first render within budget.
 
 st.set_page_config(
     page_title="Buy Low Sell High",
@@ -33,6 +26,18 @@ logger = logging.getLogger()
 log_output = st.empty()
 
 
+def scan_progress():
+    # Progress bar for the parallel breakout scan, updated as each symbol completes
+    progress_bar = st.progress(0.0)
+    progress_text = st.empty()
+
+    def show_progress(done, total, symbol, status):
+        progress_bar.progress(done / total)
+        progress_text.text(f"{done}/{total} symbols synced ({symbol}: {status})")
+
+    return show_progress
+
+
 def main():
     st.title("Buy Low Sell High")
 
@@ -49,6 +54,13 @@ def main():
     tabs = st.sidebar.radio("Navigation", ["Display Watchlist", "Manage Watchlists", "Multi Year Breakout Stocks"], key="navigation_tab")
 
     if tabs == "Manage Watchlists":
+        import pickle
+        from pathlib import Path
+
+        import streamlit_authenticator as stauth
+
+        from watchlist_management import manage_watchlists
+
         # ---User Authentication------
         names = ['Rohit Pant']
         usernames = ['rohit']
@@ -81,31 +93,26 @@ def main():
 
         if authentication_status:
 
-            # Database initialization
-            conn = sqlite3.connect(DATABASE_FILE_PATH)
+            # This session's pooled connection, already migrated
+            conn = get_connection(DATABASE_FILE_PATH)
             cursor = conn.cursor()
 
-            # Harvest database tables
-            create_watchlist_tables(cursor)
-
             # User interaction section for managing watchlists
             st.header("User Watchlist Management")
 
             # Display available watchlists as radio buttons and manage watchlists
             selected_watchlist = manage_watchlists(cursor, conn)
 
-            # Close the database connection
-            conn.close()
-
             authenticator.logout("Logout", "sidebar")
 
     elif tabs == "Display Watchlist":
-        # Database initialization
-        conn = sqlite3.connect(DATABASE_FILE_PATH)
-        cursor = conn.cursor()
+        from logging_utils import get_log_messages
+        from watchlist_display import display_watchlist_data
+        from watchlist_management import get_watchlists
 
-        # Harvest database tables
-        create_watchlist_tables(cursor)
+        # This session's pooled connection, already migrated
+        conn = get_connection(DATABASE_FILE_PATH)
+        cursor = conn.cursor()
 
         # User interaction section for displaying watchlist data
         st.header("Display Watchlist Data")
@@ -121,10 +128,12 @@ def main():
         st.subheader("Log Messages")
         st.text_area("Log Messages", value=log_messages, height=200)
 
-        # Close the database connection
-        conn.close()
-
     elif tabs == "Multi Year Breakout Stocks":
+        import pandas as pd
+
+        from multi_year_breakout import process_csv, display_breakout_stocks, create_tradingview_link, \
+            process_manual_input, create_stocks_table, read_symbols_csv, run_parameter_grid
+
         st.header("Multi-Year Breakout Analysis")
 
         # Initialize session state defaults for widgets
@@ -138,6 +147,8 @@ def main():
             st.session_state.weeks_back_input = 12
         if 'input_option_radio' not in st.session_state:
             st.session_state.input_option_radio = "Manual Input"
+        if 'scan_workers_input' not in st.session_state:
+            st.session_state.scan_workers_input = SCAN_MAX_WORKERS
         if 'manual_symbols_input' not in st.session_state:
             st.session_state.manual_symbols_input = "20MICRONS,21STCENMGM,AHIMSA,AIMTRON,ALEMBICLTD,ALPEXSOLAR,ALUWIND,AMEYA,ARVINDFASN,ASAHISONG,ASAL,ASALCBR,ASHOKA,AVPINFRA,AXISBANK,AXISCETF,AXISHCETF,BAJAJCON,BALUFORGE,BANKBEES,BASF,BAYERCROP,BBNPPGOLD,BEPL,BHARATFORG,BIKAJI,BIOCON,BLUECHIP,BLUEJET,BPL,BYKE,CHAMBLFERT,CHAVDA,CHOICEIN,CMRSL,CROMPTON,CROWN,DBL,DEEPAKNTR,DHANUKA,DIXON,DONEAR,DREDGECORP,EBBETF0430,EFACTOR,ELIN,EMMIL,ENSER,ESCORTS,ESG,EXCELINDUS,EXICOM,FACT,FEDERALBNK,FOSECOIND,GALLANTT,GANECOS,GAYAHWS,GEECEE,GEPIL,GMRP&UI,GODFRYPHLP,GRANULES,GRAVITA,GRINFRA,GSEC5IETF,HERCULES,HESTERBIO,HOACFOODS,HONDAPOWER,HSCL,HUHTAMAKI,IBREALEST,IIFLSEC,INDHOTEL,INDIANHUME,INOXGREEN,JINDALSTEL,JISLDVREQS,JNKINDIA,JSWENERGY,JSWINFRA,JSWSTEEL,JTEKTINDIA,JUNIORBEES,K2INFRA,KALYANKJIL,KAYA,KCK,KDL,KICL,KODYTECH,KRISHANA,KRISHNADEF,KSCL,LEMERITE,LGBFORGE,LIQUIDADD,LIQUIDSBI,LLOYDSENGG,LTF,LTFOODS,MAKEINDIA,MAPMYINDIA,MAWANASUG,MAXHEALTH,MEDIASSIST,MHRIL,MICEL,MID150BEES,MIDQ50ADD,MOHITIND,MON100,MOSMALL250,MOTHERSON,NAM-INDIA,NAVA,NFL,NOCIL,NV20BEES,OMINFRAL,OWAIS,PANAMAPET,PASHUPATI,PDMJEPAPER,PENINLAND,PERSISTENT,PILANIINVS,PKTEA,PNC,POKARNA,POLYCAB,POLYMED,PRECWIRE,PREMEXPLN,PRIMESECU,PUNJABCHEM,RACE,RAYMOND,RCF,REDTAPE,REFRACTORY,RKDL,RKFORGE,ROTO,SAMPANN,SANDESH,SAREGAMA,SCILAL,SENCO,SETFNIFBK,SHAKTIPUMP,SHILPAMED,SHRADHA,SILKFLEX,SJLOGISTIC,SKYGOLD,SMALLCAP,SMSPHARMA,SOMICONVEY,SPECTRUM,STOVEKRAFT,STYRENIX,SUMIT,SUMMITSEC,SUNTECK,SUPREMEPWR,SURAJEST,SURANAT&P,SUZLON,SWARAJENG,TBI,TCIFINANCE,TCLCONS,TECHLABS,TECHM,TEXINFRA,TGL,THANGAMAYL,THOMASCOOK,TIMETECHNO,TITAGARH,TNIDETF,UDAICEMENT,USK,UTIBANKETF,V2RETAIL,VGUARD,VILAS,VIVIANA,VMART,VSSL,WHIRLPOOL,WINDMACHIN,ZENITHEXPO,ZENSARTECH,ZTECH"
 
@@ -150,6 +161,8 @@ def main():
         buffer = st.slider("Buffer", min_value=0.01, max_value=0.20, step=0.01, format="%.2f",
                            help="Select the buffer percentage for breakout analysis", key="buffer_slider")
         weeks_back = st.number_input("Weeks Back", min_value=0, key="weeks_back_input")
+        scan_workers = st.number_input("Parallel Workers", min_value=1, max_value=32, key="scan_workers_input",
+                                       help="Number of batched download requests run concurrently (1 = serial scan)")
 
         # Provide an option to upload a CSV file or input manually
         input_option = st.radio("Input Option", ["Upload CSV", "Manual Input"], key="input_option_radio")
@@ -171,13 +184,19 @@ def main():
         else:
             st.sidebar.success("✅ AI Analysis Ready")
 
+        # Symbols from whichever input is active, used by the parameter grid below
+        grid_symbols = []
+
         if input_option == "Upload CSV":
             uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
             if uploaded_file is not None:
+                grid_symbols = read_symbols_csv(uploaded_file)
+                uploaded_file.seek(0)
                 if st.button("Analyze CSV"):
                     create_stocks_table()
                     if analyze:
-                        breakout_stocks = process_csv(uploaded_file, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back)
+                        breakout_stocks = process_csv(uploaded_file, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back,
+                                                      max_workers=scan_workers, progress_callback=scan_progress())
                         st.session_state.breakout_results = {
                             "stocks": breakout_stocks,
                             "years_gap": years_gap,
@@ -196,11 +215,14 @@ def main():
             # Use session state for text area to preserve value across reruns
             manual_input = st.text_area("Enter stock symbols separated by commas", key="manual_symbols_input")
             if manual_input:
+                grid_symbols = [symbol.strip() for symbol in manual_input.split(",")]
                 if st.button("Analyze Manual Input"):
                     create_stocks_table()
                     stock_symbols = [symbol.strip() for symbol in manual_input.split(",")]
                     if analyze:
-                        breakout_stocks = process_manual_input(stock_symbols, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back)
+                        breakout_stocks = process_manual_input(stock_symbols, years_gap=years_gap, buffer=buffer,
+                                                               weeks_back=weeks_back, max_workers=scan_workers,
+                                                               progress_callback=scan_progress())
                         st.session_state.breakout_results = {
                             "stocks": breakout_stocks,
                             "years_gap": years_gap,
@@ -213,6 +235,31 @@ def main():
                         df = pd.DataFrame({'Symbols': symbols_with_links})
                         st.markdown(df.to_html(escape=False), unsafe_allow_html=True)
 
+        # Parameter grid: every years_gap x buffer combination from a single data load
+        with st.expander("Parameter Grid (Years Gap x Buffer)"):
+            grid_gaps = st.multiselect("Years Gaps", list(range(1, 11)), default=[3, 4, 5], key="grid_gaps_select")
+            grid_buffers = st.multiselect("Buffers", [round(0.01 * i, 2) for i in range(1, 21)], default=[0.05, 0.10],
+                                          key="grid_buffers_select")
+            if st.button("Run Parameter Grid"):
+                if not grid_symbols or not grid_gaps or not grid_buffers:
+                    st.warning("Please provide symbols, at least one years gap and at least one buffer.")
+                else:
+                    create_stocks_table()
+                    st.session_state.grid_results = run_parameter_grid(grid_symbols, grid_gaps, grid_buffers,
+                                                                       weeks_back=weeks_back, max_workers=scan_workers,
+                                                                       progress_callback=scan_progress())
+
+            if st.session_state.get("grid_results") is not None:
+                grid = st.session_state.grid_results
+                st.write("Breakouts per years gap (rows) and buffer (columns)")
+                st.dataframe(grid['is_breakout'].groupby(level=['years_gap', 'buffer']).sum().unstack('buffer'))
+                st.download_button(
+                    label="Download results cube as CSV",
+                    data=grid.reset_index().to_csv(index=False).encode('utf-8'),
+                    file_name='breakout_parameter_grid.csv',
+                    mime='text/csv',
+                )
+
         if "breakout_results" in st.session_state and st.session_state.breakout_results:
             results = st.session_state.breakout_results
             display_breakout_stocks(results["stocks"], results["years_gap"], results["buffer"], results["weeks_back"], api_key=gemini_api_key)
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from config import MARKET_OPEN_TIME, MARKET_CLOSE_TIME, NSE_HOLIDAYS, REFRESH_INTERVAL_MINUTES, \
+    POST_CLOSE_REFRESH_DELAY_MINUTES
+
+IST = pytz.timezone('Asia/Kolkata')
+HOLIDAYS = frozenset(datetime.strptime(day, '%Y-%m-%d').date() for day in NSE_HOLIDAYS)
+
+
+def to_ist(now=None):
+    # Naive IST wall-clock time; naive inputs are taken to be IST already
+    now = now or datetime.now(IST)
+    if now.tzinfo is not None:
+        now = now.astimezone(IST).replace(tzinfo=None)
+    return now
+
+
+def is_trading_day(day):
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.weekday() < 5 and day not in HOLIDAYS
+
+
+def session_open(day):
+    return datetime.combine(day, datetime.min.time()).replace(hour=MARKET_OPEN_TIME[0], minute=MARKET_OPEN_TIME[1])
+
+
+def session_close(day):
+    return datetime.combine(day, datetime.min.time()).replace(hour=MARKET_CLOSE_TIME[0], minute=MARKET_CLOSE_TIME[1])
+
+
+def market_phase(now=None):
+    # 'open' during a session, 'after_close' for the rest of a trading day, 'closed' otherwise
+    now = to_ist(now)
+    if not is_trading_day(now):
+        return 'closed'
+    if session_open(now.date()) <= now < session_close(now.date()):
+        return 'open'
+    if now >= session_close(now.date()):
+        return 'after_close'
+    return 'closed'
+
+
+def last_trading_session(now=None):
+    # Return the close time (IST, naive) of the most recent completed NSE session
+    now = to_ist(now)
+    day = now.date()
+    if now < session_close(day):
+        day -= timedelta(days=1)
+
+    # Roll weekends and holidays back to the previous trading day
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+
+    return session_close(day)
+
+
+def settle_time(day):
+    # Bars of a session are final POST_CLOSE_REFRESH_DELAY_MINUTES after its close
+    return session_close(day) + timedelta(minutes=POST_CLOSE_REFRESH_DELAY_MINUTES)
+
+
+def last_settled_session(now=None):
+    # Close time (IST, naive) of the most recent session whose bar has settled
+    return last_trading_session(to_ist(now) - timedelta(minutes=POST_CLOSE_REFRESH_DELAY_MINUTES))
+
+
+def is_post_close_run(now=None):
+    # Whether a refresh at now is the end-of-day run that sees the settled bar
+    now = to_ist(now)
+    return market_phase(now) == 'after_close' and now >= settle_time(now.date())
+
+
+def next_session_open(now=None):
+    # Open time (IST, naive) of the next session that has not started yet
+    now = to_ist(now)
+    day = now.date()
+    if now >= session_open(day):
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return session_open(day)
+
+
+def next_refresh_time(now=None, post_close_session=None, failed=False):
+    # Refresh schedule: every REFRESH_INTERVAL_MINUTES while the market is open, once more when the
+    # day's bar has settled (post_close_session is the day that run already happened, see
+    # is_post_close_run), then idle until the next session opens. A failed run is retried no sooner
+    # than REFRESH_INTERVAL_MINUTES later. Returns a naive IST datetime.
+    now = to_ist(now)
+    phase = market_phase(now)
+    end_of_day = settle_time(now.date())
+
+    if failed:
+        return max(next_refresh_time(now, post_close_session), now + timedelta(minutes=REFRESH_INTERVAL_MINUTES))
+    if phase == 'open':
+        # The last intraday run lands on the close; the end-of-day run follows once the bar settles
+        return min(now + timedelta(minutes=REFRESH_INTERVAL_MINUTES), session_close(now.date()))
+    if phase == 'after_close' and post_close_session != now.date():
+        return max(now, end_of_day)
+    return next_session_open(now)
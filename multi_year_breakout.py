@@ -1,114 +1,386 @@
 import datetime
 import logging
+import queue
 # Constants
-import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 
 import pandas as pd
 import streamlit as st
-import yfinance as yf
 
 # Configure logging to print to console
-from config import DATABASE_FILE_PATH
+from config import DATABASE_FILE_PATH, BULK_DOWNLOAD_CHUNK_SIZE, SCAN_MAX_WORKERS, SCAN_RETRIES, \
+    SCAN_RETRY_BACKOFF_SECONDS, SCAN_SYMBOL_TIMEOUT_SECONDS, VIEW_CACHE_MAX_ENTRIES
+from breakout_screener import evaluate_parameter_grid
+from data_provider import YFinanceProvider, flatten_columns, split_by_ticker, yahoo_ticker
+from database import close_connections, get_connection
+from fundamentals import get_fundamentals, load_fundamentals, prefetch_fundamentals, prefetch_in_background
+from market_calendar import IST, last_settled_session, settle_time
+from price_store import get_price_store
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger()
 
+# Incremental sync settings
+SYNC_OVERLAP_DAYS = 5  # Re-fetch a few stored days to pick up late revisions
 
-def create_stocks_table():
-    # Connect to SQLite database
-    conn = sqlite3.connect(DATABASE_FILE_PATH)
-    cursor = conn.cursor()
 
-    # Create table to store historical data
+def create_stocks_table():
+    # Create or upgrade the historical_data and cache_info tables (see database.MIGRATIONS).
+    # The pooled connection migrates once per process, later calls are free.
+    get_connection(DATABASE_FILE_PATH)
+
+HISTORICAL_DATA_UPSERT = '''
+    INSERT INTO historical_data (symbol, date, high, low, close, adjusted_close, volume)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(symbol, date) DO UPDATE SET
+        high = excluded.high,
+        low = excluded.low,
+        close = excluded.close,
+        adjusted_close = excluded.adjusted_close,
+        volume = excluded.volume
+    WHERE high IS NOT excluded.high
+       OR low IS NOT excluded.low
+       OR close IS NOT excluded.close
+       OR adjusted_close IS NOT excluded.adjusted_close
+       OR volume IS NOT excluded.volume
+'''
+
+
+def frame_to_rows(symbol, df):
+    # Turn an OHLCV frame into historical_data parameter tuples column by column
+    dates = pd.DatetimeIndex(df.index).strftime('%Y-%m-%d')
+    return list(zip([symbol] * len(df), dates, df['High'].tolist(), df['Low'].tolist(), df['Close'].tolist(),
+                    df['Adj Close'].tolist(), df['Volume'].tolist()))
+
+
+def store_stocks_data(cursor, symbol, df, start_date):
+    # Write one symbol's downloaded OHLCV frame into historical_data and cache_info.
+    # Returns the number of rows actually changed, or None if the frame is unusable.
+    df = flatten_columns(df)
+
+    # Ensure 'Adj Close' exists (fallback to 'Close' if missing)
+    if 'Adj Close' not in df.columns:
+        if 'Close' in df.columns:
+            df['Adj Close'] = df['Close']
+        else:
+            logger.error(f"Neither 'Adj Close' nor 'Close' found for {symbol}")
+            return None
+
+    # Multi-ticker frames share one date index, skip days this symbol did not trade
+    df = df.dropna(subset=['Close'])
+    if df.empty:
+        logger.warning(f"No data fetched for {symbol}. Cache will not be updated.")
+        return None
+
+    # Insert data into historical_data table in one executemany call.
+    # Upsert so that overlapping days pick up revised values; unchanged rows are left alone.
+    changes_before = cursor.connection.total_changes
+    cursor.executemany(HISTORICAL_DATA_UPSERT, frame_to_rows(symbol, df))
+    rows_inserted = cursor.connection.total_changes - changes_before
+
+    # Update cache_info table ONLY if we actually got data
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS historical_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT,
-            date DATE,
-            high REAL,
-            low REAL,
-            close REAL,
-            adjusted_close REAL,
-            volume INTEGER,
-            UNIQUE(symbol, date)  -- Ensure unique entries for symbol and date
-        )
-    ''')
+        INSERT INTO cache_info (symbol, last_updated, history_start)
+        VALUES (?, ?, ?)
+        ON CONFLICT(symbol) DO UPDATE SET
+            last_updated = excluded.last_updated,
+            history_start = MIN(
+                COALESCE(cache_info.history_start,
+                         (SELECT MIN(date) FROM historical_data WHERE symbol = excluded.symbol)),
+                excluded.history_start
+            )
+    ''', (symbol, datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S'), pd.Timestamp(start_date).date()))
 
-    # Create table to store cache information
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cache_info (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT,
-            last_updated DATE,
-            UNIQUE(symbol)  -- Ensure unique entries for symbol
-        )
-    ''')
+    return rows_inserted
 
-    # Commit changes and close connection
-    conn.commit()
-    conn.close()
 
-def fetch_and_store_stocks_data(symbol, start_date, end_date):
+def fetch_and_store_stocks_data(symbol, start_date, end_date, provider=None):
     try:
-        # Append '.NS' to the stock symbol for NSE
-        stock_symbol = symbol + '.NS'
+        provider = provider or YFinanceProvider()
+
+        # Yahoo ticker for the symbol ('.NS' suffix for NSE stocks)
+        stock_symbol = yahoo_ticker(symbol)
         # Fetch stock data from Yahoo Finance
-        df = yf.download(stock_symbol, start=start_date, end=end_date)
-        
-        # Handle MultiIndex columns (flatten them if needed)
-        # yfinance >= 0.2.66 might return MultiIndex (Price, Ticker)
-        # Handle MultiIndex columns (flatten them if needed)
-        # yfinance >= 0.2.66 might return MultiIndex (Price, Ticker) or Index with tuples
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-        else:
-            # Fallback for weird tuple-index cases that aren't strict MultiIndex
-            df.columns = [c[0] if isinstance(c, tuple) else c for c in df.columns]
-            
+        frames = split_by_ticker(provider.download([stock_symbol], start_date, end_date), [stock_symbol])
+        df = frames.get(stock_symbol, pd.DataFrame())
+
         logger.info(f"Downloaded data shape for {stock_symbol}: {df.shape}")
         if df.empty:
             logger.warning(f"Downloaded DataFrame is empty for {stock_symbol}!")
-        else:
-            logger.info(f"First 5 rows for {stock_symbol}:\n{df.head()}")
-            
-        # Ensure 'Adj Close' exists (fallback to 'Close' if missing)
-        if 'Adj Close' not in df.columns:
-            if 'Close' in df.columns:
-                df['Adj Close'] = df['Close']
-            else:
-                logger.error(f"Neither 'Adj Close' nor 'Close' found for {stock_symbol}")
-                return
-
-        conn = sqlite3.connect(DATABASE_FILE_PATH)
-        cursor = conn.cursor()
 
-        # Insert data into historical_data table
-        if not df.empty:
-            rows_inserted = 0
-            for index, row in df.iterrows():
-                cursor.execute('''
-                    INSERT OR IGNORE INTO historical_data (symbol, date, high, low, close, adjusted_close, volume)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (symbol, index.date(), row['High'], row['Low'], row['Close'], row['Adj Close'], row['Volume']))
-                rows_inserted += 1
-
-            # Update cache_info table ONLY if we actually got data
-            cursor.execute('''
-                INSERT OR REPLACE INTO cache_info (symbol, last_updated)
-                VALUES (?, ?)
-            ''', (symbol, datetime.today().date()))
-            
+        conn = get_connection(DATABASE_FILE_PATH)
+        try:
+            rows_inserted = store_stocks_data(conn.cursor(), symbol, df, start_date)
             conn.commit()
-            logger.info(f"Data fetched and stored successfully for {symbol}. Rows inserted: {rows_inserted}")
-        else:
-            logger.warning(f"No data fetched for {symbol}. Cache will not be updated.")
+        except Exception:
+            conn.rollback()
+            raise
+
+        if rows_inserted is not None:
+            logger.info(f"Data fetched and stored successfully for {symbol}. Rows changed: {rows_inserted}")
 
     except Exception as e:
         logger.error(f"Error fetching or storing data for {symbol}: {str(e)}")
 
 
-def process_csv(file, years_gap=5, buffer=0.05, weeks_back=0):
+def bulk_fetch_and_store_stocks_data(symbol_windows, end_date, chunk_size=BULK_DOWNLOAD_CHUNK_SIZE, provider=None):
+    # Download many symbols with one multi-ticker request per chunk and store each
+    # chunk in a single transaction. symbol_windows maps symbol -> fetch start date.
+    provider = provider or YFinanceProvider()
+
+    # Symbols sharing a fetch start can share a request
+    symbols_by_start = {}
+    for symbol, start_date in symbol_windows.items():
+        symbols_by_start.setdefault(pd.Timestamp(start_date).normalize(), []).append(symbol)
+
+    stored = {}
+    conn = get_connection(DATABASE_FILE_PATH)
+    try:
+        for start_date, symbols in sorted(symbols_by_start.items()):
+            for i in range(0, len(symbols), chunk_size):
+                chunk = symbols[i:i + chunk_size]
+                tickers = [yahoo_ticker(symbol) for symbol in chunk]
+                logger.info(f"Downloading {len(tickers)} symbols from {start_date.date()} in one batch")
+
+                try:
+                    frames = split_by_ticker(provider.download(tickers, start_date.to_pydatetime(), end_date), tickers)
+                except Exception as e:
+                    logger.error(f"Batch download failed for {', '.join(chunk)}: {str(e)}")
+                    continue
+
+                cursor = conn.cursor()
+                for symbol, ticker in zip(chunk, tickers):
+                    if ticker not in frames:
+                        logger.warning(f"No data fetched for {symbol}. Cache will not be updated.")
+                        continue
+                    rows_inserted = store_stocks_data(cursor, symbol, frames[ticker], start_date)
+                    if rows_inserted is not None:
+                        stored[symbol] = rows_inserted
+                conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logger.info(f"Batch download stored data for {len(stored)} of {len(symbol_windows)} symbols")
+    return stored
+
+
+def get_sync_window(cursor, symbol, start_date, now=None):
+    # Work out which date range still needs to be downloaded for symbol.
+    # Returns None when the stored history is already current.
+    cursor.execute('SELECT last_updated, history_start FROM cache_info WHERE symbol = ?', (symbol,))
+    cache_row = cursor.fetchone()
+    cursor.execute('SELECT MIN(date), MAX(date) FROM historical_data WHERE symbol = ?', (symbol,))
+    first_date, last_date = cursor.fetchone()
+
+    start_date = pd.Timestamp(start_date).normalize()
+    if cache_row is None or last_date is None:
+        return start_date
+
+    # Requested window reaches further back than what we have ever fetched
+    history_start = pd.Timestamp(cache_row[1] or first_date).normalize()
+    if start_date < history_start:
+        return start_date
+
+    # Fetched after the last session's bar settled, nothing new to download
+    last_updated = pd.Timestamp(cache_row[0]) if cache_row[0] else None
+    if last_updated is not None and last_updated >= settle_time(last_settled_session(now).date()):
+        return None
+
+    return pd.Timestamp(last_date) - timedelta(days=SYNC_OVERLAP_DAYS)
+
+
+def sync_stock_history(symbol, start_date, end_date):
+    # Download only the part of [start_date, end_date] missing from historical_data
+    fetch_start = get_sync_window(get_connection(DATABASE_FILE_PATH).cursor(), symbol, start_date)
+
+    if fetch_start is None:
+        logger.info(f"✅ SOURCE: CACHE | {symbol} is current for the last trading session. Skipping download.")
+        return
+
+    if fetch_start <= pd.Timestamp(start_date).normalize():
+        logger.info(f"🆕 SOURCE: YFINANCE | Fetching full history for {symbol} from {fetch_start.date()}.")
+    else:
+        logger.info(f"🔄 SOURCE: YFINANCE | Fetching {symbol} from {fetch_start.date()} (incremental).")
+    fetch_and_store_stocks_data(symbol, fetch_start.to_pydatetime(), end_date)
+
+
+def bulk_sync_stock_history(symbols, start_date, end_date, chunk_size=BULK_DOWNLOAD_CHUNK_SIZE, provider=None):
+    # Bring historical_data up to date for many symbols using batched downloads
+    cursor = get_connection(DATABASE_FILE_PATH).cursor()
+    symbol_windows = {}
+    for symbol in dict.fromkeys(symbols):
+        fetch_start = get_sync_window(cursor, symbol, start_date)
+        if fetch_start is not None:
+            symbol_windows[symbol] = fetch_start
+
+    logger.info(f"{len(symbol_windows)} of {len(set(symbols))} symbols need a download")
+    if symbol_windows:
+        bulk_fetch_and_store_stocks_data(symbol_windows, end_date, chunk_size=chunk_size, provider=provider)
+
+
+def download_with_retry(provider, chunk, start_date, end_date, retries, backoff, started):
+    # Worker task: download a chunk of symbols with one multi-ticker request, retrying failures
+    # with exponential backoff. Returns ({symbol: frame or None}, attempts).
+    started[chunk] = time.monotonic()
+    tickers = [yahoo_ticker(symbol) for symbol in chunk]
+    for attempt in range(1, retries + 2):
+        try:
+            frames = split_by_ticker(provider.download(tickers, start_date.to_pydatetime(), end_date), tickers)
+            return {symbol: frames.get(ticker) for symbol, ticker in zip(chunk, tickers)}, attempt
+        except Exception as e:
+            if attempt > retries:
+                raise
+            delay = backoff * 2 ** (attempt - 1)
+            logger.warning(f"Download attempt {attempt} failed for {', '.join(chunk)}: {str(e)}. "
+                           f"Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def sqlite_writer(write_queue, written):
+    # Single writer thread: the only connection that writes during a concurrent scan.
+    # The thread ends with the scan, so its connection is closed rather than pooled.
+    conn = get_connection(DATABASE_FILE_PATH)
+    try:
+        cursor = conn.cursor()
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            symbol, df, start_date = item
+            try:
+                written[symbol] = store_stocks_data(cursor, symbol, df, start_date)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error storing data for {symbol}: {str(e)}")
+                written[symbol] = None
+    finally:
+        close_connections()
+
+
+def concurrent_sync_stock_history(symbols, start_date, end_date, max_workers=SCAN_MAX_WORKERS,
+                                  retries=SCAN_RETRIES, backoff=SCAN_RETRY_BACKOFF_SECONDS,
+                                  timeout=SCAN_SYMBOL_TIMEOUT_SECONDS, chunk_size=BULK_DOWNLOAD_CHUNK_SIZE,
+                                  provider=None, progress_callback=None):
+    # Bring historical_data up to date with a bounded pool of download workers. Each worker fetches
+    # a chunk of up to chunk_size symbols per request, as bulk_sync_stock_history does; retries and
+    # the timeout apply to the whole chunk.
+    # Returns {symbol: {'status', 'attempts', 'error'}}; progress_callback(done, total, symbol, status)
+    # is called from the calling thread as each symbol completes.
+    provider = provider or YFinanceProvider()
+    symbols = list(dict.fromkeys(symbols))
+    sync = {symbol: {'status': 'cached', 'attempts': 0, 'error': None} for symbol in symbols}
+
+    cursor = get_connection(DATABASE_FILE_PATH).cursor()
+    symbol_windows = {symbol: get_sync_window(cursor, symbol, start_date) for symbol in symbols}
+
+    done = 0
+    for symbol in symbols:
+        if symbol_windows[symbol] is None:
+            done += 1
+            if progress_callback:
+                progress_callback(done, len(symbols), symbol, 'cached')
+
+    # Symbols sharing a fetch start can share a request
+    symbols_by_start = {}
+    for symbol, window in symbol_windows.items():
+        if window is not None:
+            symbols_by_start.setdefault(window, []).append(symbol)
+    chunks = {tuple(symbols_for_start[i:i + chunk_size]): window
+              for window, symbols_for_start in sorted(symbols_by_start.items())
+              for i in range(0, len(symbols_for_start), chunk_size)}
+
+    def finish(chunk, status, attempts=0, error=None):
+        nonlocal done
+        for symbol in chunk:
+            sync[symbol] = {'status': status, 'attempts': attempts, 'error': error}
+            done += 1
+            if progress_callback:
+                progress_callback(done, len(symbols), symbol, status)
+
+    write_queue = queue.Queue()
+    written = {}
+    writer = threading.Thread(target=sqlite_writer, args=(write_queue, written), daemon=True)
+    writer.start()
+
+    started = {}
+    hung = 0
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {pool.submit(download_with_retry, provider, chunk, window, end_date, retries, backoff, started): chunk
+                   for chunk, window in chunks.items()}
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+
+            # Give up on chunks that have been running for longer than the timeout
+            now = time.monotonic()
+            for future in list(pending):
+                chunk = futures[future]
+                if chunk in started and now - started[chunk] > timeout:
+                    pending.discard(future)
+                    future.cancel()
+                    logger.error(f"Download timed out for {', '.join(chunk)} after {timeout}s")
+                    hung += 1
+                    finish(chunk, 'timeout', error=f"Timed out after {timeout}s")
+
+            # Every worker is stuck on a hung download, nothing queued can start
+            if hung >= max_workers:
+                for future in pending:
+                    finish(futures[future], 'timeout', error="No free download workers")
+                pending = set()
+
+            for future in finished:
+                chunk = futures[future]
+                try:
+                    frames, attempts = future.result()
+                except Exception as e:
+                    logger.error(f"Download failed for {', '.join(chunk)}: {str(e)}")
+                    finish(chunk, 'failed', retries + 1, str(e))
+                    continue
+                for symbol in chunk:
+                    df = frames[symbol]
+                    if df is None or df.empty:
+                        finish((symbol,), 'empty', attempts)
+                    else:
+                        write_queue.put((symbol, df, chunks[chunk]))
+                        finish((symbol,), 'fetched', attempts)
+    finally:
+        # Hung downloads are abandoned rather than waited for
+        pool.shutdown(wait=False, cancel_futures=True)
+        write_queue.put(None)
+        writer.join()
+
+    for symbol, rows in written.items():
+        if rows is None:
+            sync[symbol]['status'] = 'failed'
+            sync[symbol]['error'] = sync[symbol]['error'] or "Could not store downloaded data"
+
+    return sync
+
+
+def scan_breakouts(stock_symbols, years_gap=5, buffer=0.05, weeks_back=0, max_workers=SCAN_MAX_WORKERS,
+                   provider=None, progress_callback=None):
+    # Parallel scan mode: concurrent download stage, then breakout checks against the local
+    # store. Returns one result dict per symbol in input order.
+    sync = concurrent_sync_stock_history(stock_symbols, datetime.today() - timedelta(days=365 * (years_gap + 10)),
+                                         datetime.today(), max_workers=max_workers, provider=provider,
+                                         progress_callback=progress_callback)
+
+    results = []
+    for stock in stock_symbols:
+        result = evaluate_multi_year_breakout(stock, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back,
+                                              sync=False)
+        result.update(sync.get(stock, {'status': 'cached', 'attempts': 0, 'error': None}))
+        results.append(result)
+    return results
+
+
+def read_symbols_csv(file):
     # Read the CSV file
     df = pd.read_csv(file)
     df.columns = df.columns.str.strip()
@@ -117,106 +389,93 @@ def process_csv(file, years_gap=5, buffer=0.05, weeks_back=0):
     df.columns = df.columns.str.strip().str.lower()
     correct_column_name = 'symbol'
 
-    # Create a list to store results
-    breakout_stocks = []
+    return list(df[correct_column_name])
 
-    # Iterate over the list of stocks
-    for stock in df[correct_column_name]:
-        logger.info(f"##########################################{stock}##################################")
-        logger.info(f"Processing stock: {stock}")
-        if check_multi_year_breakout(stock, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back):
-            breakout_stocks.append(stock)
+def process_csv(file, years_gap=5, buffer=0.05, weeks_back=0, provider=None, max_workers=1, progress_callback=None):
+    return process_manual_input(read_symbols_csv(file), years_gap=years_gap, buffer=buffer,
+                                weeks_back=weeks_back, provider=provider, max_workers=max_workers,
+                                progress_callback=progress_callback)
 
-    return breakout_stocks
+def run_parameter_grid(stock_symbols, years_gaps, buffers, weeks_back=0, provider=None, max_workers=1,
+                       progress_callback=None):
+    # Sync once for the widest window, then evaluate every years_gap x buffer pair from one load
+    start_date = datetime.today() - timedelta(days=365 * (max(years_gaps) + 10))
+    if max_workers > 1:
+        concurrent_sync_stock_history(stock_symbols, start_date, datetime.today(), max_workers=max_workers,
+                                      provider=provider, progress_callback=progress_callback)
+    else:
+        bulk_sync_stock_history(stock_symbols, start_date, datetime.today(), provider=provider)
+
+    return evaluate_parameter_grid(stock_symbols, years_gaps, buffers, weeks_back=weeks_back)
+
+def process_manual_input(stock_symbols, years_gap=5, buffer=0.05, weeks_back=0, provider=None, max_workers=1,
+                         progress_callback=None):
+    if max_workers > 1:
+        results = scan_breakouts(stock_symbols, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back,
+                                 max_workers=max_workers, provider=provider, progress_callback=progress_callback)
+        return [result for result in results if result['is_breakout']]
 
-def process_manual_input(stock_symbols, years_gap=5, buffer=0.05, weeks_back=0):
     breakout_stocks = []
 
+    # Download everything that is missing in batches before analysing
+    bulk_sync_stock_history(stock_symbols, datetime.today() - timedelta(days=365 * (years_gap + 10)),
+                            datetime.today(), provider=provider)
+
     # Iterate over the list of stocks
     for stock in stock_symbols:
         logger.info(f"##########################################{stock}##################################")
         logger.info(f"Processing stock: {stock}")
-        if check_multi_year_breakout(stock, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back):
-            breakout_stocks.append(stock)
+        result = evaluate_multi_year_breakout(stock, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back,
+                                              sync=False)
+        if result['is_breakout']:
+            breakout_stocks.append(result)
 
     return breakout_stocks
 
-# Function to check for multi-year breakout within the current week
-def check_multi_year_breakout(stock, years_gap=5, buffer=0.05, weeks_back=0):
-    # Check cache for last updated date
-    conn = sqlite3.connect(DATABASE_FILE_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT last_updated FROM cache_info WHERE symbol = ?', (stock,))
-    result = cursor.fetchone()
-
-    if result:
-            fetch_and_store_stocks_data(stock, datetime.today() - timedelta(days=365 * (years_gap + 10)), datetime.today())
-    else:
-        logger.info(f"🆕 SOURCE: YFINANCE | No cache found for {stock}. Fetching fresh data.")
-        fetch_and_store_stocks_data(stock, datetime.today() - timedelta(days=365 * (years_gap + 10)), datetime.today())
-
-    # Append '.NS' to the stock symbol for NSE
+def compute_breakout_metrics(stock, df, years_gap=5, buffer=0.05, weeks_back=0, current_date=None):
+    # Evaluate the multi-year breakout rule on an already loaded price history.
+    # Returns the full result record for the symbol.
     stock_symbol = stock + '.NS'
-
-    # Calculate start and end dates based on years_gap and weeks_back
-    current_date = datetime.today()
-    start_date = current_date - timedelta(days=365 * (years_gap + 10))
-    end_date = current_date - timedelta(days=current_date.weekday() + 1 + (weeks_back * 7))  # Adjust for weeks back  # Exclude current week
-
-    logger.info(f"Fetching data for {stock_symbol} from {start_date.date()} to {end_date.date()}")
-
-    # Fetch historical data
-    try:
-        query = '''
-            SELECT date, high, low, close, volume FROM historical_data
-            WHERE symbol = ? AND date BETWEEN ? AND ?
-        '''
-        df = pd.read_sql_query(query, conn, params=(stock, start_date, end_date))
-        df['date'] = pd.to_datetime(df['date'])  # Convert date column to datetime
-        df.set_index('date', inplace=True)  # Set date as index
-        logger.info(f"Data fetched successfully for {stock_symbol}")
-    except Exception as e:
-        logger.error(f"Failed to fetch data for {stock_symbol}: {str(e)}")
-        conn.close()
-        return False
+    current_date = current_date or datetime.today()
+    end_date = current_date - timedelta(days=current_date.weekday() + 1 + (weeks_back * 7))  # Exclude current week
+    gap_start = current_date - timedelta(days=365 * years_gap)
+
+    record = {
+        'symbol': stock,
+        'historical_high': None,
+        'historical_high_with_buffer': None,
+        'previous_high': None,
+        'current_price': None,
+        'current_price_with_buffer': None,
+        'is_breakout': False,
+    }
 
     # Check if there is enough historical data
-    if len(df) < 2:
+    history_df = df[df.index <= end_date]
+    if len(history_df) < 2:
         logger.warning(f"Not enough data available for {stock_symbol}")
-        conn.close()
-        return False
+        return record
 
     # Get the historical high within the specified range (excluding current week)
-    historical_df = df[(df.index >= current_date - timedelta(days=365 * years_gap)) & (df.index < end_date)]
+    historical_df = history_df[(history_df.index >= gap_start) & (history_df.index < end_date)]
     historical_high = historical_df['high'].max()
     logger.info(f"The historical high for {stock_symbol} in the past {years_gap} years (excluding current week) is {historical_high}")
 
     # Get the maximum high price in the period before the years_gap
-    previous_df = df[df.index < current_date - timedelta(days=365 * years_gap)]
-    previous_high = previous_df['high'].max()
+    previous_high = history_df[history_df.index < gap_start]['high'].max()
     logger.info(f"The previous high for {stock_symbol} before {years_gap} years is {previous_high}")
 
     # Apply buffer to the comparison of historical_high and previous_high
     historical_high_with_buffer = historical_high * (1 - buffer)
     logger.info(f"The historical high with buffer for {stock_symbol} is {historical_high_with_buffer}")
 
+    record['historical_high'] = historical_high
+    record['historical_high_with_buffer'] = historical_high_with_buffer
+    record['previous_high'] = previous_high
+
     # Get the current week's data, adjusted for weeks_back
     current_week_start = current_date - timedelta(days=current_date.weekday() + (weeks_back * 7))
-    current_week_end = current_date  # Set the end date to today's date
-
-    try:
-        current_week_query = '''
-            SELECT date, high, low, close, volume FROM historical_data
-            WHERE symbol = ? AND date BETWEEN ? AND ?
-        '''
-        current_week_df = pd.read_sql_query(current_week_query, conn, params=(stock, current_week_start, current_week_end))
-        current_week_df['date'] = pd.to_datetime(current_week_df['date'])  # Convert date column to datetime
-        current_week_df.set_index('date', inplace=True)  # Set date as index
-        logger.info(f"Current week data fetched successfully for {stock_symbol}")
-    except Exception as e:
-        logger.error(f"Failed to fetch current week data for {stock_symbol}: {str(e)}")
-        conn.close()
-        return False
+    current_week_df = df[(df.index >= current_week_start) & (df.index <= current_date)]
 
     # Check if the latest price has just crossed the historical high with buffer
     if not current_week_df.empty:
@@ -227,19 +486,47 @@ def check_multi_year_breakout(stock, years_gap=5, buffer=0.05, weeks_back=0):
         current_price_with_buffer = current_price * (1 + buffer)
         logger.info(f"The current week's closing price for {stock_symbol} with buffer is {current_price_with_buffer}")
 
-        if historical_high_with_buffer < previous_high and current_price_with_buffer > previous_high:
-            logger.info(f"{stock_symbol} is giving a multi-year breakout!")
-            conn.close()
-            return True
+        record['current_price'] = current_price
+        record['current_price_with_buffer'] = current_price_with_buffer
+        record['is_breakout'] = bool(historical_high_with_buffer < previous_high and current_price_with_buffer > previous_high)
+
+    if record['is_breakout']:
+        logger.info(f"{stock_symbol} is giving a multi-year breakout!")
+    else:
+        logger.info(f"{stock_symbol} is not giving a multi-year breakout.")
+    return record
+
+
+def evaluate_multi_year_breakout(stock, years_gap=5, buffer=0.05, weeks_back=0, sync=True):
+    # Single pass over the local store: one read per symbol, every metric in the returned record
+    if sync:
+        # Bring the local cache up to date, downloading only the missing tail
+        sync_stock_history(stock, datetime.today() - timedelta(days=365 * (years_gap + 10)), datetime.today())
+
+    current_date = datetime.today()
+    start_date = current_date - timedelta(days=365 * (years_gap + 10))
+    logger.info(f"Fetching data for {stock}.NS from {start_date.date()} to {current_date.date()}")
+
+    try:
+        df = get_price_store(db_path=DATABASE_FILE_PATH).load_history(stock, start_date, current_date)
+        logger.info(f"Data fetched successfully for {stock}.NS")
+    except Exception as e:
+        logger.error(f"Failed to fetch data for {stock}.NS: {str(e)}")
+        df = pd.DataFrame(columns=['high', 'close'], index=pd.DatetimeIndex([]))
+
+    return compute_breakout_metrics(stock, df, years_gap, buffer, weeks_back, current_date)
 
-    logger.info(f"{stock_symbol} is not giving a multi-year breakout.")
-    conn.close()
-    return False
+
+# Function to check for multi-year breakout within the current week
+def check_multi_year_breakout(stock, years_gap=5, buffer=0.05, weeks_back=0, sync=True):
+    return evaluate_multi_year_breakout(stock, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back,
+                                        sync=sync)['is_breakout']
 
 
+TRADINGVIEW_URL = "https://www.tradingview.com/chart/?symbol=NSE:"
 
 def create_tradingview_link(symbol):
-    tradingview_url = f"https://www.tradingview.com/chart/?symbol=NSE:{symbol}"
+    tradingview_url = f"{TRADINGVIEW_URL}{symbol}"
     return f'<a href="{tradingview_url}" target="_blank">{symbol}</a>'
 
 # Legacy display_breakout_stocks - REPLACED by AI-enabled version below
@@ -254,8 +541,8 @@ def _legacy_display_breakout_stocks(breakout_stocks, years_gap, buffer, weeks_ba
         current_prices = []
         current_prices_with_buffer = []
 
-        # Connect to the database
-        conn = sqlite3.connect(DATABASE_FILE_PATH)
+        # This thread's pooled connection
+        conn = get_connection(DATABASE_FILE_PATH)
 
         # Iterate over breakout stocks to fetch data
         for stock_symbol in breakout_stocks:
@@ -292,9 +579,6 @@ def _legacy_display_breakout_stocks(breakout_stocks, years_gap, buffer, weeks_ba
             current_prices.append(current_price)
             current_prices_with_buffer.append(current_price_with_buffer)
 
-        # Close the database connection
-        conn.close()
-
         # Create a DataFrame
         breakout_data = {
             'Stock Name': stock_names,
@@ -333,54 +617,95 @@ def _legacy_display_breakout_stocks(breakout_stocks, years_gap, buffer, weeks_ba
     else:
         st.info("No stocks are giving a multi-year breakout at the moment.")
 
-def get_fundamental_data(symbol):
-    try:
-        ticker = yf.Ticker(symbol + ".NS")
-        info = ticker.info
-        keys = ['trailingPE', 'forwardPE', 'returnOnEquity', 'debtToEquity', 'profitMargins', 'marketCap', 'sector']
-        return {k: info.get(k) for k in keys}
-    except:
-        return {}
-
-def display_breakout_stocks(breakout_stocks, years_gap=5, buffer=0.05, weeks_back=0, api_key=None):
-    if breakout_stocks:
-        st.success(f"Found {len(breakout_stocks)} stocks giving a multi-year breakout!")
-        
-        # Display the main table first
-        # ... (Existing Table Code) ...
-        # Recalculating details for table display
-        stock_names = []
-        historical_highs = []
-        historical_highs_with_buffer = []
-        previous_highs = []
-        current_prices = []
-        current_prices_with_buffer = []
+# Fundamentals sent to the AI analyst
+AI_FUNDAMENTAL_FIELDS = ['trailingPE', 'forwardPE', 'returnOnEquity', 'debtToEquity', 'profitMargins', 'marketCap',
+                         'sector']
 
-        for stock in breakout_stocks:
-            hist_high, hist_high_buffer, prev_high, curr_price_buffer = get_stock_data(stock, years_gap, buffer, weeks_back)
-            stock_names.append(stock)
-            historical_highs.append(hist_high)
-            historical_highs_with_buffer.append(hist_high_buffer)
-            previous_highs.append(prev_high)
-            current_prices.append(curr_price_buffer) # Note: this logic seems slightly redundant with check_multi_year_breakout but needed for table values
+def get_fundamental_data(symbol):
+    # Served from the fundamentals table while fresh; .info is only called for stale fields
+    return get_fundamentals(symbol, AI_FUNDAMENTAL_FIELDS, db_path=DATABASE_FILE_PATH)
+
+def get_cached_fundamental_data(symbols):
+    # Fundamentals already fresh in the local table, without any download: {symbol: data}
+    cached = load_fundamentals(get_connection(DATABASE_FILE_PATH).cursor(), list(symbols), AI_FUNDAMENTAL_FIELDS)
+    return {symbol: data for symbol, data in cached.items() if len(data) == len(AI_FUNDAMENTAL_FIELDS)}
+
+def breakout_records_to_frame(breakout_records):
+    # One row per breakout record, used for the table and the CSV export
+    return pd.DataFrame({
+        'Stock Name': [record['symbol'] for record in breakout_records],
+        'Historical High': [record['historical_high'] for record in breakout_records],
+        'Historical High With Buffer': [record['historical_high_with_buffer'] for record in breakout_records],
+        'Previous High': [record['previous_high'] for record in breakout_records],
+        'Current Price': [record['current_price'] for record in breakout_records],
+        'Current Price With Buffer': [record['current_price_with_buffer'] for record in breakout_records],
+    })
+
+@st.cache_data(show_spinner=False, max_entries=VIEW_CACHE_MAX_ENTRIES)
+def render_breakout_table(breakout_records):
+    # Table frame and CSV export for one set of scan results; reruns reuse them until the results change.
+    # Symbols become TradingView URLs for a link column instead of pre-rendered anchor tags.
+    df_display = breakout_records_to_frame(breakout_records)
+    df_table = df_display.copy()
+    df_table['Stock Name'] = TRADINGVIEW_URL + df_table['Stock Name']
+    return df_table, df_display.to_csv(index=False).encode('utf-8')
+
+def display_breakout_stocks(breakout_records, years_gap=5, buffer=0.05, weeks_back=0, api_key=None):
+    if breakout_records:
+        st.success(f"Found {len(breakout_records)} stocks giving a multi-year breakout!")
+
+        # Render straight from the scan results, no second pass over the database
+        table, table_csv = render_breakout_table(breakout_records)
+        st.dataframe(table, hide_index=True, use_container_width=True, column_config={
+            'Stock Name': st.column_config.LinkColumn('Stock Name', display_text=r'symbol=NSE:(.*)$'),
+        })
 
-        breakout_data = {
-            'Stock Name': stock_names,
-            'Historical High': historical_highs,
-            'Current Price (With Buffer)': current_prices
-        }
-        df_display = pd.DataFrame(breakout_data)
-        df_display['Stock Name'] = df_display['Stock Name'].apply(create_tradingview_link)
-        st.markdown(df_display.to_html(escape=False), unsafe_allow_html=True)
+        # Provide a download button for the complete CSV data
+        st.download_button(
+            label="Download complete table data as CSV",
+            data=table_csv,
+            file_name='breakout_stocks.csv',
+            mime='text/csv',
+        )
         st.markdown("---")
 
         st.subheader("🧠 AI Fundamental Analyst")
-        
+
         # Initialize session state for AI results if not exists
         if 'ai_results' not in st.session_state:
             st.session_state.ai_results = {}
-        
-        for stock in breakout_stocks:
+
+        breakout_symbols = [record['symbol'] for record in breakout_records]
+        if st.session_state.get('fundamentals_prefetched') != breakout_symbols:
+            import ai_analyst
+            # Analyses stored by earlier sessions for unchanged fundamentals cost no API call
+            st.session_state.ai_results.update(
+                ai_analyst.load_cached_analyses(get_cached_fundamental_data(breakout_symbols)))
+            # Fill the fundamentals cache for this breakout list while the page is read
+            prefetch_in_background(breakout_symbols, db_path=DATABASE_FILE_PATH)
+            st.session_state.fundamentals_prefetched = breakout_symbols
+
+        if st.button("Analyze all breakouts", key="btn_analyze_all"):
+            if not api_key:
+                st.error("Please enter a Gemini API Key in the sidebar first.")
+            else:
+                import ai_analyst
+                with st.spinner("Fetching fundamentals and asking AI for every breakout..."):
+                    prefetch_fundamentals(breakout_symbols, db_path=DATABASE_FILE_PATH)
+                    requests = {stock: get_fundamental_data(stock) for stock in breakout_symbols}
+                    progress = st.progress(0.0)
+                    results = ai_analyst.analyze_many(
+                        {stock: data for stock, data in requests.items() if data}, api_key,
+                        progress_callback=lambda done, total, stock: progress.progress(
+                            done / total, text=f"Analyzed {done} of {total} ({stock})"))
+                st.session_state.ai_results.update(results)
+                failed = [stock for stock, analysis in results.items() if ai_analyst.analysis_failed(analysis)]
+                st.success(f"Analysis complete for {len(results) - len(failed)} of {len(breakout_symbols)} stocks.")
+                if failed:
+                    st.warning(f"AI analysis failed for {', '.join(failed)}.")
+
+        for record in breakout_records:
+            stock = record['symbol']
             with st.expander(f"Analyze {stock} Fundamentals"):
                 col1, col2 = st.columns([3, 1])
                 with col1:
@@ -389,11 +714,13 @@ def display_breakout_stocks(breakout_stocks, years_gap=5, buffer=0.05, weeks_bac
                     st.markdown(f"[View on Screener.in](https://www.screener.in/company/{stock}/)", unsafe_allow_html=True)
                 
                 # Check if we already have a result for this stock
-                if stock in st.session_state.ai_results:
+                regenerate = stock in st.session_state.ai_results
+                if regenerate:
                     st.markdown(st.session_state.ai_results[stock])
                 
-                # Always show the button (even if result exists, user might want to regenerate)
-                if st.button(f"Generate AI Insight for {stock}", key=f"btn_{stock}"):
+                # Always show the button; with a result on screen it asks the model again instead of the cache
+                label = "Regenerate" if regenerate else "Generate"
+                if st.button(f"{label} AI Insight for {stock}", key=f"btn_{stock}"):
                     if not api_key:
                         st.error("Please enter a Gemini API Key in the sidebar first.")
                     else:
@@ -401,7 +728,8 @@ def display_breakout_stocks(breakout_stocks, years_gap=5, buffer=0.05, weeks_bac
                             import ai_analyst
                             fund_data = get_fundamental_data(stock)
                             if fund_data:
-                                analysis = ai_analyst.analyze_stock_with_gemini(stock, fund_data, api_key)
+                                analysis = ai_analyst.analyze_stock_with_gemini(stock, fund_data, api_key,
+                                                                                refresh=regenerate)
                                 st.session_state.ai_results[stock] = analysis
                                 # Display immediately without rerun
                                 st.success("Analysis complete!")
@@ -411,56 +739,8 @@ def display_breakout_stocks(breakout_stocks, years_gap=5, buffer=0.05, weeks_bac
 
 
 def get_stock_data(stock_symbol, years_gap=5, buffer=0.05, weeks_back=0):
-    # Connect to the database
-    conn = sqlite3.connect(DATABASE_FILE_PATH)
-
-    try:
-        # Calculate start and end dates based on years_gap and weeks_back
-        current_date = datetime.today()
-        start_date = current_date - timedelta(days=365 * (years_gap + 10))
-        end_date = current_date - timedelta(days=current_date.weekday() + 1 + (weeks_back * 7))
-
-        # Fetch historical data from the database
-        query = '''
-            SELECT date, high, low, close, volume FROM historical_data
-            WHERE symbol = ? AND date BETWEEN ? AND ?
-        '''
-        df = pd.read_sql_query(query, conn, params=(stock_symbol, start_date, end_date))
-        df['date'] = pd.to_datetime(df['date'])  # Convert date column to datetime
-        df.set_index('date', inplace=True)  # Set date as index
-
-        # Get historical high, previous high, current price
-        historical_df = df[(df.index >= current_date - timedelta(days=365 * years_gap)) & (df.index < end_date)]
-        historical_high = historical_df['high'].max()
-        previous_df = df[df.index < current_date - timedelta(days=365 * years_gap)]
-        previous_high = previous_df['high'].max()
-
-        # Get the current week's data, adjusted for weeks_back
-        current_week_start = current_date - timedelta(days=current_date.weekday() + (weeks_back * 7))
-        current_week_end = current_date  # Set the end date to today's date
-
-        current_week_query = '''
-            SELECT date, high, low, close, volume FROM historical_data
-            WHERE symbol = ? AND date BETWEEN ? AND ?
-        '''
-        current_week_df = pd.read_sql_query(current_week_query, conn, params=(stock_symbol, current_week_start, current_week_end))
-        current_week_df['date'] = pd.to_datetime(current_week_df['date'])  # Convert date column to datetime
-        current_week_df.set_index('date', inplace=True)  # Set date as index
-
-        if not current_week_df.empty:
-            current_price = current_week_df['close'].iloc[-1]
-        else:
-            current_price = None
-
-        # Apply buffer to the values
-        historical_high_with_buffer = historical_high * (1 - buffer)
-        current_price_with_buffer = current_price * (1 + buffer) if current_price is not None else None
-
-        return historical_high, historical_high_with_buffer, previous_high, current_price_with_buffer
-
-    except Exception as e:
-        logger.error(f"Error fetching data for {stock_symbol}: {str(e)}")
-        return None, None, None, None
-
-    finally:
-        conn.close()
+    # Kept for the legacy display; reads the same single-pass record as the scan
+    record = evaluate_multi_year_breakout(stock_symbol, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back,
+                                          sync=False)
+    return (record['historical_high'], record['historical_high_with_buffer'], record['previous_high'],
+            record['current_price_with_buffer'])
@@ -0,0 +1,354 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from config import DATABASE_FILE_PATH, PARQUET_DIRECTORY, PARQUET_PARTITION_BY, PARQUET_ROW_GROUP_SIZE
+from database import apply_pragmas, get_connection
+from market_calendar import IST
+from price_store import EPOCH, PRICE_COLUMNS, SQLITE_SYMBOL_BATCH, history_frame, to_day_number
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+# Arrow schema of exported historical_data rows. The partition column lives in the directory
+# names (year=2024/part-0.parquet or symbol=RELIANCE/part-0.parquet), not inside the files.
+PRICE_SCHEMA = pa.schema([
+    ('symbol', pa.string()),
+    ('date', pa.date32()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('adjusted_close', pa.float64()),
+    ('volume', pa.float64()),
+])
+PARTITION_FIELDS = {
+    'year': pa.field('year', pa.int16()),
+    'symbol': pa.field('symbol', pa.string()),
+}
+CACHE_INFO_SCHEMA = pa.schema([
+    ('symbol', pa.string()),
+    ('last_updated', pa.string()),
+    ('history_start', pa.string()),
+])
+# Files starting with "_" are skipped by dataset discovery
+MANIFEST_FILE = '_manifest.json'
+CACHE_INFO_FILE = '_cache_info.parquet'
+EXPORT_BATCH_ROWS = 200000
+MAX_PARTITIONS = 100000
+# Days an incremental sync may revise before the last stored date (multi_year_breakout.SYNC_OVERLAP_DAYS plus margin)
+REVISED_DAYS = 7
+
+
+def dataset_schema(partition_by):
+    if partition_by == 'year':
+        return PRICE_SCHEMA.append(PARTITION_FIELDS['year'])
+    return PRICE_SCHEMA
+
+
+def dataset_partitioning(partition_by):
+    return ds.partitioning(pa.schema([PARTITION_FIELDS[partition_by]]), flavor='hive')
+
+
+def read_manifest(directory):
+    # Export metadata, or None if directory holds no export
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def sqlite_batches(cursor, queries, partition_by):
+    # historical_data rows of each (query, params) as Arrow record batches in the export schema
+    schema = dataset_schema(partition_by)
+    for query, params in queries:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            # Dates are stored as text; older rows may carry a time part
+            dates = pc.utf8_slice_codeunits(pa.array(columns[1], pa.string()), 0, 10).cast(pa.date32())
+            arrays = [pa.array(columns[0], pa.string()), dates]
+            arrays += [pa.array(column, pa.float64()) for column in columns[2:]]
+            if partition_by == 'year':
+                arrays.append(pc.year(dates).cast(pa.int16()))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def changed_symbols(cursor, manifest, stored):
+    # {symbol: first date that may differ from the export}; symbols untouched since the export are left out.
+    # stored maps every symbol in historical_data to its [first, last] date.
+    exported = manifest['symbols']
+    cursor.execute('SELECT symbol FROM cache_info WHERE last_updated >= ?', (manifest['exported_at'],))
+    refreshed = {row[0] for row in cursor.fetchall()}
+
+    changed = {}
+    for symbol, (first, last) in stored.items():
+        if symbol not in exported or first < exported[symbol][0]:
+            # New symbol or history extended backwards
+            changed[symbol] = first
+        elif symbol in refreshed or last != exported[symbol][1]:
+            since = pd.Timestamp(min(last, exported[symbol][1])) - timedelta(days=REVISED_DAYS)
+            changed[symbol] = max(first, since.strftime('%Y-%m-%d'))
+    return changed
+
+
+def export_queries(partition_by, changed, stored):
+    # (query, params) pairs selecting the rows of every partition that has to be rewritten.
+    # Rows come sorted by (symbol, date) so row group statistics stay selective.
+    columns = 'SELECT symbol, date, high, low, close, adjusted_close, volume FROM historical_data'
+    if changed is None:
+        return [(f'{columns} ORDER BY symbol, date', ())]
+
+    if partition_by == 'symbol':
+        symbols, date_range, bounds = sorted(changed), '', ()
+    else:
+        # Every symbol's rows in the touched years, read with index seeks on (symbol, date)
+        if not changed:
+            return []
+        first_year = min(int(since[:4]) for since in changed.values())
+        last_year = max(int(stored[symbol][1][:4]) for symbol in changed)
+        symbols, date_range = sorted(stored), ' AND date >= ? AND date < ?'
+        bounds = (f"{first_year}-01-01", f"{last_year + 1}-01-01")
+
+    queries = []
+    for i in range(0, len(symbols), SQLITE_SYMBOL_BATCH):
+        batch = symbols[i:i + SQLITE_SYMBOL_BATCH]
+        queries.append((f"{columns} WHERE symbol IN ({', '.join('?' * len(batch))}){date_range} "
+                        f"ORDER BY symbol, date", (*batch, *bounds)))
+    return queries
+
+
+def export_parquet(db_path=DATABASE_FILE_PATH, directory=PARQUET_DIRECTORY, partition_by=PARQUET_PARTITION_BY,
+                   full=False):
+    # Write historical_data as a hive-partitioned Parquet dataset plus cache_info and a manifest.
+    # If directory already holds an export with the same partitioning (and not full), only the
+    # partitions touched since that export are rewritten; new partitions are added next to the old ones.
+    if partition_by not in PARTITION_FIELDS:
+        raise ValueError(f"partition_by must be one of {', '.join(PARTITION_FIELDS)}, not {partition_by!r}")
+
+    manifest = None if full else read_manifest(directory)
+    if manifest is not None and manifest['partition_by'] != partition_by:
+        logger.info(f"Existing export is partitioned by {manifest['partition_by']}, writing a full export")
+        manifest = None
+
+    # Taken before reading so refreshes that land during the export are picked up next time
+    exported_at = datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S')
+    # Migrates the schema if needed
+    get_connection(db_path)
+    # write_dataset pulls batches from its own thread, so the export reads through a dedicated connection
+    conn = apply_pragmas(sqlite3.connect(db_path, check_same_thread=False))
+    cursor = conn.cursor()
+    # One read transaction: every query below sees the same snapshot
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute('SELECT symbol, MIN(date), MAX(date) FROM historical_data GROUP BY symbol')
+        stored = {symbol: [first[:10], last[:10]] for symbol, first, last in cursor.fetchall()}
+        changed = changed_symbols(cursor, manifest, stored) if manifest is not None else None
+        queries = export_queries(partition_by, changed, stored)
+
+        # A full export is written next to the old one and swapped in at the end
+        target = directory if manifest is not None else directory.rstrip(os.sep) + '.tmp'
+        if manifest is None:
+            shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target, exist_ok=True)
+
+        rows = 0
+        written = set()
+        if queries:
+            def counted(batches):
+                nonlocal rows
+                for batch in batches:
+                    rows += batch.num_rows
+                    yield batch
+
+            ds.write_dataset(
+                counted(sqlite_batches(cursor, queries, partition_by)), target,
+                schema=dataset_schema(partition_by),
+                format='parquet',
+                file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+                partitioning=dataset_partitioning(partition_by),
+                basename_template='part-{i}.parquet',
+                # Replaces the files of partitions present in the data, leaves the others alone
+                existing_data_behavior='delete_matching',
+                max_partitions=MAX_PARTITIONS,
+                min_rows_per_group=PARQUET_ROW_GROUP_SIZE,
+                max_rows_per_group=PARQUET_ROW_GROUP_SIZE,
+                # Single-threaded writes keep the (symbol, date) order within each file
+                use_threads=False,
+                file_visitor=lambda file: written.add(os.path.dirname(file.path)),
+            )
+
+        cursor.execute('SELECT symbol, last_updated, history_start FROM cache_info')
+        cache_rows = cursor.fetchall()
+    finally:
+        conn.rollback()
+        conn.close()
+
+    cache_columns = list(zip(*cache_rows)) if cache_rows else [[], [], []]
+    pq.write_table(pa.Table.from_arrays([pa.array(column, pa.string()) for column in cache_columns],
+                                        schema=CACHE_INFO_SCHEMA),
+                   os.path.join(target, CACHE_INFO_FILE))
+
+    new_manifest = {
+        'partition_by': partition_by,
+        'exported_at': exported_at,
+        'symbols': stored,
+    }
+    with open(os.path.join(target, MANIFEST_FILE), 'w') as file:
+        json.dump(new_manifest, file)
+
+    if manifest is None:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(target, directory)
+        logger.info(f"Exported {rows} rows for {len(stored)} symbols into {directory} (by {partition_by})")
+    else:
+        logger.info(f"Incremental export rewrote {len(written)} {partition_by} partitions ({rows} rows) in {directory}")
+    open_dataset.cache_clear()
+    return {'rows': rows, 'partitions': len(written), 'symbols': len(stored), 'full': manifest is None}
+
+
+@lru_cache(maxsize=None)
+def open_dataset(directory):
+    # Discover the export's files once per process; export_parquet clears this
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No Parquet export in {directory}")
+    partition_by = manifest['partition_by']
+    return ds.dataset(directory, schema=dataset_schema(partition_by), format='parquet',
+                      partitioning=dataset_partitioning(partition_by)), partition_by
+
+
+def price_filter(partition_by, symbols=None, start_date=None, end_date=None):
+    # Dataset filter for the rows of symbols within [start_date, end_date], same bounds as
+    # SQLitePriceStore. Partition fields prune whole directories, the rest is checked against
+    # row group statistics before any data is read.
+    conditions = []
+    if symbols is not None:
+        conditions.append(ds.field('symbol').isin(list(symbols)))
+    if start_date is not None:
+        start = EPOCH + timedelta(days=to_day_number(start_date, round_up=True))
+        conditions.append(ds.field('date') >= pa.scalar(start.date(), pa.date32()))
+        if partition_by == 'year':
+            conditions.append(ds.field('year') >= start.year)
+    if end_date is not None:
+        end = EPOCH + timedelta(days=to_day_number(end_date))
+        conditions.append(ds.field('date') <= pa.scalar(end.date(), pa.date32()))
+        if partition_by == 'year':
+            conditions.append(ds.field('year') <= end.year)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_prices(directory=PARQUET_DIRECTORY, columns=None, symbols=None, start_date=None, end_date=None):
+    # Arrow table of the export sorted by (symbol, date). Only the listed columns are read
+    # and only partitions and row groups that can match the filters are opened.
+    dataset, partition_by = open_dataset(directory)
+    columns = list(columns) if columns is not None else PRICE_SCHEMA.names
+    table = dataset.to_table(columns=columns, filter=price_filter(partition_by, symbols, start_date, end_date))
+    sort_keys = [(name, 'ascending') for name in ('symbol', 'date') if name in columns]
+    return table.sort_by(sort_keys) if sort_keys else table
+
+
+def import_parquet(directory=PARQUET_DIRECTORY, db_path=DATABASE_FILE_PATH, symbols=None, start_date=None,
+                   end_date=None):
+    # Load an export into historical_data (upserting existing rows) and return the number of rows read.
+    # cache_info is only carried over for a full date range, so partial imports are still synced.
+    from multi_year_breakout import HISTORICAL_DATA_UPSERT
+
+    dataset, partition_by = open_dataset(directory)
+    scanner = dataset.scanner(columns=PRICE_SCHEMA.names,
+                              filter=price_filter(partition_by, symbols, start_date, end_date))
+    conn = get_connection(db_path)
+    cursor = conn.cursor()
+    rows = 0
+    try:
+        for batch in scanner.to_batches():
+            if batch.num_rows == 0:
+                continue
+            columns = [batch.column('date').cast(pa.string()) if name == 'date' else batch.column(name)
+                       for name in PRICE_SCHEMA.names]
+            cursor.executemany(HISTORICAL_DATA_UPSERT,
+                               zip(*[column.to_numpy(zero_copy_only=False).tolist() for column in columns]))
+            rows += batch.num_rows
+
+        if start_date is None and end_date is None:
+            cache_info = pq.read_table(os.path.join(directory, CACHE_INFO_FILE))
+            if symbols is not None:
+                cache_info = cache_info.filter(pc.is_in(cache_info['symbol'], pa.array(list(symbols), pa.string())))
+            cursor.executemany('''
+                INSERT INTO cache_info (symbol, last_updated, history_start)
+                VALUES (?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    last_updated = COALESCE(MAX(cache_info.last_updated, excluded.last_updated),
+                                            cache_info.last_updated, excluded.last_updated),
+                    history_start = COALESCE(MIN(cache_info.history_start, excluded.history_start),
+                                             cache_info.history_start, excluded.history_start)
+            ''', zip(*[cache_info[name].to_pylist() for name in CACHE_INFO_SCHEMA.names]))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logger.info(f"Imported {rows} rows from {directory} into {db_path}")
+    return rows
+
+
+class ParquetPriceStore:
+    """
+    Read-only price store over a Parquet export.
+
+    Each call reads only the requested symbols, dates and columns. Refresh the export with export_parquet.
+    """
+
+    def __init__(self, directory=PARQUET_DIRECTORY):
+        self.directory = directory
+
+    def load_arrays(self, symbols, start_date, end_date):
+        table = read_prices(self.directory, ['symbol', *PRICE_COLUMNS], symbols, start_date, end_date)
+        df = table.to_pandas(date_as_object=False)
+        df['date'] = (df['date'] - pd.Timestamp(EPOCH)).dt.days
+        return {symbol: {name: rows[name].to_numpy(dtype=dtype) for name, dtype in PRICE_COLUMNS.items()}
+                for symbol, rows in df.groupby('symbol', sort=False)}
+
+    def load_history(self, symbol, start_date, end_date):
+        columns = self.load_arrays([symbol], start_date, end_date).get(symbol)
+        if columns is None:
+            columns = {name: [] for name in PRICE_COLUMNS}
+        return history_frame(columns)
+
+    def load_universe(self, symbols, start_date, end_date):
+        return self.load_arrays(symbols, start_date, end_date)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export historical_data to partitioned Parquet or load it back.")
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('--db', default=DATABASE_FILE_PATH, help="SQLite database")
+    parser.add_argument('--directory', default=PARQUET_DIRECTORY, help="Parquet export directory")
+    parser.add_argument('--partition-by', choices=list(PARTITION_FIELDS), default=PARQUET_PARTITION_BY)
+    parser.add_argument('--full', action='store_true', help="Rewrite the whole export instead of changed partitions")
+    parser.add_argument('--symbols', nargs='*', help="Only import these symbols")
+    parser.add_argument('--start', help="Only import rows on or after this date")
+    parser.add_argument('--end', help="Only import rows on or before this date")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(export_parquet(args.db, args.directory, args.partition_by, full=args.full))
+    else:
+        print(f"{import_parquet(args.directory, args.db, args.symbols, args.start, args.end)} rows imported")
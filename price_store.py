@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from config import DATABASE_FILE_PATH, PRICE_STORE_BACKEND, PRICE_STORE_DIRECTORY
+from database import get_connection
+from market_calendar import IST
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+# On-disk layout of the memory-mapped store: one .npy file per column, rows sorted by
+# (symbol, date), plus index.json mapping each symbol to its [offset, length] slice.
+PRICE_COLUMNS = {
+    'date': np.int32,  # days since 1970-01-01
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+}
+INDEX_FILE = 'index.json'
+SQLITE_SYMBOL_BATCH = 500  # symbols per IN (...) query
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_day_number(value, round_up=False):
+    # Day number for a date/datetime; round_up moves a timestamp past midnight to the next day
+    value = pd.Timestamp(value)
+    day = (value.normalize() - pd.Timestamp(EPOCH)).days
+    if round_up and value != value.normalize():
+        day += 1
+    return day
+
+
+def history_frame(columns):
+    # Build the same date-indexed frame SQLitePriceStore.load_history returns
+    df = pd.DataFrame({name: columns[name] for name in ('high', 'low', 'close', 'volume')})
+    df.index = pd.DatetimeIndex(pd.to_datetime(columns['date'], unit='D'), name='date')
+    return df
+
+
+class SQLitePriceStore:
+    """Default backend: reads historical_data rows with one query per symbol on the pooled connection."""
+
+    def __init__(self, db_path=DATABASE_FILE_PATH):
+        self.db_path = db_path
+
+    def load_history(self, symbol, start_date, end_date):
+        query = '''
+            SELECT date, high, low, close, volume FROM historical_data
+            WHERE symbol = ? AND date BETWEEN ? AND ?
+            ORDER BY date
+        '''
+        df = pd.read_sql_query(query, get_connection(self.db_path), params=(symbol, start_date, end_date))
+        df['date'] = pd.to_datetime(df['date'])  # Convert date column to datetime
+        df.set_index('date', inplace=True)  # Set date as index
+        return df
+
+    def load_universe(self, symbols, start_date, end_date):
+        # Columns for many symbols from one query per batch of symbols: {symbol: {column: array}}
+        universe = {}
+        conn = get_connection(self.db_path)
+        for i in range(0, len(symbols), SQLITE_SYMBOL_BATCH):
+            batch = list(symbols[i:i + SQLITE_SYMBOL_BATCH])
+            query = f'''
+                SELECT symbol, date, high, low, close, volume FROM historical_data
+                WHERE symbol IN ({', '.join('?' * len(batch))}) AND date BETWEEN ? AND ?
+                ORDER BY symbol, date
+            '''
+            df = pd.read_sql_query(query, conn, params=(*batch, start_date, end_date))
+            df['date'] = (pd.to_datetime(df['date']) - pd.Timestamp(EPOCH)).dt.days
+            for symbol, rows in df.groupby('symbol', sort=False):
+                universe[symbol] = {name: rows[name].to_numpy(dtype=dtype) for name, dtype in PRICE_COLUMNS.items()}
+        return universe
+
+
+class MmapPriceStore:
+    """
+    Read-only columnar snapshot of historical_data in memory-mapped NumPy files.
+
+    A symbol's history is a contiguous slice of each column, so load_arrays returns views
+    without copying. Build or refresh the snapshot with convert_sqlite_to_mmap. Symbols
+    downloaded again after the snapshot was built are read from SQLite instead.
+    """
+
+    def __init__(self, directory=PRICE_STORE_DIRECTORY, db_path=DATABASE_FILE_PATH):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as file:
+            self.index = json.load(file)
+        self.columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+                        for name in PRICE_COLUMNS}
+        self.fallback = SQLitePriceStore(db_path)
+
+    def symbols(self):
+        return list(self.index['symbols'])
+
+    def stale_symbols(self, symbols):
+        # Symbols downloaded since the snapshot was built (cache_info.last_updated, both IST timestamps)
+        stale = set()
+        cursor = get_connection(self.fallback.db_path).cursor()
+        for i in range(0, len(symbols), SQLITE_SYMBOL_BATCH):
+            batch = list(symbols[i:i + SQLITE_SYMBOL_BATCH])
+            cursor.execute(f"SELECT symbol FROM cache_info WHERE symbol IN ({', '.join('?' * len(batch))}) "
+                           f"AND last_updated >= ?", (*batch, self.index['created_at']))
+            stale.update(row[0] for row in cursor.fetchall())
+        if stale:
+            logger.warning(f"Price snapshot in {self.directory} is older than the stored history of {len(stale)} "
+                           f"symbols, reading them from SQLite. Rebuild it with `python price_store.py`.")
+        return stale
+
+    def load_arrays(self, symbol, start_date, end_date):
+        # Zero-copy views of one symbol's columns within [start_date, end_date]
+        offset, length = self.index['symbols'].get(symbol, (0, 0))
+        dates = self.columns['date'][offset:offset + length]
+        lo = offset + np.searchsorted(dates, to_day_number(start_date, round_up=True), side='left')
+        hi = offset + np.searchsorted(dates, to_day_number(end_date), side='right')
+        return {name: column[lo:hi] for name, column in self.columns.items()}
+
+    def load_history(self, symbol, start_date, end_date):
+        if self.stale_symbols([symbol]):
+            return self.fallback.load_history(symbol, start_date, end_date)
+        return history_frame(self.load_arrays(symbol, start_date, end_date))
+
+    def load_universe(self, symbols, start_date, end_date):
+        stale = self.stale_symbols(symbols)
+        universe = self.fallback.load_universe([symbol for symbol in symbols if symbol in stale], start_date,
+                                               end_date) if stale else {}
+        universe.update({symbol: self.load_arrays(symbol, start_date, end_date)
+                         for symbol in symbols if symbol in self.index['symbols'] and symbol not in stale})
+        return universe
+
+
+@lru_cache(maxsize=None)
+def open_mmap_store(directory, db_path=DATABASE_FILE_PATH):
+    # Map each snapshot once per process
+    return MmapPriceStore(directory, db_path)
+
+
+def get_price_store(backend=None, db_path=None, directory=None):
+    # Store used by the breakout scanner, selected by PRICE_STORE_BACKEND
+    backend = backend or PRICE_STORE_BACKEND
+    if backend == 'mmap':
+        return open_mmap_store(directory or PRICE_STORE_DIRECTORY, db_path or DATABASE_FILE_PATH)
+    if backend == 'parquet':
+        # pyarrow is only imported when the Parquet backend is used
+        from parquet_store import PARQUET_DIRECTORY, ParquetPriceStore
+        return ParquetPriceStore(directory or PARQUET_DIRECTORY)
+    return SQLitePriceStore(db_path or DATABASE_FILE_PATH)
+
+
+def convert_sqlite_to_mmap(db_path=DATABASE_FILE_PATH, directory=PRICE_STORE_DIRECTORY):
+    # Export historical_data into the memory-mapped layout. The new snapshot is written
+    # next to the old one and swapped in at the end. Its build time is taken before the read,
+    # so a download that lands during the export marks the symbol stale rather than current.
+    created_at = datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S')
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql_query('''
+            SELECT symbol, date, high, low, close, volume FROM historical_data
+            ORDER BY symbol, date
+        ''', conn)
+    finally:
+        conn.close()
+
+    staging = directory.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    df['date'] = (pd.to_datetime(df['date']) - pd.Timestamp(EPOCH)).dt.days
+    for name, dtype in PRICE_COLUMNS.items():
+        np.save(os.path.join(staging, f"{name}.npy"), df[name].to_numpy(dtype=dtype))
+
+    # Rows are sorted by symbol, so each symbol is one run starting at its first row
+    counts = df.groupby('symbol', sort=False).size()
+    offsets = counts.cumsum() - counts
+    index = {
+        'created_at': created_at,  # IST, like cache_info.last_updated
+        'rows': len(df),
+        'symbols': {symbol: [int(offsets[symbol]), int(counts[symbol])] for symbol in counts.index},
+    }
+    with open(os.path.join(staging, INDEX_FILE), 'w') as file:
+        json.dump(index, file)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    open_mmap_store.cache_clear()
+    logger.info(f"Converted {len(df)} rows for {len(counts)} symbols into {directory}")
+    return index
+
+
+if __name__ == "__main__":
+    # python price_store.py [db_path] [directory]
+    convert_sqlite_to_mmap(*sys.argv[1:3])
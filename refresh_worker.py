@@ -0,0 +1,96 @@
+import argparse
+import logging
+import os
+import socket
+import time
+
+from config import DATABASE_FILE_PATH, WORKER_POLL_SECONDS, WORKER_STALE_JOB_MINUTES
+from database import close_connections, get_connection, get_db_stats
+from job_queue import claim_next_job, enqueue_refresh, finish_job, requeue_stale_jobs
+from market_calendar import IST, is_post_close_run, market_phase, next_refresh_time, to_ist
+from update_data import refresh_all_watchlists, update_database
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+
+def run_job(conn, job):
+    # Execute one claimed job; every fetch and indicator computation happens in this process.
+    # Live quotes only matter while the market is open, as in the scheduler.
+    live = market_phase() == 'open'
+    if job['kind'] == 'watchlist':
+        update_database(conn, job['watchlist_name'], incremental=True, live=live)
+    else:
+        refresh_all_watchlists(conn, incremental=True, live=live, only_changed=not live)
+
+
+def process_next_job(conn, worker):
+    # Claim and run the oldest queued job. Returns False when the queue is empty.
+    job = claim_next_job(conn, worker)
+    if job is None:
+        return False
+
+    logger.info(f"Running refresh job {job['id']} ({job['kind']} {job['watchlist_name'] or ''})")
+    started = time.monotonic()
+    try:
+        run_job(conn, job)
+        finish_job(conn, job['id'])
+        stats = get_db_stats()
+        logger.info(f"Refresh job {job['id']} done in {time.monotonic() - started:.1f}s "
+                    f"({stats['connections_opened']} connections opened, {stats['queries']} queries "
+                    f"in {stats['query_seconds']:.2f}s so far)")
+    except Exception as e:
+        conn.rollback()
+        finish_job(conn, job['id'], error=str(e))
+        logger.error(f"Refresh job {job['id']} failed: {str(e)}")
+    return True
+
+
+def run_worker(once=False, schedule=False, poll_seconds=WORKER_POLL_SECONDS):
+    # Poll the refresh_jobs table. With schedule, also queue the market-hours refreshes that
+    # the in-process scheduler used to run.
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    conn = get_connection(DATABASE_FILE_PATH)
+    requeue_stale_jobs(conn, WORKER_STALE_JOB_MINUTES)
+    logger.info(f"Refresh worker {worker} started on {DATABASE_FILE_PATH}")
+
+    post_close_session = None
+    next_run = next_refresh_time() if schedule else None
+    try:
+        while True:
+            now = to_ist()
+            if next_run is not None and now >= next_run:
+                enqueue_refresh(conn.cursor(), 'all')
+                if is_post_close_run(now):
+                    post_close_session = now.date()
+                next_run = next_refresh_time(now, post_close_session)
+                logger.info(f"Next scheduled refresh at {IST.localize(next_run).strftime('%Y-%m-%d %H:%M')} IST")
+
+            if process_next_job(conn, worker):
+                continue
+            if once:
+                break
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        logger.info("Refresh worker stopped")
+    finally:
+        close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued watchlist refresh jobs outside the Streamlit server.")
+    parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+    parser.add_argument('--schedule', action='store_true',
+                        help="Also queue refreshes on the NSE market-hours schedule")
+    parser.add_argument('--poll-seconds', type=float, default=WORKER_POLL_SECONDS)
+    parser.add_argument('--enqueue', metavar='WATCHLIST', nargs='?', const='', default=None,
+                        help="Queue a refresh (of one watchlist, or all when no name is given) and exit")
+    args = parser.parse_args()
+
+    if args.enqueue is not None:
+        job_id = enqueue_refresh(get_connection(DATABASE_FILE_PATH).cursor(), 'watchlist' if args.enqueue else 'all',
+                                 args.enqueue or None)
+        close_connections()
+        print(f"Queued refresh job {job_id}")
+    else:
+        run_worker(once=args.once, schedule=args.schedule, poll_seconds=args.poll_seconds)
@@ -1,38 +1,127 @@
 import atexit
-import sqlite3
-import streamlit as st
+import logging
+import threading
+import time
 
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # Initialize the scheduler
 from config import DATABASE_FILE_PATH
-from update_data import update_database
-from watchlist_management import get_watchlists
+from database import get_connection
+from market_calendar import IST, is_post_close_run, market_phase, next_refresh_time, to_ist
+from update_data import refresh_all_watchlists
 
-scheduler = BackgroundScheduler()
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger()
+
+REFRESH_JOB_ID = 'refresh_watchlists'
+
+scheduler = BackgroundScheduler(timezone=IST)
+
+# Timings of the refresh job and the progress of the run in flight, see get_scheduler_status
+job_stats = {
+    'runs': 0,
+    'running': False,
+    'last_phase': None,
+    'last_started': None,
+    'last_finished': None,
+    'last_duration_seconds': None,
+    'last_symbols_total': 0,
+    'symbols_done': 0,
+    'last_error': None,
+    'post_close_session': None,  # Trading day whose end-of-day refresh has run
+}
+stats_lock = threading.Lock()
+
+
+def track_progress(done, total, symbol, status):
+    with stats_lock:
+        job_stats['symbols_done'] = done
+        job_stats['last_symbols_total'] = total
 
 
 # Function to reload data for all watchlists
 def reload_all_watchlists():
-    conn = sqlite3.connect(DATABASE_FILE_PATH)
-    cursor = conn.cursor()
+    now = to_ist()
+    phase = market_phase(now)
+    started = time.monotonic()
+    with stats_lock:
+        job_stats.update(running=True, last_phase=phase, last_started=now, last_symbols_total=0, symbols_done=0,
+                         last_error=None)
+
+    conn = get_connection(DATABASE_FILE_PATH)
+    try:
+        # Refresh every distinct symbol once and re-rank all watchlists from the shared results.
+        # Live quotes only matter while the market is open; symbols already current are skipped.
+        watchlists = refresh_all_watchlists(conn, incremental=True, live=phase == 'open', only_changed=True,
+                                            progress_callback=track_progress)
+        for watchlist_name in watchlists:
+            logger.info(f"Data for '{watchlist_name}' reloaded.")
+        if is_post_close_run(now):
+            with stats_lock:
+                job_stats['post_close_session'] = now.date()
+    except Exception as e:
+        logger.error(f"Scheduled refresh failed: {str(e)}")
+        with stats_lock:
+            job_stats['last_error'] = str(e)
+    finally:
+        duration = time.monotonic() - started
+        with stats_lock:
+            job_stats.update(running=False, runs=job_stats['runs'] + 1, last_finished=to_ist(),
+                             last_duration_seconds=duration)
+        logger.info(f"Scheduled refresh ({phase}) took {duration:.1f}s")
+        # A failed end-of-day run would otherwise be due again straight away
+        schedule_next_refresh(to_ist(), failed=job_stats['last_error'] is not None)
+        log_scheduler_status()
+
+
+def schedule_next_refresh(now=None, failed=False):
+    run_date = IST.localize(next_refresh_time(now, job_stats['post_close_session'], failed))
+    scheduler.add_job(reload_all_watchlists, 'date', run_date=run_date, id=REFRESH_JOB_ID, replace_existing=True,
+                      misfire_grace_time=None, coalesce=True)
+    logger.info(f"Next watchlist refresh at {run_date.strftime('%Y-%m-%d %H:%M')} IST")
+    return run_date
+
+
+def get_scheduler_status():
+    # Job timings plus queue depth: symbols still to sync in the running job and jobs waiting
+    with stats_lock:
+        status = dict(job_stats)
+    job = scheduler.get_job(REFRESH_JOB_ID) if scheduler.running else None
+    status['next_run'] = job.next_run_time if job else None
+    status['pending_jobs'] = len(scheduler.get_jobs()) if scheduler.running else 0
+    status['queue_depth'] = status['last_symbols_total'] - status['symbols_done'] if status['running'] else 0
+    status['market_phase'] = market_phase()
+    return status
 
-    # Iterate through all watchlists and reload data for each
-    watchlists = get_watchlists(cursor)
-    for watchlist_name in watchlists:
-        with st.spinner(f"Reloading data for '{watchlist_name}'..."):
-            update_database(conn, watchlist_name)
-            print(f"Data for '{watchlist_name}' reloaded.")
 
-    conn.close()
+def log_scheduler_status():
+    # One line per run so the standalone scheduler's timings and queue show up in its log
+    status = get_scheduler_status()
+    next_run = status['next_run'].strftime('%Y-%m-%d %H:%M') if status['next_run'] else 'not scheduled'
+    logger.info(f"Scheduler status: {status['runs']} runs, last took {status['last_duration_seconds'] or 0:.1f}s "
+                f"for {status['last_symbols_total']} symbols, {status['queue_depth']} symbols queued, "
+                f"{status['pending_jobs']} jobs pending, market {status['market_phase']}, next run {next_run}, "
+                f"last error: {status['last_error'] or 'none'}")
+    return status
 
 
-# Schedule the reload_all_watchlists function to run every hour
-scheduler.add_job(reload_all_watchlists, 'interval', hours=1)
-#scheduler.add_job(reload_all_watchlists, 'interval', minutes=1)
+def start_scheduler():
+    if scheduler.running:
+        return scheduler
+    scheduler.start()
+    schedule_next_refresh()
+    # Shutdown the scheduler gracefully when the program exits
+    atexit.register(lambda: scheduler.shutdown(wait=False))
+    return scheduler
 
-# Start the scheduler
-scheduler.start()
 
-# Shutdown the scheduler gracefully when the program exits
-atexit.register(lambda: scheduler.shutdown())
+if __name__ == "__main__":
+    # python scheduler.py -- in-process alternative to `refresh_worker.py --schedule`.
+    # Importing this module no longer starts a thread; call start_scheduler() explicitly.
+    start_scheduler()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        logger.info("Scheduler stopped")
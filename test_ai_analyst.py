@@ -0,0 +1,101 @@
+import threading
+import time
+
+import ai_analyst
+import database
+
+FUNDAMENTALS = {"trailingPE": 25.5, "returnOnEquity": 0.15, "sector": "Energy"}
+
+
+class StubClient:
+    """Local stand-in for the Gemini model that records prompts."""
+
+    def __init__(self, fail=()):
+        self.prompts = []
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+        symbol = prompt.split("Stock Symbol: ")[1].split()[0]
+        if symbol in self.fail:
+            raise RuntimeError('quota exceeded')
+        return f"Analysis of {symbol}"
+
+
+def test_repeat_analysis_is_served_from_the_cache(tmp_path):
+    db_path = str(tmp_path / 'ai.db')
+    client = StubClient()
+
+    first = ai_analyst.analyze_stock_with_gemini("RELIANCE", FUNDAMENTALS, None, client=client, db_path=db_path)
+    assert first == "Analysis of RELIANCE"
+    assert '"trailingPE": 25.5' in client.prompts[0]
+
+    # Same payload: no model call and no API key needed
+    assert ai_analyst.analyze_stock_with_gemini("RELIANCE", dict(FUNDAMENTALS), None, db_path=db_path) == first
+    assert len(client.prompts) == 1
+
+    # Changed fundamentals or a different model are a different key
+    ai_analyst.analyze_stock_with_gemini("RELIANCE", {**FUNDAMENTALS, "trailingPE": 30.0}, None, client=client,
+                                         db_path=db_path)
+    ai_analyst.analyze_stock_with_gemini("RELIANCE", FUNDAMENTALS, None, client=client, model_name='other-model',
+                                         db_path=db_path)
+    assert len(client.prompts) == 3
+    database.close_connections()
+
+
+def test_failures_are_not_cached(tmp_path):
+    db_path = str(tmp_path / 'ai.db')
+    failing = StubClient(fail={"RELIANCE"})
+    assert ai_analyst.analyze_stock_with_gemini("RELIANCE", FUNDAMENTALS, None, client=failing,
+                                                db_path=db_path).startswith("❌ AI Analysis Failed")
+    assert ai_analyst.analyze_stock_with_gemini("RELIANCE", FUNDAMENTALS, None, client=StubClient(),
+                                                db_path=db_path) == "Analysis of RELIANCE"
+    database.close_connections()
+
+
+def test_refresh_replaces_the_stored_analysis(tmp_path):
+    db_path = str(tmp_path / 'ai.db')
+    ai_analyst.analyze_stock_with_gemini("RELIANCE", FUNDAMENTALS, None, client=StubClient(), db_path=db_path)
+
+    class NewClient(StubClient):
+        def generate(self, prompt):
+            return "New " + super().generate(prompt)
+
+    client = NewClient()
+    assert ai_analyst.analyze_stock_with_gemini("RELIANCE", FUNDAMENTALS, None, client=client, db_path=db_path,
+                                                refresh=True) == "New Analysis of RELIANCE"
+    assert len(client.prompts) == 1
+    assert ai_analyst.load_cached_analyses({"RELIANCE": FUNDAMENTALS}, db_path=db_path) == \
+        {"RELIANCE": "New Analysis of RELIANCE"}
+    database.close_connections()
+
+
+def test_batch_runs_only_uncached_symbols(tmp_path):
+    db_path = str(tmp_path / 'ai.db')
+    ai_analyst.analyze_stock_with_gemini("TCS", FUNDAMENTALS, None, client=StubClient(), db_path=db_path)
+
+    client = StubClient(fail={"INFY"})
+    progress = []
+    requests = {symbol: FUNDAMENTALS for symbol in ["TCS", "RELIANCE", "INFY", "HDFCBANK"]}
+    results = ai_analyst.analyze_many(requests, None, client=client, db_path=db_path, max_workers=3,
+                                      requests_per_minute=6000,
+                                      progress_callback=lambda done, total, symbol: progress.append((done, total)))
+
+    assert results["TCS"] == "Analysis of TCS"
+    assert results["RELIANCE"] == "Analysis of RELIANCE"
+    assert results["INFY"].startswith("❌ AI Analysis Failed")
+    assert [symbol for symbol in results if ai_analyst.analysis_failed(results[symbol])] == ["INFY"]
+    assert len(client.prompts) == 3
+    assert sorted(progress) == [(2, 4), (3, 4), (4, 4)]
+    assert set(ai_analyst.load_cached_analyses(requests, db_path=db_path)) == {"TCS", "RELIANCE", "HDFCBANK"}
+    database.close_connections()
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = ai_analyst.RateLimiter(requests_per_minute=600)  # one call per 0.1s
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.wait()
+    assert time.monotonic() - started >= 0.3
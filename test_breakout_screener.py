@@ -0,0 +1,118 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import multi_year_breakout
+from breakout_screener import grid_matrix, screen_breakouts, screen_matrix, sweep_matrix
+from parquet_store import export_parquet
+from price_store import SQLitePriceStore, convert_sqlite_to_mmap, get_price_store, to_day_number
+from test_bulk_download import setup_database
+
+
+def create_fixture_history(db_path, symbols=40, seed=7):
+    # Random walks of varying length; every third symbol jumps at the end to force breakouts
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(db_path)
+    for i in range(symbols):
+        periods = int(rng.integers(3, 5000))
+        dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=periods)
+        close = np.abs(100 + rng.standard_normal(periods).cumsum() * 3) + 1
+        if i % 3 == 0:
+            close[-10:] *= 2.5
+        conn.executemany('''
+            INSERT INTO historical_data (symbol, date, high, low, close, adjusted_close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(f"SYM{i}", date.strftime('%Y-%m-%d'), price + 1, price - 1, price, price, 100)
+              for date, price in zip(dates, close)])
+    conn.commit()
+    conn.close()
+    return [f"SYM{i}" for i in range(symbols)] + ["MISSING"]
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "mmap", "parquet"])
+@pytest.mark.parametrize("years_gap,buffer,weeks_back", [(1, 0.05, 0), (3, 0.10, 2), (5, 0.01, 12)])
+def test_screener_matches_per_symbol_check(monkeypatch, tmp_path, backend, years_gap, buffer, weeks_back):
+    setup_database(monkeypatch, tmp_path)
+    symbols = create_fixture_history(multi_year_breakout.DATABASE_FILE_PATH)
+    if backend == "mmap":
+        convert_sqlite_to_mmap(multi_year_breakout.DATABASE_FILE_PATH, str(tmp_path / "price_store"))
+        store = get_price_store("mmap", directory=str(tmp_path / "price_store"))
+    elif backend == "parquet":
+        export_parquet(multi_year_breakout.DATABASE_FILE_PATH, str(tmp_path / "parquet_export"))
+        store = get_price_store("parquet", directory=str(tmp_path / "parquet_export"))
+    else:
+        store = SQLitePriceStore(multi_year_breakout.DATABASE_FILE_PATH)
+
+    breakouts, metrics = screen_breakouts(symbols, years_gap=years_gap, buffer=buffer, weeks_back=weeks_back,
+                                          store=store)
+
+    expected = []
+    for symbol in symbols:
+        assert multi_year_breakout.check_multi_year_breakout(symbol, years_gap, buffer, weeks_back, sync=False) == \
+            bool(metrics.loc[symbol, 'is_breakout'])
+        record = multi_year_breakout.evaluate_multi_year_breakout(symbol, years_gap, buffer, weeks_back, sync=False)
+        for column in ('historical_high', 'previous_high', 'current_price'):
+            assert pd.isna(record[column]) and pd.isna(metrics.loc[symbol, column]) or \
+                record[column] == metrics.loc[symbol, column]
+        if record['is_breakout']:
+            expected.append(symbol)
+    assert breakouts == expected
+
+
+@pytest.mark.parametrize("as_of", [False, True])
+def test_sweep_matches_weekly_screens(as_of):
+    rng = np.random.default_rng(3)
+    current_date = datetime(2026, 10, 14, 11, 30)
+    days = np.arange(to_day_number(current_date) - 6000, to_day_number(current_date) + 1)
+    days = days[rng.random(len(days)) > 0.3]
+    high = np.abs(100 + rng.standard_normal((len(days), 30)).cumsum(axis=0) * 3) + 1
+    high[rng.random(high.shape) > 0.9] = np.nan
+    high[:, :3] = np.nan
+    high[-200:, 5] = np.nan
+    matrix = {'high': high, 'close': high - 1}
+    matrix['close'][-20:, ::4] *= 2.5
+
+    sweep = sweep_matrix(days, matrix, years_gap=3, buffer=0.05, weeks=20, current_date=current_date, as_of=as_of)
+
+    for k in range(20):
+        if as_of:
+            # A scan on that date would only have loaded its own window
+            anchor = current_date - timedelta(days=7 * k)
+            first = np.searchsorted(days, to_day_number(anchor - timedelta(days=365 * 13), round_up=True))
+            expected = screen_matrix(range(30), days[first:], {name: values[first:] for name, values in matrix.items()},
+                                     years_gap=3, buffer=0.05, current_date=anchor)
+        else:
+            expected = screen_matrix(range(30), days, matrix, years_gap=3, buffer=0.05, weeks_back=k,
+                                     current_date=current_date)
+        assert (sweep['is_breakout'][k] == expected['is_breakout'].to_numpy()).all()
+        for column in ('historical_high', 'previous_high', 'current_price'):
+            enough = expected['historical_high'].notna() | expected['previous_high'].notna()
+            np.testing.assert_array_equal(sweep[column][k][enough], expected[column].to_numpy()[enough])
+
+
+def test_parameter_grid_matches_individual_screens():
+    rng = np.random.default_rng(5)
+    current_date = datetime(2026, 10, 14, 11, 30)
+    days = np.arange(to_day_number(current_date) - 8000, to_day_number(current_date) + 1)
+    high = np.abs(100 + rng.standard_normal((len(days), 25)).cumsum(axis=0) * 3) + 1
+    high[:-300, 4] = np.nan
+    high[:, 7] = np.nan
+    matrix = {'high': high, 'close': high - 1}
+    matrix['close'][-5:, ::3] *= 2.5
+
+    gaps, buffers = [1, 3, 6], [0.01, 0.05, 0.2]
+    cube = grid_matrix(days, matrix, gaps, buffers, weeks_back=1, current_date=current_date)
+
+    for g, gap in enumerate(gaps):
+        # A scan with this gap only loads its own window
+        first = np.searchsorted(days, to_day_number(current_date - timedelta(days=365 * (gap + 10)), round_up=True))
+        for b, buffer in enumerate(buffers):
+            expected = screen_matrix(range(25), days[first:], {name: values[first:] for name, values in matrix.items()},
+                                     years_gap=gap, buffer=buffer, weeks_back=1, current_date=current_date)
+            assert (cube['is_breakout'][:, g, b] == expected['is_breakout'].to_numpy()).all()
+            np.testing.assert_array_equal(cube['previous_high'][:, g, b], expected['previous_high'].to_numpy())
+            np.testing.assert_array_equal(cube['current_price_with_buffer'][:, g, b],
+                                          expected['current_price_with_buffer'].to_numpy())
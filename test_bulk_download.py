@@ -0,0 +1,144 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import multi_year_breakout
+from data_provider import split_by_ticker
+from market_calendar import IST
+
+
+class FakeProvider:
+    # Local stand-in for YFinanceProvider returning yfinance-shaped multi-ticker frames
+    def __init__(self, missing=()):
+        self.calls = []
+        self.starts = []
+        self.missing = set(missing)
+
+    def download(self, tickers, start, end):
+        self.calls.append(list(tickers))
+        self.starts.append(pd.Timestamp(start))
+        dates = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize() - timedelta(days=1))
+        frames = {}
+        for i, ticker in enumerate(tickers):
+            prices = np.full(len(dates), 100.0 + i)
+            if ticker in self.missing:
+                prices[:] = np.nan
+            frames[ticker] = pd.DataFrame({'Open': prices, 'High': prices + 1, 'Low': prices - 1, 'Close': prices,
+                                           'Adj Close': prices, 'Volume': 1000}, index=dates)
+        return pd.concat(frames, axis=1)
+
+
+def setup_database(monkeypatch, tmp_path):
+    monkeypatch.setattr(multi_year_breakout, 'DATABASE_FILE_PATH', str(tmp_path / 'test.db'))
+    multi_year_breakout.create_stocks_table()
+
+
+def test_bulk_sync_chunks_requests(monkeypatch, tmp_path):
+    setup_database(monkeypatch, tmp_path)
+    provider = FakeProvider()
+    symbols = [f"SYM{i}" for i in range(7)]
+
+    multi_year_breakout.bulk_sync_stock_history(symbols, datetime.today() - timedelta(days=30), datetime.today(),
+                                                chunk_size=3, provider=provider)
+
+    assert [len(call) for call in provider.calls] == [3, 3, 1]
+    conn = sqlite3.connect(multi_year_breakout.DATABASE_FILE_PATH)
+    stored = dict(conn.execute('SELECT symbol, MAX(close) FROM historical_data GROUP BY symbol').fetchall())
+    cached = {row[0] for row in conn.execute('SELECT symbol FROM cache_info')}
+    conn.close()
+    assert stored == {"SYM0": 100.0, "SYM1": 101.0, "SYM2": 102.0, "SYM3": 100.0, "SYM4": 101.0, "SYM5": 102.0,
+                      "SYM6": 100.0}
+    assert cached == set(symbols)
+
+
+def test_bulk_sync_skips_current_and_missing_symbols(monkeypatch, tmp_path):
+    setup_database(monkeypatch, tmp_path)
+    provider = FakeProvider(missing={"GONE.NS"})
+    start_date = datetime.today() - timedelta(days=30)
+
+    multi_year_breakout.bulk_sync_stock_history(["ABC", "GONE"], start_date, datetime.today(), provider=provider)
+    multi_year_breakout.bulk_sync_stock_history(["ABC", "GONE"], start_date, datetime.today(), provider=provider)
+
+    # ABC is current after the first pass, GONE never returned data and is retried
+    assert provider.calls == [["ABC.NS", "GONE.NS"], ["GONE.NS"]]
+    conn = sqlite3.connect(multi_year_breakout.DATABASE_FILE_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM cache_info WHERE symbol = 'GONE'").fetchone()[0] == 0
+    conn.close()
+
+
+def store_history(symbol, last_date, last_updated=None):
+    # Thirty stored sessions ending on last_date, with a cache_info row when last_updated is given
+    conn = sqlite3.connect(multi_year_breakout.DATABASE_FILE_PATH)
+    conn.executemany('INSERT INTO historical_data (symbol, date, close) VALUES (?, ?, 1.0)',
+                     [(symbol, date.strftime('%Y-%m-%d')) for date in pd.bdate_range(end=last_date, periods=30)])
+    if last_updated is not None:
+        conn.execute('INSERT INTO cache_info (symbol, last_updated, history_start) VALUES (?, ?, ?)',
+                     (symbol, last_updated, '2000-01-01'))
+    conn.commit()
+    conn.close()
+
+
+def test_sync_window_follows_cache_info(monkeypatch, tmp_path):
+    setup_database(monkeypatch, tmp_path)
+    provider = FakeProvider()
+    start_date = datetime.today() - timedelta(days=365)
+    last_date = pd.Timestamp(datetime.today()).normalize() - timedelta(days=20)
+    store_history("CURRENT", last_date, datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S'))
+    store_history("STALE", last_date, '2000-01-01 10:00:00')
+    store_history("UNTRACKED", last_date)
+
+    multi_year_breakout.bulk_sync_stock_history(["CURRENT", "STALE", "UNTRACKED"], start_date, datetime.today(),
+                                                provider=provider)
+
+    # Current: no download. Stale: the overlap before the last stored bar. No cache_info row: full history.
+    requested = {tuple(tickers): start for tickers, start in zip(provider.calls, provider.starts)}
+    assert requested == {
+        ("STALE.NS",): last_date - timedelta(days=multi_year_breakout.SYNC_OVERLAP_DAYS),
+        ("UNTRACKED.NS",): pd.Timestamp(start_date).normalize(),
+    }
+
+
+def test_sync_window_waits_for_the_settled_bar(monkeypatch, tmp_path):
+    setup_database(monkeypatch, tmp_path)
+    store_history("EARLY", '2025-08-14', '2025-08-14 15:45:00')
+    store_history("SETTLED", '2025-08-14', '2025-08-14 16:05:00')
+    cursor = sqlite3.connect(multi_year_breakout.DATABASE_FILE_PATH).cursor()
+    now = datetime(2025, 8, 14, 17, 0)
+
+    # Fetched before the 14th's bar settled: download again from the overlap
+    assert multi_year_breakout.get_sync_window(cursor, "EARLY", '2025-01-01', now) == pd.Timestamp('2025-08-09')
+    assert multi_year_breakout.get_sync_window(cursor, "SETTLED", '2025-01-01', now) is None
+    # Asking for more history than was ever fetched downloads from the new start
+    assert multi_year_breakout.get_sync_window(cursor, "SETTLED", '1999-01-01', now) == pd.Timestamp('1999-01-01')
+    cursor.connection.close()
+
+
+def test_split_by_ticker_handles_both_layouts():
+    frame = FakeProvider().download(["A.NS", "B.NS"], datetime(2024, 1, 1), datetime(2024, 1, 10))
+    by_ticker = split_by_ticker(frame, ["A.NS", "B.NS"])
+    by_price = split_by_ticker(frame.swaplevel(axis=1), ["A.NS", "B.NS"])
+
+    for frames in (by_ticker, by_price):
+        assert set(frames) == {"A.NS", "B.NS"}
+        assert frames["B.NS"]['Close'].iloc[0] == 101.0
+
+
+def test_store_counts_only_changed_rows(monkeypatch, tmp_path):
+    setup_database(monkeypatch, tmp_path)
+    frame = FakeProvider().download(["ABC.NS"], datetime(2024, 1, 1), datetime(2024, 1, 31))
+    df = split_by_ticker(frame, ["ABC.NS"])["ABC.NS"]
+
+    conn = sqlite3.connect(multi_year_breakout.DATABASE_FILE_PATH)
+    cursor = conn.cursor()
+    assert multi_year_breakout.store_stocks_data(cursor, "ABC", df.copy(), datetime(2024, 1, 1)) == len(df)
+    assert multi_year_breakout.store_stocks_data(cursor, "ABC", df.copy(), datetime(2024, 1, 1)) == 0
+
+    # A revised close on one overlapping day replaces the stored row
+    revised = df.copy()
+    revised.iloc[-1, revised.columns.get_loc('Close')] = 123.0
+    assert multi_year_breakout.store_stocks_data(cursor, "ABC", revised, datetime(2024, 1, 1)) == 1
+    conn.commit()
+    assert cursor.execute("SELECT close FROM historical_data WHERE symbol = 'ABC' ORDER BY date DESC").fetchone()[0] == 123.0
+    conn.close()
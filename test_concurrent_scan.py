@@ -0,0 +1,128 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import multi_year_breakout
+from market_calendar import IST
+from test_bulk_download import FakeProvider, setup_database
+
+
+class FlakyProvider(FakeProvider):
+    # Fails the first download of some tickers and never returns for others
+    def __init__(self, flaky=(), hung=()):
+        super().__init__()
+        self.flaky = set(flaky)
+        self.hung = set(hung)
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def download(self, tickers, start, end):
+        ticker = tickers[0]
+        if ticker in self.hung:
+            self.release.wait(10)
+            raise TimeoutError(ticker)
+        with self.lock:
+            if ticker in self.flaky:
+                self.flaky.discard(ticker)
+                raise ConnectionError(ticker)
+        time.sleep(0.01)
+        return super().download(tickers, start, end)
+
+
+def test_concurrent_sync_retries_and_times_out(monkeypatch, tmp_path):
+    setup_database(monkeypatch, tmp_path)
+    provider = FlakyProvider(flaky={"B.NS"}, hung={"C.NS"})
+    progress = []
+
+    sync = multi_year_breakout.concurrent_sync_stock_history(
+        ["A", "B", "C", "D"], datetime.today() - timedelta(days=30), datetime.today(), max_workers=3,
+        backoff=0.01, timeout=1, chunk_size=1, provider=provider,
+        progress_callback=lambda done, total, symbol, status: progress.append((done, symbol, status)))
+    provider.release.set()
+
+    assert sync["A"]["status"] == "fetched" and sync["A"]["attempts"] == 1
+    assert sync["B"]["status"] == "fetched" and sync["B"]["attempts"] == 2
+    assert sync["C"]["status"] == "timeout"
+    assert sync["D"]["status"] == "fetched"
+    assert [done for done, _, _ in progress] == [1, 2, 3, 4]
+
+    conn = sqlite3.connect(multi_year_breakout.DATABASE_FILE_PATH)
+    stored = {row[0] for row in conn.execute('SELECT DISTINCT symbol FROM historical_data')}
+    conn.close()
+    assert stored == {"A", "B", "D"}
+
+
+def test_workers_download_chunks(monkeypatch, tmp_path):
+    setup_database(monkeypatch, tmp_path)
+    provider = FlakyProvider(flaky={"S0.NS"})
+    symbols = [f"S{i}" for i in range(7)]
+
+    sync = multi_year_breakout.concurrent_sync_stock_history(
+        symbols, datetime.today() - timedelta(days=30), datetime.today(), max_workers=2, backoff=0.01,
+        chunk_size=3, provider=provider)
+
+    # One multi-ticker request per chunk, and the retry repeats the whole failed chunk
+    assert sorted(map(len, provider.calls)) == [1, 3, 3]
+    assert sync["S0"]["attempts"] == sync["S2"]["attempts"] == 2 and sync["S3"]["attempts"] == 1
+    assert all(result["status"] == "fetched" for result in sync.values())
+
+
+def test_scan_breakouts_keeps_input_order(monkeypatch, tmp_path):
+    setup_database(monkeypatch, tmp_path)
+    symbols = [f"SYM{i}" for i in range(10)]
+
+    results = multi_year_breakout.scan_breakouts(symbols, years_gap=1, max_workers=4, provider=FakeProvider())
+
+    assert [result["symbol"] for result in results] == symbols
+    assert all(result["status"] == "fetched" for result in results)
+
+
+def store_weekly_pattern(symbol, breakout):
+    # High of 100 over five years ago, 80 since, and this week's bars at 120 when breaking out
+    today = pd.Timestamp(datetime.today()).normalize()
+    week_start = today - timedelta(days=today.weekday())
+    dates = pd.bdate_range(end=today, periods=260 * 8)
+    gap_start = today - timedelta(days=365 * 5)
+    highs = np.where(dates < gap_start, 100.0, np.where((dates >= week_start) & breakout, 120.0, 80.0))
+    conn = sqlite3.connect(multi_year_breakout.DATABASE_FILE_PATH)
+    conn.executemany('INSERT INTO historical_data (symbol, date, high, low, close) VALUES (?, ?, ?, ?, ?)',
+                     [(symbol, date.strftime('%Y-%m-%d'), high, high, high) for date, high in zip(dates, highs)])
+    conn.execute('INSERT INTO cache_info (symbol, last_updated, history_start) VALUES (?, ?, ?)',
+                 (symbol, datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S'), '2000-01-01'))
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_manual_input_returns_breakout_records_in_input_order(monkeypatch, tmp_path, max_workers):
+    setup_database(monkeypatch, tmp_path)
+    for symbol, breakout in [("ZETA", True), ("FLAT", False), ("ALPHA", True)]:
+        store_weekly_pattern(symbol, breakout)
+
+    records = multi_year_breakout.process_manual_input(["ZETA", "FLAT", "MISSING", "ALPHA"], years_gap=5,
+                                                       buffer=0.05, max_workers=max_workers,
+                                                       provider=FakeProvider(missing={"MISSING.NS"}))
+
+    # Only breakouts, in the order they were entered, each a full record
+    assert [record['symbol'] for record in records] == ["ZETA", "ALPHA"]
+    keys = ['symbol', 'historical_high', 'historical_high_with_buffer', 'previous_high', 'current_price',
+            'current_price_with_buffer', 'is_breakout']
+    if max_workers > 1:
+        # The parallel scan merges each symbol's download status into its record
+        keys += ['status', 'attempts', 'error']
+    for record in records:
+        assert list(record) == keys
+        assert (record['historical_high'], record['previous_high'], record['current_price']) == (80.0, 100.0, 120.0)
+        assert record['historical_high_with_buffer'] == pytest.approx(76.0)
+        assert record['current_price_with_buffer'] == pytest.approx(126.0)
+        assert record['is_breakout'] is True
+    if max_workers > 1:
+        assert {record['status'] for record in records} == {'cached'}
+
+    table, _ = multi_year_breakout.render_breakout_table(records)
+    assert list(table['Stock Name'].str.rsplit(':', n=1).str[1]) == ["ZETA", "ALPHA"]
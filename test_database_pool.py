@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+
+import database
+
+
+def test_pooled_connection_is_reused_per_thread(tmp_path):
+    path = str(tmp_path / 'pool.db')
+    database.reset_db_stats()
+
+    conn = database.get_connection(path)
+    assert database.get_connection(path) is conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(database.get_connection(path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+    stats = database.get_db_stats()
+    assert (stats['connections_opened'], stats['connections_reused'], stats['schema_inits']) == (2, 1, 1)
+    database.close_connections()
+
+
+def test_schema_is_migrated_once_per_process(tmp_path):
+    path = str(tmp_path / 'schema.db')
+    conn = database.get_connection(path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == database.MIGRATIONS[-1][0]
+
+    # Later calls, including create_watchlist_tables on a rerun, skip the migrations
+    assert not database.init_schema(conn)
+    assert not database.init_schema(sqlite3.connect(path))
+    database.close_connections()
+
+
+def test_closed_connection_is_replaced(tmp_path):
+    path = str(tmp_path / 'closed.db')
+    conn = database.get_connection(path)
+    conn.close()
+
+    reopened = database.get_connection(path)
+    assert reopened is not conn
+    assert reopened.execute('SELECT COUNT(*) FROM watchlist_names').fetchone()[0] == 0
+    database.close_connections()
+
+
+def test_queries_are_counted_and_timed(tmp_path):
+    conn = database.get_connection(str(tmp_path / 'stats.db'))
+    database.reset_db_stats()
+
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO watchlist_names (name) VALUES ('Test')")
+    cursor.executemany('INSERT INTO watchlist_data (stock_symbol) VALUES (?)', [('AAA',), ('BBB',)])
+    conn.execute('SELECT * FROM watchlist_data').fetchall()
+    conn.commit()
+
+    stats = database.get_db_stats()
+    assert stats['queries'] == 3
+    assert stats['query_seconds'] > 0
+    database.close_connections()
+
+
+def reuse_script(path):
+    import threading
+
+    import streamlit as st
+
+    import database
+
+    conn = database.get_connection(path)
+    conn.execute('SELECT COUNT(*) FROM watchlist_names').fetchone()
+    st.session_state.setdefault('runs', []).append((id(conn), threading.get_ident()))
+
+
+def test_streamlit_reruns_share_the_session_connection(tmp_path):
+    from streamlit.testing.v1 import AppTest
+
+    path = str(tmp_path / 'session.db')
+    app = AppTest.from_function(reuse_script, args=(path,))
+    database.reset_db_stats()
+    app.run()
+    app.run()
+    app.run()
+    assert not app.exception
+
+    # Every rerun gets the same connection, even when it runs on a new thread
+    runs = app.session_state['runs']
+    assert len({conn for conn, _ in runs}) == 1
+    assert database.get_db_stats()['connections_opened'] == 1
+
+    # Outside a script run the thread-local pool is still used
+    assert database.get_connection(path) is not None
+    assert database.get_db_stats()['connections_opened'] == 2
+    database.close_connections()
@@ -0,0 +1,111 @@
+import threading
+from datetime import datetime, timedelta
+
+import database
+import fundamentals
+
+
+class CountingInfoProvider:
+    """Fake .info source that records every ticker it is asked for."""
+
+    def __init__(self, fail=(), empty=()):
+        self.calls = []
+        self.fail = set(fail)
+        self.empty = set(empty)
+        self.lock = threading.Lock()
+
+    def info(self, ticker):
+        with self.lock:
+            self.calls.append(ticker)
+        if ticker in self.fail:
+            raise RuntimeError('rate limited')
+        if ticker in self.empty:
+            # What .info returns while Yahoo throttles
+            return {} if ticker.startswith('E') else {'trailingPegRatio': None}
+        return {'trailingPE': 20.5, 'marketCap': 10 ** 12, 'returnOnEquity': 0.15, 'sector': 'Energy',
+                'longName': ticker, 'unrelated': 1}
+
+
+def test_fresh_fields_are_served_from_the_table(tmp_path):
+    db_path = str(tmp_path / 'fundamentals.db')
+    provider = CountingInfoProvider()
+    now = datetime(2025, 6, 2, 12, 0)
+
+    first = fundamentals.get_fundamentals('RELIANCE', ['trailingPE', 'sector', 'freeCashflow'], provider=provider,
+                                          db_path=db_path, now=now)
+    assert first == {'trailingPE': 20.5, 'sector': 'Energy', 'freeCashflow': None}
+    assert provider.calls == ['RELIANCE.NS']
+
+    # Fields Yahoo did not return are cached as None and do not trigger another call
+    again = fundamentals.get_fundamentals('RELIANCE', ['trailingPE', 'sector', 'freeCashflow'], provider=provider,
+                                          db_path=db_path, now=now + timedelta(hours=12))
+    assert again == first
+    assert provider.calls == ['RELIANCE.NS']
+    database.close_connections()
+
+
+def test_each_field_expires_on_its_own_ttl(tmp_path):
+    db_path = str(tmp_path / 'fundamentals.db')
+    provider = CountingInfoProvider()
+    now = datetime(2025, 6, 2, 12, 0)
+    fundamentals.get_fundamentals('RELIANCE', provider=provider, db_path=db_path, now=now)
+
+    # Two days later the profile is still fresh but the price ratios are not
+    later = now + timedelta(days=2)
+    assert fundamentals.get_fundamentals('RELIANCE', ['sector', 'returnOnEquity'], provider=provider,
+                                         db_path=db_path, now=later) == {'sector': 'Energy', 'returnOnEquity': 0.15}
+    assert len(provider.calls) == 1
+    fundamentals.get_fundamentals('RELIANCE', ['sector', 'trailingPE'], provider=provider, db_path=db_path, now=later)
+    assert len(provider.calls) == 2
+
+    # refresh ignores the cache
+    fundamentals.get_fundamentals('RELIANCE', ['sector'], provider=provider, db_path=db_path, now=later, refresh=True)
+    assert len(provider.calls) == 3
+    database.close_connections()
+
+
+def test_prefetch_fetches_only_stale_symbols(tmp_path):
+    db_path = str(tmp_path / 'fundamentals.db')
+    now = datetime(2025, 6, 2, 12, 0)
+    fundamentals.get_fundamentals('TCS', provider=CountingInfoProvider(), db_path=db_path, now=now)
+
+    provider = CountingInfoProvider(fail={'INFY.NS'})
+    fetched = fundamentals.prefetch_fundamentals(['TCS', 'RELIANCE', 'INFY', 'RELIANCE'], provider=provider,
+                                                 db_path=db_path, now=now)
+    assert fetched == ['RELIANCE']
+    assert sorted(provider.calls) == ['INFY.NS', 'RELIANCE.NS']
+
+    cached = fundamentals.load_fundamentals(database.get_connection(db_path).cursor(), ['RELIANCE', 'INFY'],
+                                            fundamentals.FUNDAMENTAL_FIELDS, now)
+    assert cached['RELIANCE']['longName'] == 'RELIANCE.NS'
+    assert cached['INFY'] == {}
+    database.close_connections()
+
+
+def test_empty_responses_are_not_cached(tmp_path):
+    db_path = str(tmp_path / 'fundamentals.db')
+    now = datetime(2025, 6, 2, 12, 0)
+    provider = CountingInfoProvider(empty={'EMPTY.NS', 'STUB.NS'})
+
+    assert fundamentals.get_fundamentals('EMPTY', provider=provider, db_path=db_path, now=now) == {}
+    assert fundamentals.prefetch_fundamentals(['STUB'], provider=provider, db_path=db_path, now=now) == []
+    cursor = database.get_connection(db_path).cursor()
+    assert cursor.execute('SELECT COUNT(*) FROM fundamentals').fetchone()[0] == 0
+
+    # The next call asks Yahoo again instead of serving cached Nones
+    fundamentals.get_fundamentals('EMPTY', provider=CountingInfoProvider(), db_path=db_path, now=now)
+    assert fundamentals.load_fundamentals(cursor, ['EMPTY'], ['sector'], now) == {'EMPTY': {'sector': 'Energy'}}
+    database.close_connections()
+
+
+def test_missing_fields_expire_early(tmp_path):
+    db_path = str(tmp_path / 'fundamentals.db')
+    now = datetime(2025, 6, 2, 12, 0)
+    fundamentals.get_fundamentals('RELIANCE', provider=CountingInfoProvider(), db_path=db_path, now=now)
+
+    # freeCashflow came back empty: retried after a day, unlike the returnOnEquity it sits next to
+    later = now + timedelta(days=2)
+    cached = fundamentals.load_fundamentals(database.get_connection(db_path).cursor(), ['RELIANCE'],
+                                            ['returnOnEquity', 'freeCashflow'], later)
+    assert cached == {'RELIANCE': {'returnOnEquity': 0.15}}
+    database.close_connections()
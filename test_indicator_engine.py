@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import multi_year_breakout
+from get_nse_data import calculate_rsi
+from indicator_engine import INDICATOR_COLUMNS, watchlist_indicators
+
+
+class RandomWalkProvider:
+    # Deterministic daily closes per ticker so overlapping re-fetches return the same values
+    def __init__(self, quotes=None):
+        self.calls = []
+        self.quote_calls = []
+        self.quotes = quotes or {}
+
+    def download(self, tickers, start, end):
+        self.calls.append(list(tickers))
+        dates = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+        frames = {}
+        for ticker in tickers:
+            seed = sum(map(ord, ticker))
+            day = (dates - pd.Timestamp('2000-01-01')).days.to_numpy()
+            close = 100 + 10 * np.sin(day / (20 + seed % 7)) + (day % 11) * 0.3
+            frames[ticker] = pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                                           'Adj Close': close, 'Volume': 1000}, index=dates)
+        return pd.concat(frames, axis=1)
+
+    def latest_quotes(self, tickers):
+        self.quote_calls.append(list(tickers))
+        return {ticker: self.quotes[ticker] for ticker in tickers if ticker in self.quotes}
+
+
+def reference_indicators(closes):
+    # What get_nse_data.get_historical_data computes for the last row
+    data = pd.DataFrame({'Close': closes})
+    data['RSI'] = calculate_rsi(data, period=14)
+    data['% change for that Day'] = data['Close'].pct_change() * 100
+    data['200 DMA (close)'] = data['Close'].rolling(window=200).mean()
+    data['Price % from 200 DMA'] = (data['Close'] - data['200 DMA (close)']) / data['200 DMA (close)'] * 100
+    data['50 DMA (close)'] = data['Close'].rolling(window=50).mean()
+    data['Price < 50DMA < 200DMA'] = (data['Close'] < data['50 DMA (close)']) & \
+                                     (data['50 DMA (close)'] < data['200 DMA (close)'])
+    return data.iloc[-1][INDICATOR_COLUMNS]
+
+
+def test_indicators_match_per_symbol_computation(monkeypatch, tmp_path):
+    monkeypatch.setattr(multi_year_breakout, 'DATABASE_FILE_PATH', str(tmp_path / 'test.db'))
+    multi_year_breakout.create_stocks_table()
+    provider = RandomWalkProvider()
+    symbols = ["ABC", "XYZ", "NIFTY BANK"]
+
+    indicators = watchlist_indicators(symbols, live=False, provider=provider,
+                                      db_path=multi_year_breakout.DATABASE_FILE_PATH)
+
+    # Index symbols are fetched under their Yahoo ticker, all in one batched request
+    tickers = ["ABC.NS", "XYZ.NS", "^NSEBANK"]
+    assert provider.calls == [tickers]
+    assert list(indicators.index) == symbols
+
+    start_date = datetime.today() - timedelta(days=1000)
+    for symbol, ticker in zip(symbols, tickers):
+        frame = provider.download([ticker], start_date, datetime.today())[ticker]
+        expected = reference_indicators(frame['Close'].reset_index(drop=True))
+        actual = indicators.loc[symbol]
+        for column in INDICATOR_COLUMNS:
+            assert np.isclose(float(actual[column]), float(expected[column]), rtol=1e-9), column
+
+
+def test_refresh_is_local_once_history_is_current(monkeypatch, tmp_path):
+    monkeypatch.setattr(multi_year_breakout, 'DATABASE_FILE_PATH', str(tmp_path / 'test.db'))
+    multi_year_breakout.create_stocks_table()
+    provider = RandomWalkProvider()
+
+    first = watchlist_indicators(["ABC"], live=False, provider=provider, db_path=multi_year_breakout.DATABASE_FILE_PATH)
+    second = watchlist_indicators(["ABC"], live=False, provider=provider, db_path=multi_year_breakout.DATABASE_FILE_PATH)
+
+    assert len(provider.calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_latest_quotes_are_batched_and_merged(monkeypatch, tmp_path):
+    monkeypatch.setattr(multi_year_breakout, 'DATABASE_FILE_PATH', str(tmp_path / 'test.db'))
+    multi_year_breakout.create_stocks_table()
+    tomorrow = pd.Timestamp(datetime.today()).normalize() + timedelta(days=1)
+    provider = RandomWalkProvider(quotes={"ABC.NS": (tomorrow, 123.0), "^NSEBANK": (tomorrow, 45000.0)})
+    symbols = ["ABC", "XYZ", "NIFTY BANK"]
+
+    indicators = watchlist_indicators(symbols, provider=provider, db_path=multi_year_breakout.DATABASE_FILE_PATH)
+
+    # One quote request for the whole watchlist; XYZ has no quote and keeps its stored close
+    assert provider.quote_calls == [["ABC.NS", "XYZ.NS", "^NSEBANK"]]
+    assert indicators.loc["ABC", 'Close'] == 123.0
+    assert indicators.loc["NIFTY BANK", 'Close'] == 45000.0
+    stored = provider.download(["XYZ.NS"], datetime.today() - timedelta(days=1000), datetime.today())["XYZ.NS"]
+    assert indicators.loc["XYZ", 'Close'] == stored['Close'].iloc[-1]
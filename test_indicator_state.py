@@ -0,0 +1,135 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+
+import indicator_engine
+import market_calendar
+from database import migrate
+from indicator_engine import aligned_close_matrix, compute_indicators, \
+    incremental_watchlist_indicators, load_indicator_state
+
+SESSION_CLOSE = datetime(2024, 6, 14, 18, 0)  # A Friday, after the close
+
+
+def create_database(tmp_path, closes_by_symbol):
+    path = str(tmp_path / 'state.db')
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    for symbol, closes in closes_by_symbol.items():
+        conn.executemany('INSERT OR REPLACE INTO historical_data (symbol, date, close) VALUES (?, ?, ?)',
+                         [(symbol, date.strftime('%Y-%m-%d'), float(close)) for date, close in closes.items()])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def random_closes(seed, end, rows=600):
+    rng = np.random.default_rng(seed)
+    return pd.Series(100 + rng.standard_normal(rows).cumsum(), index=pd.bdate_range(end=end, periods=rows))
+
+
+def expected_indicators(closes_by_symbol, current_date):
+    start_date = current_date - timedelta(days=1000)
+    histories = {symbol: closes[(closes.index >= start_date.replace(hour=0) + timedelta(days=1))
+                                & (closes.index <= current_date)]
+                 for symbol, closes in closes_by_symbol.items()}
+    return compute_indicators(aligned_close_matrix(histories))
+
+
+def assert_indicators_close(actual, expected):
+    assert list(actual.index) == list(expected.index)
+    assert list(actual.columns) == list(expected.columns)
+    for column in expected.columns:
+        np.testing.assert_allclose(actual[column].astype(float), expected[column].astype(float), rtol=1e-9)
+
+
+def run(path, current_date):
+    return incremental_watchlist_indicators(["AAA", "BBB"], sync=False, live=False, db_path=path,
+                                            current_date=current_date)
+
+
+def test_incremental_matches_full_computation(tmp_path):
+    closes = {"AAA": random_closes(1, SESSION_CLOSE - timedelta(days=7)),
+              "BBB": random_closes(2, SESSION_CLOSE - timedelta(days=7), rows=150)}
+    path = create_database(tmp_path, closes)
+    first_date = SESSION_CLOSE - timedelta(days=7)
+    assert_indicators_close(run(path, first_date), expected_indicators(closes, first_date))
+
+    # A week of new bars is folded into the saved state
+    closes = {symbol: pd.concat([series, pd.Series(series.iloc[-1] + np.arange(1.0, 6.0),
+                                                   index=pd.bdate_range('2024-06-10', periods=5))])
+              for symbol, series in closes.items()}
+    create_database(tmp_path, closes)
+    conn = sqlite3.connect(path)
+    bars_before = load_indicator_state(conn.cursor(), "AAA")['bars']
+    conn.close()
+
+    actual = run(path, SESSION_CLOSE)
+    conn = sqlite3.connect(path)
+    state = load_indicator_state(conn.cursor(), "AAA")
+    conn.close()
+    assert state['bars'] == bars_before + 5
+    assert state['last_date'] == '2024-06-14'
+
+    # RSI seeded further back has converged to the lookback-window value
+    expected = expected_indicators(closes, SESSION_CLOSE)
+    assert_indicators_close(actual.drop(columns='RSI'), expected.drop(columns='RSI'))
+    np.testing.assert_allclose(actual['RSI'], expected['RSI'], rtol=1e-6)
+
+
+def test_revised_history_triggers_rebuild(tmp_path):
+    closes = {"AAA": random_closes(3, SESSION_CLOSE), "BBB": random_closes(4, SESSION_CLOSE)}
+    path = create_database(tmp_path, closes)
+    run(path, SESSION_CLOSE)
+
+    # A re-fetch revised an already folded close
+    closes["AAA"].iloc[-2] += 10
+    create_database(tmp_path, closes)
+    actual = run(path, SESSION_CLOSE)
+    assert_indicators_close(actual, expected_indicators(closes, SESSION_CLOSE))
+
+
+def test_unfinished_session_is_not_persisted(tmp_path):
+    closes = {"AAA": random_closes(5, SESSION_CLOSE), "BBB": random_closes(6, SESSION_CLOSE)}
+    path = create_database(tmp_path, closes)
+
+    # Monday mid-session: the partial bar is applied but the state stays at Friday
+    during_session = datetime(2024, 6, 17, 11, 0)
+    closes = {symbol: pd.concat([series, pd.Series([series.iloc[-1] + 1], index=[pd.Timestamp('2024-06-17')])])
+              for symbol, series in closes.items()}
+    create_database(tmp_path, closes)
+    actual = run(path, during_session)
+
+    conn = sqlite3.connect(path)
+    assert load_indicator_state(conn.cursor(), "AAA")['last_date'] == '2024-06-14'
+    conn.close()
+    assert_indicators_close(actual, expected_indicators(closes, during_session))
+
+
+class UTCContainerClock(datetime):
+    """Clock of a container running in UTC at 10:30, which is the 16:00 IST post-close run."""
+
+    @classmethod
+    def now(cls, tz=None):
+        utc_now = pytz.utc.localize(datetime(2024, 6, 14, 10, 30))
+        return utc_now.astimezone(tz) if tz else utc_now.replace(tzinfo=None)
+
+    @classmethod
+    def today(cls):
+        return cls.now()
+
+
+def test_default_date_is_market_time(monkeypatch, tmp_path):
+    closes = {"AAA": random_closes(7, SESSION_CLOSE), "BBB": random_closes(8, SESSION_CLOSE)}
+    path = create_database(tmp_path, closes)
+    monkeypatch.setattr(market_calendar, 'datetime', UTCContainerClock)
+    monkeypatch.setattr(indicator_engine, 'datetime', UTCContainerClock)
+
+    # The day's settled bar is folded in although the container clock still reads 10:30
+    run(path, None)
+    conn = sqlite3.connect(path)
+    assert load_indicator_state(conn.cursor(), "AAA")['last_date'] == '2024-06-14'
+    conn.close()
@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+from bench_importtime import LAZY_MODULES, TAB_IMPORTS
+
+
+def loaded_modules(code):
+    # sys.modules of a fresh interpreter after running code
+    result = subprocess.run([sys.executable, '-c', f'{code}; import sys; print(" ".join(sys.modules))'],
+                            capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+def test_display_tab_does_not_load_heavy_modules():
+    modules = loaded_modules('; '.join(['import main'] + [f'import {m}' for m in TAB_IMPORTS['Display Watchlist']]))
+    assert not [module for module in LAZY_MODULES if module in modules]
+
+
+def test_breakout_scanner_loads_yfinance_on_first_download():
+    assert 'yfinance' not in loaded_modules('import multi_year_breakout, indicator_engine, fundamentals')
+
+
+def test_importing_scheduler_starts_no_thread():
+    result = subprocess.run([sys.executable, '-c', 'import scheduler, threading; print(threading.active_count())'],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '1'
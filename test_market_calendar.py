@@ -0,0 +1,73 @@
+from datetime import date, datetime
+
+import pytz
+
+from market_calendar import is_post_close_run, is_trading_day, last_settled_session, last_trading_session, \
+    market_phase, next_refresh_time, next_session_open
+
+
+def test_weekends_and_holidays_are_closed():
+    assert is_trading_day(date(2025, 8, 14))
+    assert not is_trading_day(date(2025, 8, 15))  # Independence Day
+    assert not is_trading_day(date(2025, 8, 16))  # Saturday
+    assert market_phase(datetime(2025, 8, 15, 11, 0)) == 'closed'
+    assert market_phase(datetime(2025, 8, 14, 9, 0)) == 'closed'
+    assert market_phase(datetime(2025, 8, 14, 11, 0)) == 'open'
+    assert market_phase(datetime(2025, 8, 14, 16, 0)) == 'after_close'
+
+
+def test_last_session_skips_holidays():
+    # Monday morning after a Friday holiday falls back to Thursday's close
+    assert last_trading_session(datetime(2025, 8, 18, 9, 0)) == datetime(2025, 8, 14, 15, 30)
+    assert last_trading_session(datetime(2025, 8, 18, 16, 0)) == datetime(2025, 8, 18, 15, 30)
+    # Timezone-aware input is converted to IST
+    utc_now = pytz.utc.localize(datetime(2025, 8, 18, 10, 30))  # 16:00 IST
+    assert last_trading_session(utc_now) == datetime(2025, 8, 18, 15, 30)
+    assert next_session_open(datetime(2025, 8, 14, 16, 0)) == datetime(2025, 8, 18, 9, 15)
+
+
+def test_refresh_schedule_follows_the_session():
+    # Frequent while open, capped at the end-of-day run
+    assert next_refresh_time(datetime(2025, 8, 14, 11, 0)) == datetime(2025, 8, 14, 11, 15)
+    assert next_refresh_time(datetime(2025, 8, 14, 15, 20)) == datetime(2025, 8, 14, 15, 30)
+    assert next_refresh_time(datetime(2025, 8, 14, 15, 50)) == datetime(2025, 8, 14, 16, 0)
+    # One run after the close, then idle until the next session
+    assert next_refresh_time(datetime(2025, 8, 14, 15, 40)) == datetime(2025, 8, 14, 16, 0)
+    assert next_refresh_time(datetime(2025, 8, 14, 17, 0)) == datetime(2025, 8, 14, 17, 0)
+    assert next_refresh_time(datetime(2025, 8, 14, 17, 0), post_close_session=date(2025, 8, 14)) == \
+        datetime(2025, 8, 18, 9, 15)
+    # Pre-open waits for the open; holidays and weekends stay idle
+    assert next_refresh_time(datetime(2025, 8, 14, 7, 0)) == datetime(2025, 8, 14, 9, 15)
+    assert next_refresh_time(datetime(2025, 8, 16, 12, 0)) == datetime(2025, 8, 18, 9, 15)
+
+
+def test_failed_run_backs_off():
+    # A failed end-of-day run is retried after the interval rather than straight away
+    assert next_refresh_time(datetime(2025, 8, 14, 16, 5), failed=True) == datetime(2025, 8, 14, 16, 20)
+    assert next_refresh_time(datetime(2025, 8, 14, 15, 40), failed=True) == datetime(2025, 8, 14, 16, 0)
+    assert next_refresh_time(datetime(2025, 8, 14, 11, 0), failed=True) == datetime(2025, 8, 14, 11, 15)
+    assert next_refresh_time(datetime(2025, 8, 14, 20, 0), post_close_session=date(2025, 8, 14), failed=True) == \
+        datetime(2025, 8, 18, 9, 15)
+
+
+def test_session_walk_includes_settled_run():
+    # Follow the schedule the way scheduler.py and refresh_worker.py do for a whole session
+    now = datetime(2025, 8, 14, 9, 15)
+    post_close_session = None
+    runs = []
+    while now < datetime(2025, 8, 18, 9, 15):
+        runs.append(now)
+        if is_post_close_run(now):
+            post_close_session = now.date()
+        now = next_refresh_time(now, post_close_session)
+    assert runs[-3:] == [datetime(2025, 8, 14, 15, 15), datetime(2025, 8, 14, 15, 30), datetime(2025, 8, 14, 16, 0)]
+    assert post_close_session == date(2025, 8, 14)
+    assert now == datetime(2025, 8, 18, 9, 15)
+
+
+def test_bar_settles_after_the_post_close_delay():
+    assert not is_post_close_run(datetime(2025, 8, 14, 15, 30))
+    assert is_post_close_run(datetime(2025, 8, 14, 16, 0))
+    assert not is_post_close_run(datetime(2025, 8, 15, 16, 0))  # holiday
+    assert last_settled_session(datetime(2025, 8, 14, 15, 45)) == datetime(2025, 8, 13, 15, 30)
+    assert last_settled_session(datetime(2025, 8, 14, 16, 0)) == datetime(2025, 8, 14, 15, 30)
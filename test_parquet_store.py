@@ -0,0 +1,166 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import database
+from parquet_store import ParquetPriceStore, export_parquet, import_parquet, open_dataset, price_filter, read_prices
+from price_store import SQLitePriceStore
+
+COLUMNS = 'symbol, date, high, low, close, adjusted_close, volume'
+
+
+def create_history(db_path, symbols, start='2019-12-20', periods=40, seed=1):
+    rng = np.random.default_rng(seed)
+    conn = database.get_connection(db_path)
+    for symbol in symbols:
+        dates = pd.bdate_range(start, periods=periods)
+        close = 100 + rng.standard_normal(periods).cumsum()
+        conn.executemany(f'INSERT OR REPLACE INTO historical_data ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         [(symbol, date.strftime('%Y-%m-%d'), price + 1, price - 1, price, price, 1000 + i)
+                          for i, (date, price) in enumerate(zip(dates, close))])
+        conn.execute('INSERT OR REPLACE INTO cache_info (symbol, last_updated, history_start) VALUES (?, ?, ?)',
+                     (symbol, '2020-01-01 10:00:00', start))
+    conn.commit()
+    return conn
+
+
+def stored_rows(db_path, table='historical_data', columns=COLUMNS):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(f'SELECT {columns} FROM {table} ORDER BY {columns}').fetchall()
+    conn.close()
+    return rows
+
+
+def partition_files(directory):
+    # {relative path: mtime} of every data file in the export
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.startswith('_'):
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, directory)] = os.stat(path).st_mtime_ns
+    return files
+
+
+@pytest.mark.parametrize('partition_by', ['year', 'symbol'])
+def test_round_trip_into_empty_database(tmp_path, partition_by):
+    source = str(tmp_path / 'source.db')
+    create_history(source, ['AAA', 'M&M', 'BAJAJ-AUTO'])
+    directory = str(tmp_path / 'export')
+
+    summary = export_parquet(source, directory, partition_by)
+    assert summary['rows'] == 120 and summary['full']
+    dirs = sorted(os.listdir(directory))
+    if partition_by == 'year':
+        assert dirs == ['_cache_info.parquet', '_manifest.json', 'year=2019', 'year=2020']
+    else:
+        assert len([name for name in dirs if name.startswith('symbol=')]) == 3
+
+    target = str(tmp_path / 'target.db')
+    database.get_connection(target)
+    assert import_parquet(directory, target) == 120
+    assert stored_rows(target) == stored_rows(source)
+    assert stored_rows(target, 'cache_info', 'symbol, last_updated, history_start') == \
+        stored_rows(source, 'cache_info', 'symbol, last_updated, history_start')
+    # Importing again changes nothing
+    assert import_parquet(directory, target) == 120
+    assert stored_rows(target) == stored_rows(source)
+    database.close_connections()
+
+
+@pytest.mark.parametrize('partition_by', ['year', 'symbol'])
+def test_incremental_export_rewrites_only_touched_partitions(tmp_path, partition_by):
+    source = str(tmp_path / 'source.db')
+    conn = create_history(source, ['AAA', 'BBB'])
+    directory = str(tmp_path / 'export')
+    export_parquet(source, directory, partition_by)
+    before = partition_files(directory)
+
+    # Nothing changed: nothing is rewritten
+    assert export_parquet(source, directory, partition_by)['rows'] == 0
+    assert partition_files(directory) == before
+
+    # A new symbol and new bars for AAA
+    create_history(source, ['CCC'], start='2020-01-06', periods=10, seed=2)
+    conn.execute(f'INSERT INTO historical_data ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                 ('AAA', '2020-03-02', 1.0, 1.0, 1.0, 1.0, 5))
+    conn.commit()
+    summary = export_parquet(source, directory, partition_by)
+    assert not summary['full']
+    after = partition_files(directory)
+    if partition_by == 'year':
+        # Only 2020 has changed rows, 2019 is left as it was
+        assert summary['partitions'] == 1
+        changed = {path for path in after if after[path] != before.get(path)}
+        assert all(path.startswith('year=2020') for path in changed)
+        assert after[next(path for path in before if path.startswith('year=2019'))] == \
+            before[next(path for path in before if path.startswith('year=2019'))]
+    else:
+        assert summary['partitions'] == 2
+        assert {path for path in after if after[path] != before.get(path)} == \
+            {path for path in after if path.startswith(('symbol=AAA', 'symbol=CCC'))}
+
+    target = str(tmp_path / 'target.db')
+    database.get_connection(target)
+    import_parquet(directory, target)
+    assert stored_rows(target) == stored_rows(source)
+    database.close_connections()
+
+
+def test_read_prices_prunes_columns_and_partitions(tmp_path):
+    source = str(tmp_path / 'source.db')
+    create_history(source, ['AAA', 'BBB', 'CCC'], start='2018-01-01', periods=600)
+    directory = str(tmp_path / 'export')
+    export_parquet(source, directory, 'year')
+
+    table = read_prices(directory, ['symbol', 'date', 'close'], symbols=['BBB'], start_date='2019-03-01',
+                        end_date='2019-03-31')
+    assert table.column_names == ['symbol', 'date', 'close']
+    assert set(table['symbol'].to_pylist()) == {'BBB'}
+    dates = table['date'].to_pylist()
+    assert dates == sorted(dates) and len(dates) == 21
+    assert str(dates[0]) == '2019-03-01' and str(dates[-1]) == '2019-03-29'
+
+    # Year bounds prune whole partitions before any file is opened
+    dataset, partition_by = open_dataset(directory)
+    fragments = list(dataset.get_fragments(filter=price_filter(partition_by, start_date='2019-03-01',
+                                                               end_date='2019-03-31')))
+    assert [fragment.path.split(os.sep)[-2] for fragment in fragments] == ['year=2019']
+    assert pq.read_metadata(fragments[0].path).num_row_groups >= 1
+    database.close_connections()
+
+
+def test_partial_import_leaves_cache_info_alone(tmp_path):
+    source = str(tmp_path / 'source.db')
+    create_history(source, ['AAA', 'BBB'])
+    directory = str(tmp_path / 'export')
+    export_parquet(source, directory)
+
+    target = str(tmp_path / 'target.db')
+    database.get_connection(target)
+    assert import_parquet(directory, target, symbols=['BBB'], start_date='2020-01-01') == 32
+    rows = stored_rows(target)
+    assert {row[0] for row in rows} == {'BBB'} and min(row[1] for row in rows) == '2020-01-01'
+    assert stored_rows(target, 'cache_info', 'symbol') == []
+    database.close_connections()
+
+
+def test_parquet_store_matches_sqlite_store(tmp_path):
+    source = str(tmp_path / 'source.db')
+    create_history(source, ['AAA', 'BBB'], start='2015-01-01', periods=1500)
+    directory = str(tmp_path / 'export')
+    export_parquet(source, directory, 'symbol')
+
+    expected = SQLitePriceStore(source).load_history('AAA', '2016-02-01', '2018-06-30')
+    actual = ParquetPriceStore(directory).load_history('AAA', '2016-02-01', '2018-06-30')
+    pd.testing.assert_frame_equal(actual, expected.astype('float64'), check_names=False, check_freq=False)
+    assert ParquetPriceStore(directory).load_history('MISSING', '2016-02-01', '2018-06-30').empty
+
+    universe = ParquetPriceStore(directory).load_universe(['AAA', 'BBB', 'MISSING'], '2016-02-01', '2018-06-30')
+    assert sorted(universe) == ['AAA', 'BBB']
+    assert (np.diff(universe['BBB']['date']) > 0).all()
+    database.close_connections()
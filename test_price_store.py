@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+import database
+from price_store import SQLitePriceStore, convert_sqlite_to_mmap, get_price_store, open_mmap_store
+
+START, END = '2019-01-01', '2021-12-31'
+
+
+def create_history(db_path, symbols, periods=400, seed=3):
+    rng = np.random.default_rng(seed)
+    conn = database.get_connection(db_path)
+    for symbol in symbols:
+        dates = pd.bdate_range('2019-06-03', periods=periods)
+        close = 100 + rng.standard_normal(periods).cumsum()
+        conn.executemany('INSERT INTO historical_data (symbol, date, high, low, close, adjusted_close, volume) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         [(symbol, date.strftime('%Y-%m-%d'), price + 1, price - 1, price, price, 1000 + i)
+                          for i, (date, price) in enumerate(zip(dates, close))])
+        conn.execute("INSERT INTO cache_info (symbol, last_updated, history_start) VALUES (?, ?, '2019-06-03')",
+                     (symbol, '2020-01-01 10:00:00'))
+    conn.commit()
+    return conn
+
+
+def mmap_store(tmp_path, db_path):
+    directory = str(tmp_path / 'price_store')
+    convert_sqlite_to_mmap(db_path, directory)
+    open_mmap_store.cache_clear()
+    return get_price_store('mmap', db_path=db_path, directory=directory)
+
+
+def test_snapshot_matches_sqlite(tmp_path):
+    db_path = str(tmp_path / 'prices.db')
+    create_history(db_path, ['AAA', 'BBB', 'M&M'])
+    store = mmap_store(tmp_path, db_path)
+    sqlite_store = SQLitePriceStore(db_path)
+
+    for symbol in ['AAA', 'BBB', 'M&M']:
+        pd.testing.assert_frame_equal(store.load_history(symbol, '2019-09-02', '2020-03-31'),
+                                      sqlite_store.load_history(symbol, '2019-09-02', '2020-03-31').astype('float64'),
+                                      check_freq=False)
+
+    expected = sqlite_store.load_universe(['AAA', 'BBB', 'M&M'], START, END)
+    actual = store.load_universe(['AAA', 'BBB', 'M&M'], START, END)
+    assert sorted(actual) == sorted(expected)
+    for symbol, columns in expected.items():
+        for name, values in columns.items():
+            np.testing.assert_array_equal(actual[symbol][name], values)
+    database.close_connections()
+
+
+def test_slices_are_views_of_the_mapped_files(tmp_path):
+    db_path = str(tmp_path / 'prices.db')
+    create_history(db_path, ['AAA', 'BBB'])
+    store = mmap_store(tmp_path, db_path)
+
+    arrays = store.load_arrays('BBB', '2019-09-02', '2020-03-31')
+    for name, column in store.columns.items():
+        assert isinstance(column, np.memmap)
+        assert np.shares_memory(arrays[name], column)
+        assert not arrays[name].flags.writeable
+    assert store.load_universe(['BBB'], START, END)['BBB']['close'].base is not None
+    database.close_connections()
+
+
+def test_missing_symbol_is_empty(tmp_path):
+    db_path = str(tmp_path / 'prices.db')
+    create_history(db_path, ['AAA'])
+    store = mmap_store(tmp_path, db_path)
+
+    assert store.load_history('MISSING', START, END).empty
+    assert list(store.load_history('MISSING', START, END).columns) == ['high', 'low', 'close', 'volume']
+    assert sorted(store.load_universe(['AAA', 'MISSING'], START, END)) == ['AAA']
+    database.close_connections()
+
+
+def test_symbols_updated_after_the_snapshot_are_read_from_sqlite(tmp_path, caplog):
+    db_path = str(tmp_path / 'prices.db')
+    conn = create_history(db_path, ['AAA', 'BBB'])
+    store = mmap_store(tmp_path, db_path)
+
+    # A later sync appends a bar for AAA and stamps cache_info
+    conn.execute("INSERT INTO historical_data (symbol, date, high, low, close, adjusted_close, volume) "
+                 "VALUES ('AAA', '2021-06-01', 501, 499, 500, 500, 1)")
+    conn.execute("UPDATE cache_info SET last_updated = '2999-01-01 00:00:00' WHERE symbol = 'AAA'")
+    conn.commit()
+
+    assert store.load_history('AAA', START, END)['close'].iloc[-1] == 500
+    universe = store.load_universe(['AAA', 'BBB'], START, END)
+    assert universe['AAA']['close'][-1] == 500
+    assert np.shares_memory(universe['BBB']['close'], store.columns['close'])
+    assert 'older than the stored history of 1 symbols' in caplog.text
+    database.close_connections()
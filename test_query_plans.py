@@ -0,0 +1,142 @@
+import sqlite3
+
+import pytest
+
+from database import MAPPING_RANK_UPDATE, MIGRATIONS, connect, is_without_rowid, migrate
+from update_data import WATCHLIST_RANK_UPDATE
+from watchlist_display import WATCHLIST_PAGE_QUERY
+
+# The queries run on every breakout scan, watchlist render and watchlist refresh
+HOT_QUERIES = {
+    'load_history': ('''
+        SELECT date, high, low, close, volume FROM historical_data
+        WHERE symbol = ? AND date BETWEEN ? AND ?
+        ORDER BY date
+    ''', ('AAA', '2020-01-01', '2024-01-01')),
+    'load_universe': ('''
+        SELECT symbol, date, high, low, close, volume FROM historical_data
+        WHERE symbol IN (?, ?, ?) AND date BETWEEN ? AND ?
+        ORDER BY symbol, date
+    ''', ('AAA', 'BBB', 'CCC', '2020-01-01', '2024-01-01')),
+    'sync_window': ('SELECT MIN(date), MAX(date) FROM historical_data WHERE symbol = ?', ('AAA',)),
+    'indicator_state': ('SELECT * FROM indicator_state WHERE symbol = ?', ('AAA',)),
+    'indicator_new_bars': ('''
+        SELECT date, close FROM historical_data
+        WHERE symbol = ? AND date > ? AND date <= ?
+        ORDER BY date
+    ''', ('AAA', '2020-01-10', '2020-01-20')),
+    'indicator_revision_check': ('''
+        SELECT close FROM historical_data
+        WHERE symbol = ? AND date <= ?
+        ORDER BY date DESC LIMIT ?
+    ''', ('AAA', '2020-01-20', 5)),
+    'cache_info': ('SELECT last_updated, history_start FROM cache_info WHERE symbol = ?', ('AAA',)),
+    'display_watchlist_data': ('''
+        SELECT wd.stock_symbol, wd.stock_price, wd.rsi, wd.rsi_rank, wd.dma_200_rank
+        FROM watchlist_data AS wd
+        JOIN watchlist_stock_mapping AS wsm ON wd.id = wsm.stock_id
+        JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+        WHERE wn.name = ?
+    ''', ('Nifty 50',)),
+    'watchlist_page': (WATCHLIST_PAGE_QUERY.format(column='wsm.rsi_rank', direction='ASC'),
+                       ('https://www.tradingview.com/chart/?symbol=NSE:', 'Nifty 50', 50, 0)),
+    'update_database': ('''
+        SELECT wd.*
+        FROM watchlist_data AS wd
+        JOIN watchlist_stock_mapping AS wsm ON wd.id = wsm.stock_id
+        JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+        WHERE wn.name = ?
+    ''', ('Nifty 50',)),
+    'get_stocks_in_watchlist': ('''
+        SELECT wd.stock_symbol
+        FROM watchlist_stock_mapping AS wsm
+        JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+        JOIN watchlist_data AS wd ON wsm.stock_id = wd.id
+        WHERE wn.name = ?
+    ''', ('Nifty 50',)),
+    'delete_stock_from_watchlist': ('''
+        SELECT stock_id FROM watchlist_stock_mapping
+        WHERE watchlist_id = ? AND stock_id IN (
+            SELECT id FROM watchlist_data WHERE stock_symbol = ?
+        )
+    ''', (1, 'AAA')),
+    'update_ranks': (WATCHLIST_RANK_UPDATE, ('Nifty 50',)),
+    'update_mapping_ranks': (MAPPING_RANK_UPDATE.format(where='WHERE wn.name = ?'), ('Nifty 50',)),
+    'update_stock_row': ('UPDATE watchlist_data SET rsi = ? WHERE stock_symbol = ?', (50.0, 'AAA')),
+}
+
+
+def populate(conn):
+    # Enough rows that the planner prefers indexes over scanning
+    symbols = [f"S{i:03d}" for i in range(200)]
+    conn.executemany('INSERT INTO historical_data (symbol, date, close) VALUES (?, ?, ?)',
+                     [(symbol, f"2020-01-{day:02d}", 1.0) for symbol in symbols for day in range(1, 29)])
+    conn.executemany('INSERT INTO cache_info (symbol) VALUES (?)', [(symbol,) for symbol in symbols])
+    conn.executemany('INSERT INTO watchlist_names (name) VALUES (?)', [(f"W{i}",) for i in range(20)])
+    conn.executemany('INSERT INTO watchlist_data (stock_symbol) VALUES (?)', [(symbol,) for symbol in symbols])
+    conn.executemany('INSERT INTO watchlist_stock_mapping (watchlist_id, stock_id) VALUES (?, ?)',
+                     [(w, s) for w in range(1, 21) for s in range(1, 201, 3)])
+    conn.commit()
+    conn.execute('ANALYZE')
+
+
+@pytest.fixture(params=[False, True], ids=['rowid', 'without_rowid'])
+def conn(request, tmp_path):
+    conn = connect(str(tmp_path / 'plans.db'))
+    migrate(conn, without_rowid=request.param)
+    populate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_queries_use_indexes(conn, name):
+    query, params = HOT_QUERIES[name]
+    plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+    # Scanning an already filtered subquery or materialized result is fine, scanning a table is not
+    materialized = {step.split()[1] for step in plan if step.startswith('MATERIALIZE')}
+    scans = [step for step in plan if step.startswith('SCAN') and not step.startswith('SCAN (subquery')
+             and step.split()[1] not in materialized]
+    assert not scans, f"{name} falls back to a table scan: {plan}"
+
+
+def test_migrate_is_versioned_and_idempotent(tmp_path):
+    path = str(tmp_path / 'migrate.db')
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    migrate(conn)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == MIGRATIONS[-1][0]
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.close()
+
+
+def test_rank_migration_backfills_existing_watchlists(tmp_path):
+    # A version 3 database with refreshed metrics but no per-watchlist ranks yet
+    conn = sqlite3.connect(str(tmp_path / 'ranks.db'))
+    for version, _, apply in MIGRATIONS[:3]:
+        apply(conn.cursor())
+    conn.execute('PRAGMA user_version = 3')
+    conn.execute("INSERT INTO watchlist_names (name) VALUES ('Test')")
+    conn.executemany('INSERT INTO watchlist_data (stock_symbol, rsi, percent_away_from_dma_200) VALUES (?, ?, ?)',
+                     [('AAA', 70.0, -2.0), ('BBB', 30.0, 5.0), ('CCC', None, 1.0)])
+    conn.executemany('INSERT INTO watchlist_stock_mapping (watchlist_id, stock_id) VALUES (1, ?)', [(1,), (2,), (3,)])
+    conn.commit()
+
+    migrate(conn)
+    ranks = conn.execute('SELECT stock_id, rsi_rank, dma_200_rank FROM watchlist_stock_mapping ORDER BY stock_id')
+    assert ranks.fetchall() == [(1, 2, 1), (2, 1, 3), (3, None, 2)]
+    conn.close()
+
+
+def test_without_rowid_rebuild_keeps_rows(tmp_path):
+    conn = connect(str(tmp_path / 'rebuild.db'))
+    migrate(conn, without_rowid=False)
+    conn.executemany('INSERT INTO historical_data (symbol, date, close) VALUES (?, ?, ?)',
+                     [('AAA', '2020-01-01', 1.0), ('AAA', '2020-01-02', 2.0), ('BBB', '2020-01-01', 3.0)])
+    conn.commit()
+
+    migrate(conn, without_rowid=True)
+    assert is_without_rowid(conn.cursor(), 'historical_data')
+    rows = conn.execute('SELECT symbol, date, close FROM historical_data ORDER BY symbol, date').fetchall()
+    assert rows == [('AAA', '2020-01-01', 1.0), ('AAA', '2020-01-02', 2.0), ('BBB', '2020-01-01', 3.0)]
+    conn.close()
@@ -0,0 +1,129 @@
+import sqlite3
+
+import job_queue
+import refresh_worker
+import update_data
+from database import migrate
+from test_update_data import fake_indicators
+
+
+def create_queue(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'jobs.db'))
+    migrate(conn)
+    return conn
+
+
+def test_enqueue_reuses_waiting_job(tmp_path):
+    conn = create_queue(tmp_path)
+    cursor = conn.cursor()
+
+    first = job_queue.enqueue_refresh(cursor, 'all')
+    assert job_queue.enqueue_refresh(cursor, 'all') == first
+    other = job_queue.enqueue_refresh(cursor, 'watchlist', 'Test')
+    assert other != first
+    assert job_queue.get_queue_depth(cursor) == 2
+
+    # Once claimed, a new request queues a fresh job
+    job_queue.claim_next_job(conn, 'w1')
+    assert job_queue.enqueue_refresh(cursor, 'all') not in (first, other)
+    conn.close()
+
+
+def test_claim_takes_oldest_job_once(tmp_path):
+    conn = create_queue(tmp_path)
+    other = sqlite3.connect(str(tmp_path / 'jobs.db'))
+    first = job_queue.enqueue_refresh(conn.cursor(), 'watchlist', 'A')
+    second = job_queue.enqueue_refresh(conn.cursor(), 'watchlist', 'B')
+
+    job = job_queue.claim_next_job(conn, 'w1')
+    assert (job['id'], job['status'], job['worker'], job['watchlist_name']) == (first, 'running', 'w1', 'A')
+    assert job_queue.claim_next_job(other, 'w2')['id'] == second
+    assert job_queue.claim_next_job(conn, 'w1') is None
+    other.close()
+    conn.close()
+
+
+def test_process_next_job_records_outcome(monkeypatch, tmp_path):
+    conn = create_queue(tmp_path)
+    ran = []
+
+    def fake_run_job(conn, job):
+        ran.append(job['watchlist_name'])
+        if job['watchlist_name'] == 'Broken':
+            raise RuntimeError('download failed')
+
+    monkeypatch.setattr(refresh_worker, 'run_job', fake_run_job)
+    job_queue.enqueue_refresh(conn.cursor(), 'watchlist', 'Test')
+    job_queue.enqueue_refresh(conn.cursor(), 'watchlist', 'Broken')
+
+    assert refresh_worker.process_next_job(conn, 'w1')
+    assert refresh_worker.process_next_job(conn, 'w1')
+    assert not refresh_worker.process_next_job(conn, 'w1')
+
+    assert ran == ['Test', 'Broken']
+    jobs = {job['watchlist_name']: job for job in job_queue.get_recent_jobs(conn.cursor())}
+    assert (jobs['Test']['status'], jobs['Test']['error']) == ('done', None)
+    assert (jobs['Broken']['status'], jobs['Broken']['error']) == ('failed', 'download failed')
+    assert jobs['Broken']['finished_at'] is not None
+    conn.close()
+
+
+def test_stale_running_jobs_are_requeued(tmp_path):
+    conn = create_queue(tmp_path)
+    job_id = job_queue.enqueue_refresh(conn.cursor(), 'all')
+    job_queue.claim_next_job(conn, 'dead-worker')
+    conn.execute("UPDATE refresh_jobs SET started_at = datetime('now', '-2 hours')")
+    conn.commit()
+
+    assert job_queue.requeue_stale_jobs(conn, 60) == 1
+    assert job_queue.claim_next_job(conn, 'w1')['id'] == job_id
+    # A job that just started is left alone
+    assert job_queue.requeue_stale_jobs(conn, 60) == 0
+    conn.close()
+
+
+def test_failed_write_marks_job_failed(monkeypatch, tmp_path):
+    conn = create_queue(tmp_path)
+    conn.execute("INSERT INTO watchlist_names (name) VALUES ('Test')")
+    conn.execute("INSERT INTO watchlist_data (stock_symbol) VALUES ('AAA')")
+    conn.execute('INSERT INTO watchlist_stock_mapping (watchlist_id, stock_id) VALUES (1, 1)')
+    # Every metrics write fails, as a full disk or a locked database would
+    conn.execute('''
+        CREATE TRIGGER fail_metrics BEFORE UPDATE ON watchlist_data
+        BEGIN SELECT RAISE(ABORT, 'disk I/O error'); END
+    ''')
+    conn.commit()
+    indicators = fake_indicators({'AAA': (50.0, 1.0)})
+    monkeypatch.setattr(update_data, 'compute_indicators', lambda *args, **kwargs: indicators)
+
+    job_queue.enqueue_refresh(conn.cursor(), 'watchlist', 'Test')
+    job_queue.enqueue_refresh(conn.cursor(), 'all')
+    assert refresh_worker.process_next_job(conn, 'w1')
+    assert refresh_worker.process_next_job(conn, 'w1')
+
+    jobs = job_queue.get_recent_jobs(conn.cursor())
+    assert [(job['status'], job['error']) for job in jobs] == [('failed', 'disk I/O error')] * 2
+    assert conn.execute('SELECT rsi FROM watchlist_data').fetchone() == (None,)
+    conn.close()
+
+
+def test_live_quotes_only_while_open(monkeypatch, tmp_path):
+    conn = create_queue(tmp_path)
+    conn.execute("INSERT INTO watchlist_names (name) VALUES ('Test')")
+    conn.execute("INSERT INTO watchlist_data (stock_symbol) VALUES ('AAA')")
+    conn.execute('INSERT INTO watchlist_stock_mapping (watchlist_id, stock_id) VALUES (1, 1)')
+    conn.commit()
+    calls = []
+
+    def compute_indicators(symbols, incremental, max_workers, live=True, **kwargs):
+        calls.append(live)
+        return fake_indicators({'AAA': (50.0, 1.0)})
+
+    monkeypatch.setattr(update_data, 'compute_indicators', compute_indicators)
+    for phase in ('open', 'after_close', 'closed'):
+        monkeypatch.setattr(refresh_worker, 'market_phase', lambda: phase)
+        refresh_worker.run_job(conn, {'kind': 'watchlist', 'watchlist_name': 'Test'})
+        refresh_worker.run_job(conn, {'kind': 'all', 'watchlist_name': None})
+
+    assert calls == [True, True, False, False, False, False]
+    conn.close()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from get_nse_data import calculate_rsi, rsi_matrix
+
+
+def loop_rsi(data, period=14):
+    # The previous scalar implementation, kept as the reference
+    close = data['Close']
+    delta = close.diff()
+    gains = delta.where(delta > 0, 0)
+    losses = -delta.where(delta < 0, 0)
+
+    avg_gains = gains.iloc[:period].mean()
+    avg_losses = losses.iloc[:period].mean()
+
+    rs_values = []
+    for i in range(period, len(gains)):
+        avg_gains = (avg_gains * (period - 1) + gains.iloc[i]) / period
+        avg_losses = (avg_losses * (period - 1) + losses.iloc[i]) / period
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = avg_gains / avg_losses
+        rsi = 100 - (100 / (1 + rs))
+        rs_values.append(rsi)
+
+    return pd.Series(rs_values, index=close.index[period:])
+
+
+def random_closes(seed, rows):
+    rng = np.random.default_rng(seed)
+    steps = rng.standard_normal(rows) * rng.uniform(0.1, 5)
+    # Some flat stretches so gains and losses are exactly zero at times
+    steps[rng.random(rows) < 0.1] = 0
+    return pd.DataFrame({'Close': 100 + steps.cumsum()}, index=pd.bdate_range('2020-01-01', periods=rows))
+
+
+@pytest.mark.parametrize('seed', range(25))
+@pytest.mark.parametrize('period', [2, 14, 30])
+def test_matches_loop_implementation(seed, period):
+    data = random_closes(seed, rows=int(np.random.default_rng(seed).integers(1, 400)))
+    expected = loop_rsi(data, period)
+    actual = calculate_rsi(data, period)
+    assert actual.index.equals(expected.index)
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(dtype=float), rtol=1e-9, atol=1e-9)
+
+
+def test_monotonic_series():
+    rising = pd.DataFrame({'Close': np.arange(1.0, 50.0)})
+    falling = pd.DataFrame({'Close': np.arange(50.0, 1.0, -1)})
+    assert (calculate_rsi(rising) == 100).all()
+    assert (calculate_rsi(falling) == 0).all()
+    flat = pd.DataFrame({'Close': np.ones(30)})
+    assert calculate_rsi(flat).isna().all()
+
+
+def test_matrix_matches_per_column():
+    # Columns with different history lengths line up on a shared date index
+    columns = {f"S{seed}": random_closes(seed, 300)['Close'] for seed in range(6)}
+    columns['S1'] = columns['S1'].iloc[120:]
+    columns['S2'] = columns['S2'].iloc[290:]
+    closes = pd.DataFrame(columns)
+
+    matrix = rsi_matrix(closes)
+    for symbol in closes.columns:
+        column = closes[symbol].dropna()
+        expected = loop_rsi(column.to_frame('Close'))
+        np.testing.assert_allclose(matrix[symbol].reindex(expected.index).to_numpy(), expected.to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-9)
+        # Nothing before the first RSI bar of each column
+        assert matrix[symbol].notna().sum() == len(expected.dropna())
@@ -0,0 +1,44 @@
+import logging
+from datetime import datetime
+
+import scheduler
+
+
+def test_each_run_logs_the_scheduler_status(monkeypatch, caplog):
+    monkeypatch.setattr(scheduler, 'get_connection', lambda db_path: None)
+    monkeypatch.setattr(scheduler, 'refresh_all_watchlists', lambda conn, progress_callback, **kwargs: (
+        progress_callback(3, 3, 'CCC', 'done'), ['Test'])[1])
+    monkeypatch.setattr(scheduler, 'job_stats', dict(scheduler.job_stats, runs=0))
+    scheduler.scheduler.start(paused=True)
+    try:
+        with caplog.at_level(logging.INFO):
+            scheduler.reload_all_watchlists()
+    finally:
+        scheduler.scheduler.shutdown(wait=False)
+
+    status = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Scheduler status')]
+    assert len(status) == 1
+    assert 'Scheduler status: 1 runs' in status[0]
+    assert 'for 3 symbols, 0 symbols queued, 1 jobs pending' in status[0]
+    assert 'next run not scheduled' not in status[0] and 'last error: none' in status[0]
+
+
+def test_failed_post_close_run_is_retried_after_the_interval(monkeypatch):
+    def failing_refresh(conn, **kwargs):
+        raise RuntimeError('rate limited')
+
+    now = datetime(2025, 8, 14, 16, 0)
+    monkeypatch.setattr(scheduler, 'to_ist', lambda: now)
+    monkeypatch.setattr(scheduler, 'get_connection', lambda db_path: None)
+    monkeypatch.setattr(scheduler, 'refresh_all_watchlists', failing_refresh)
+    monkeypatch.setattr(scheduler, 'job_stats', dict(scheduler.job_stats, post_close_session=None))
+    scheduler.scheduler.start(paused=True)
+    try:
+        scheduler.reload_all_watchlists()
+        job = scheduler.scheduler.get_job(scheduler.REFRESH_JOB_ID)
+        assert job.trigger.run_date.replace(tzinfo=None) == datetime(2025, 8, 14, 16, 15)
+        assert scheduler.job_stats['last_error'] == 'rate limited'
+        assert scheduler.job_stats['post_close_session'] is None
+    finally:
+        scheduler.scheduler.remove_all_jobs()
+        scheduler.scheduler.shutdown(wait=False)
@@ -0,0 +1,90 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicator_engine
+import update_data
+from database import migrate
+from indicator_engine import INDICATOR_COLUMNS
+
+
+def create_watchlist(tmp_path, symbols):
+    conn = sqlite3.connect(str(tmp_path / 'watchlists.db'))
+    migrate(conn)
+    conn.execute("INSERT INTO watchlist_names (name, updated_at) VALUES ('Test', '2000-01-01 00:00:00')")
+    for symbol in symbols:
+        cursor = conn.execute('INSERT INTO watchlist_data (stock_symbol) VALUES (?)', (symbol,))
+        conn.execute('INSERT INTO watchlist_stock_mapping (watchlist_id, stock_id) VALUES (1, ?)', (cursor.lastrowid,))
+    conn.commit()
+    return conn
+
+
+def fake_indicators(values):
+    # {symbol: (rsi, percent from 200 DMA)} -> engine-shaped frame
+    return pd.DataFrame({symbol: {'Close': 100.0, '% change for that Day': 1.0, '200 DMA (close)': 90.0,
+                                  'Price % from 200 DMA': dma, '50 DMA (close)': 95.0,
+                                  'Price < 50DMA < 200DMA': False, 'RSI': rsi}
+                         for symbol, (rsi, dma) in values.items()}).T[INDICATOR_COLUMNS]
+
+
+def test_metrics_and_ranks_written_in_one_pass(monkeypatch, tmp_path):
+    conn = create_watchlist(tmp_path, ["AAA", "BBB", "CCC", "DDD"])
+    indicators = fake_indicators({"AAA": (70.0, 5.0), "BBB": (30.0, -2.0), "CCC": (30.0, 12.0), "DDD": (np.nan, 1.0)})
+    monkeypatch.setattr(indicator_engine, 'watchlist_indicators', lambda symbols, **kwargs: indicators)
+
+    update_data.update_database(conn, 'Test')
+
+    rows = dict((row[0], row[1:]) for row in conn.execute(
+        'SELECT stock_symbol, stock_price, rsi, rsi_rank, dma_200_rank FROM watchlist_data'))
+    assert rows == {"AAA": (100.0, 70.0, 3, 3), "BBB": (100.0, 30.0, 1, 1), "CCC": (100.0, 30.0, 1, 4),
+                    "DDD": (100.0, None, None, 2)}
+    assert conn.execute("SELECT updated_at FROM watchlist_names").fetchone()[0] != '2000-01-01 00:00:00'
+    conn.close()
+
+
+def test_failed_refresh_leaves_watchlist_untouched(monkeypatch, tmp_path):
+    conn = create_watchlist(tmp_path, ["AAA", "BBB"])
+    indicators = fake_indicators({"AAA": (70.0, 5.0), "BBB": (30.0, -2.0)})
+    monkeypatch.setattr(indicator_engine, 'watchlist_indicators', lambda symbols, **kwargs: indicators)
+    monkeypatch.setattr(update_data, 'WATCHLIST_RANK_UPDATE', 'UPDATE no_such_table SET x = ?')
+
+    with pytest.raises(sqlite3.OperationalError):
+        update_data.update_database(conn, 'Test')
+
+    assert conn.execute('SELECT COUNT(*) FROM watchlist_data WHERE stock_price IS NOT NULL').fetchone()[0] == 0
+    assert conn.execute("SELECT updated_at FROM watchlist_names").fetchone()[0] == '2000-01-01 00:00:00'
+    conn.close()
+
+
+def test_global_refresh_computes_each_symbol_once(monkeypatch, tmp_path):
+    conn = create_watchlist(tmp_path, ["AAA", "BBB", "CCC"])
+    conn.execute("INSERT INTO watchlist_names (name) VALUES ('Other')")
+    conn.executemany('INSERT INTO watchlist_stock_mapping (watchlist_id, stock_id) VALUES (2, ?)', [(1,), (3,)])
+    conn.commit()
+
+    calls = []
+    indicators = fake_indicators({"AAA": (70.0, 5.0), "BBB": (30.0, -2.0), "CCC": (50.0, 12.0)})
+
+    def watchlist_indicators(symbols, **kwargs):
+        calls.append(list(symbols))
+        return indicators.loc[symbols]
+
+    monkeypatch.setattr(indicator_engine, 'watchlist_indicators', watchlist_indicators)
+
+    assert update_data.refresh_all_watchlists(conn) == ['Test', 'Other']
+    assert calls == [["AAA", "BBB", "CCC"]]
+
+    # Each watchlist is ranked on its own members
+    ranks = conn.execute('''
+        SELECT wn.name, wd.stock_symbol, wsm.rsi_rank, wsm.dma_200_rank
+        FROM watchlist_stock_mapping AS wsm
+        JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+        JOIN watchlist_data AS wd ON wsm.stock_id = wd.id
+        ORDER BY wn.name, wd.stock_symbol
+    ''').fetchall()
+    assert ranks == [('Other', 'AAA', 2, 1), ('Other', 'CCC', 1, 2),
+                     ('Test', 'AAA', 3, 2), ('Test', 'BBB', 1, 1), ('Test', 'CCC', 2, 3)]
+    assert conn.execute("SELECT COUNT(*) FROM watchlist_names WHERE updated_at IS NULL").fetchone()[0] == 0
+    conn.close()
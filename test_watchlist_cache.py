@@ -0,0 +1,109 @@
+import database
+import indicator_engine
+import update_data
+import watchlist_display
+import watchlist_management
+from test_update_data import fake_indicators
+
+
+def create_watchlist(tmp_path, symbols):
+    conn = database.get_connection(str(tmp_path / 'views.db'))
+    cursor = conn.cursor()
+    watchlist_management.insert_watchlist_name(cursor, 'Test')
+    watchlist_management.insert_stocks_from_csv(cursor, 'Test', ','.join(symbols))
+    conn.execute("UPDATE watchlist_names SET updated_at = '2025-01-01 10:00:00'")
+    conn.commit()
+    return conn
+
+
+def test_page_is_cached_until_data_version_changes(monkeypatch, tmp_path):
+    watchlist_display.load_watchlist_page.clear()
+    conn = create_watchlist(tmp_path, ["AAA", "BBB"])
+    db_path = database.database_path(conn)
+    version = database.get_data_version(conn.cursor())
+
+    first = watchlist_display.load_watchlist_page(db_path, 'Test', version)
+    assert list(first['Symbol']) == [watchlist_display.TRADINGVIEW_URL + 'AAA', watchlist_display.TRADINGVIEW_URL + 'BBB']
+    assert first['Price'].isna().all()
+
+    # A write that does not bump the version is not picked up by a rerun
+    conn.execute("UPDATE watchlist_data SET stock_price = 123.0")
+    conn.commit()
+    assert watchlist_display.load_watchlist_page(db_path, 'Test', version).equals(first)
+
+    # update_database bumps the version, so the next rerun reads the new rows
+    indicators = fake_indicators({"AAA": (70.0, 5.0), "BBB": (30.0, -2.0)})
+    monkeypatch.setattr(indicator_engine, 'watchlist_indicators', lambda symbols, **kwargs: indicators)
+    update_data.update_database(conn, 'Test')
+    new_version = database.get_data_version(conn.cursor())
+    assert new_version == version + 1
+    refreshed = watchlist_display.load_watchlist_page(db_path, 'Test', new_version)
+    assert list(refreshed['RSI']) == [30.0, 70.0]
+    database.close_connections()
+
+
+def test_pages_are_sorted_and_cut_in_sql(tmp_path):
+    watchlist_display.load_watchlist_page.clear()
+    symbols = [f"S{i:02d}" for i in range(7)]
+    conn = create_watchlist(tmp_path, symbols)
+    # RSI descends with the symbol number; S06 has none
+    conn.executemany("UPDATE watchlist_data SET rsi = ?, per_change = ? WHERE stock_symbol = ?",
+                     [(None if i == 6 else 60.0 - i, float(i % 3), symbol) for i, symbol in enumerate(symbols)])
+    # Ranks are read from the mapping rows, as written by every refresh
+    update_data.update_mapping_ranks(conn.cursor(), 'Test')
+    conn.commit()
+    db_path = database.database_path(conn)
+
+    def page(number, sort_by='RSI Rank', descending=False):
+        df = watchlist_display.load_watchlist_page(db_path, 'Test', 0, sort_by, descending, number, 3)
+        return [symbol.rsplit(':', 1)[1] for symbol in df['Symbol']], df
+
+    symbols_page, df = page(1)
+    assert symbols_page == ['S05', 'S04', 'S03']
+    assert list(df['RSI Rank']) == [1, 2, 3]
+    assert page(2)[0] == ['S02', 'S01', 'S00']
+    # Unranked stocks sort last in either direction
+    assert page(3)[0] == ['S06']
+    assert page(1, descending=True)[0] == ['S00', 'S01', 'S02']
+    assert page(3, descending=True)[0] == ['S06']
+    # Stored ranks cover the whole watchlist, not the page
+    assert list(page(1, 'Symbol')[1]['RSI Rank']) == [6, 5, 4]
+    database.close_connections()
+
+
+def test_watchlist_names_follow_edits(tmp_path):
+    watchlist_management.load_watchlist_names.clear()
+    conn = create_watchlist(tmp_path, ["AAA"])
+    cursor = conn.cursor()
+    assert watchlist_management.get_watchlists(cursor) == ['Test']
+
+    watchlist_management.insert_watchlist_name(cursor, 'Second')
+    assert sorted(watchlist_management.get_watchlists(cursor)) == ['Second', 'Test']
+    watchlist_management.update_watchlist_name(cursor, 'Second', 'Renamed')
+    assert sorted(watchlist_management.get_watchlists(cursor)) == ['Renamed', 'Test']
+    watchlist_management.delete_watchlist(cursor, 'Renamed')
+    assert watchlist_management.get_watchlists(cursor) == ['Test']
+    database.close_connections()
+
+
+def test_adding_and_removing_stocks_reranks_the_watchlist(tmp_path):
+    conn = create_watchlist(tmp_path, ["AAA", "BBB"])
+    conn.executemany("UPDATE watchlist_data SET rsi = ? WHERE stock_symbol = ?", [(70.0, 'AAA'), (30.0, 'BBB')])
+    update_data.update_mapping_ranks(conn.cursor(), 'Test')
+    conn.commit()
+
+    def ranks():
+        return dict(conn.execute('''
+            SELECT wd.stock_symbol, wsm.rsi_rank FROM watchlist_stock_mapping AS wsm
+            JOIN watchlist_data AS wd ON wsm.stock_id = wd.id
+        ''').fetchall())
+
+    # A stock already refreshed for another watchlist is ranked as soon as it is added
+    conn.execute("INSERT INTO watchlist_data (stock_symbol, rsi) VALUES ('CCC', 50.0)")
+    conn.commit()
+    watchlist_management.insert_stocks_from_csv(conn.cursor(), 'Test', 'CCC, DDD')
+    assert ranks() == {'AAA': 3, 'BBB': 1, 'CCC': 2, 'DDD': None}
+
+    assert watchlist_management.delete_stock_from_watchlist(conn.cursor(), 'Test', 'BBB')
+    assert ranks() == {'AAA': 2, 'CCC': 1, 'DDD': None}
+    database.close_connections()
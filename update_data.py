@@ -1,120 +1,173 @@
-import pandas as pd
 import logging
 import sqlite3
 
 import pytz
 
+from config import SCAN_MAX_WORKERS
+from database import bump_data_version, update_mapping_ranks
 from logging_utils import update_log_messages
 from datetime import datetime
-import get_nse_data
+import indicator_engine
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def update_database(db_conn,watchlist_name):
+WATCHLIST_METRICS_UPDATE = '''
+    UPDATE watchlist_data
+    SET
+        stock_price = ?,
+        per_change = ?,
+        dma_200_close = ?,
+        percent_away_from_dma_200 = ?,
+        dma_50_close = ?,
+        price_50dma_200dma = ?,
+        rsi = ?
+    WHERE stock_symbol = ?
+'''
+
+# Rank a watchlist's stocks by RSI and by Price % from 200 DMA (ascending) in one statement
+WATCHLIST_RANK_UPDATE = '''
+    UPDATE watchlist_data
+    SET rsi_rank = ranked.rsi_rank,
+        dma_200_rank = ranked.dma_200_rank
+    FROM (
+        SELECT wd.id,
+               -- Missing values sort last and get no rank
+               CASE WHEN wd.rsi IS NOT NULL
+                    THEN RANK() OVER (ORDER BY wd.rsi IS NULL, wd.rsi) END AS rsi_rank,
+               CASE WHEN wd.percent_away_from_dma_200 IS NOT NULL
+                    THEN RANK() OVER (ORDER BY wd.percent_away_from_dma_200 IS NULL,
+                                      wd.percent_away_from_dma_200) END AS dma_200_rank
+        FROM watchlist_data AS wd
+        JOIN watchlist_stock_mapping AS wsm ON wd.id = wsm.stock_id
+        JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+        WHERE wn.name = ?
+    ) AS ranked
+    WHERE watchlist_data.id = ranked.id
+'''
+
+def get_watchlist_symbols(cursor, watchlist_name):
+    cursor.execute('''
+        SELECT wd.stock_symbol
+        FROM watchlist_data AS wd
+        JOIN watchlist_stock_mapping AS wsm ON wd.id = wsm.stock_id
+        JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+        WHERE wn.name = ?
+    ''', (watchlist_name,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def indicator_rows(indicators):
+    # WATCHLIST_METRICS_UPDATE parameters, one tuple per symbol
+    return [
+        (
+            float(row['Close']),
+            float(row['% change for that Day']),
+            float(row['200 DMA (close)']),
+            float(row['Price % from 200 DMA']),
+            float(row['50 DMA (close)']),
+            bool(row['Price < 50DMA < 200DMA']),
+            float(row['RSI']),
+            sym,
+        )
+        for sym, row in indicators.iterrows()
+    ]
+
+
+def get_all_watchlist_symbols(cursor):
+    # Distinct symbols across every watchlist; watchlist_data has one row per symbol
+    cursor.execute('''
+        SELECT DISTINCT wd.stock_symbol
+        FROM watchlist_data AS wd
+        JOIN watchlist_stock_mapping AS wsm ON wd.id = wsm.stock_id
+        ORDER BY wd.stock_symbol
+    ''')
+    return [row[0] for row in cursor.fetchall()]
+
+
+def compute_indicators(symbols, incremental, max_workers, live=True, only_changed=False, progress_callback=None):
+    # Sync the missing tail of every symbol's history on a worker pool, then compute all
+    # indicators locally. The incremental path only folds new bars into indicator_state.
+    if incremental:
+        return indicator_engine.incremental_watchlist_indicators(symbols, live=live, max_workers=max_workers,
+                                                                 only_changed=only_changed,
+                                                                 progress_callback=progress_callback)
+    return indicator_engine.watchlist_indicators(symbols, live=live, max_workers=max_workers,
+                                                 progress_callback=progress_callback)
+
+
+def update_database(db_conn, watchlist_name, incremental=False, max_workers=SCAN_MAX_WORKERS, live=True):
+    cursor = db_conn.cursor()
     try:
-        cursor = db_conn.cursor()
+        symbols = get_watchlist_symbols(cursor, watchlist_name)
 
-        # Store the current UTC time as the "updated_at" timestamp
-        updated_at = datetime.now(pytz.utc)
+        # Nothing is written on this connection until the sync is done, so it never holds the
+        # write lock while the sync writer is storing history.
+        indicators = compute_indicators(symbols, incremental, max_workers, live=live)
 
-        # Update the database with the current timestamp in the updated_at column
+        for sym in symbols:
+            log_message = f'Processing symbol {sym}' if sym in indicators.index else f'No data for symbol {sym}'
+            logger.info(log_message)
+            update_log_messages(log_message)
+
+        # All metrics and both ranks in one transaction
+        cursor.executemany(WATCHLIST_METRICS_UPDATE, indicator_rows(indicators))
+        cursor.execute(WATCHLIST_RANK_UPDATE, (watchlist_name,))
+        update_mapping_ranks(cursor, watchlist_name)
+
+        # Stamp the current UTC time only once the refresh has completed
         cursor.execute('''
                     UPDATE watchlist_names
                     SET updated_at = ?
                     WHERE name = ?
-                ''', (updated_at, watchlist_name))
-
-        cursor.execute('''
-            SELECT wd.*
-            FROM watchlist_data AS wd
-            JOIN watchlist_stock_mapping AS wsm ON wd.id = wsm.stock_id
-            JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
-            WHERE wn.name = ?
-        ''', (watchlist_name,))
-        rows = cursor.fetchall()
-
-        # Create a list to store RSI and Price % from 200 DMA data and their corresponding row numbers
-        rsi_data = []
-        dma_data = []
-
-        # Assuming watchlist_data is a list of tuples
-        watchlist_df = pd.DataFrame(rows,
-                                    columns=['id','stock_symbol', 'stock_price', 'per_change',
-                                             'dma_200_close', 'percent_away_from_dma_200', 'dma_50_close',
-                                             'price_50dma_200dma', 'rsi', 'rsi_rank', 'dma_200_rank'])
-
-        for index, row in watchlist_df.iterrows():
-            sym = row[1]
-
-            # Get historical data
-            candles = get_nse_data.get_historical_data(sym)
-            df = pd.DataFrame(candles)
-
-            log_message = f'Processing symbol {sym}'
-            logger.info(log_message)
-            update_log_messages(log_message)
-
-            if not df.empty:
-                # Get the last row of the DataFrame
-                last_row = df.iloc[-1]
-
-                # Update the database with relevant data
-                cursor.execute(
-                    """
-                    UPDATE watchlist_data
-                    SET
-                        stock_price = ?,
-                        per_change = ?,
-                        dma_200_close = ?,
-                        percent_away_from_dma_200 = ?,
-                        dma_50_close = ?,
-                        price_50dma_200dma = ?,
-                        rsi = ?
-                    WHERE stock_symbol = ?
-                    """,
-                    (
-                        last_row['Close'],
-                        last_row['% change for that Day'],
-                        last_row['200 DMA (close)'],
-                        last_row['Price % from 200 DMA'],
-                        last_row['50 DMA (close)'],
-                        last_row['Price < 50DMA < 200DMA'],
-                        last_row['RSI'],
-                        sym,
-                    ),
-                )
-
-                # Store RSI and Price % from 200 DMA values and row number in the lists
-                rsi_data.append((last_row['RSI'], sym))
-                dma_data.append((last_row['Price % from 200 DMA'], sym))
-
-        # Rank the stocks based on RSI (ascending order)
-        rsi_data.sort(key=lambda x: x[0])
-        for rank, (rsi, symbol) in enumerate(rsi_data, start=1):
-            cursor.execute(
-                """
-                UPDATE watchlist_data
-                SET rsi_rank = ?
-                WHERE stock_symbol = ?
-                """,
-                (rank, symbol),
-            )
-
-        # Rank the stocks based on Price % from 200 DMA (ascending order)
-        dma_data.sort(key=lambda x: x[0])
-        for rank, (dma, symbol) in enumerate(dma_data, start=1):
-            cursor.execute(
-                """
-                UPDATE watchlist_data
-                SET dma_200_rank = ?
-                WHERE stock_symbol = ?
-                """,
-                (rank, symbol),
-            )
+                ''', (datetime.now(pytz.utc), watchlist_name))
+        # Invalidates the cached views of every watchlist; the updated stocks can be in several
+        bump_data_version(cursor)
 
         # Commit the changes to the database
         db_conn.commit()
     except sqlite3.Error as e:
+        db_conn.rollback()
         logger.error(f"Error updating database: {e}")
+        # Callers (refresh_worker, the scheduler) record the refresh as failed
+        raise
+
+
+def refresh_all_watchlists(db_conn, incremental=False, max_workers=SCAN_MAX_WORKERS, live=True, only_changed=False,
+                           progress_callback=None):
+    # Global refresh: every distinct symbol is synced and computed exactly once, then each
+    # watchlist is ranked from the shared results. Returns the refreshed watchlist names.
+    # only_changed (incremental only) skips symbols whose latest bar is already written.
+    cursor = db_conn.cursor()
+    try:
+        cursor.execute("SELECT name FROM watchlist_names ORDER BY id")
+        watchlists = [row[0] for row in cursor.fetchall()]
+        symbols = get_all_watchlist_symbols(cursor)
+
+        log_message = f'Refreshing {len(symbols)} distinct symbols across {len(watchlists)} watchlists'
+        logger.info(log_message)
+        update_log_messages(log_message)
+
+        indicators = compute_indicators(symbols, incremental, max_workers, live=live, only_changed=only_changed,
+                                        progress_callback=progress_callback)
+        logger.info(f"Writing metrics for {len(indicators)} of {len(symbols)} symbols")
+
+        cursor.executemany(WATCHLIST_METRICS_UPDATE, indicator_rows(indicators))
+        update_mapping_ranks(cursor)
+        # watchlist_data keeps one rank per stock; as with per-watchlist refreshes the last watchlist wins
+        for watchlist_name in watchlists:
+            cursor.execute(WATCHLIST_RANK_UPDATE, (watchlist_name,))
+
+        cursor.execute('''
+                    UPDATE watchlist_names
+                    SET updated_at = ?
+                ''', (datetime.now(pytz.utc),))
+        bump_data_version(cursor)
+
+        db_conn.commit()
+        return watchlists
+    except sqlite3.Error as e:
+        db_conn.rollback()
+        logger.error(f"Error refreshing all watchlists: {e}")
+        raise
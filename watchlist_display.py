@@ -1,120 +1,190 @@
+import math
+import threading
+import time
 from datetime import datetime
 import pandas as pd
 import pytz
 import streamlit as st
 
-def calculate_ranks(df):
-    # Calculate RSI Rank (ascending order)
-    df['RSI Rank'] = df['RSI'].rank(ascending=True, method='min')
-    # Calculate DMA 200 Rank (ascending order)
-    df['200 DMA Rank'] = df['% Away from 200 DMA'].rank(ascending=True, method='min')
-    return df
+from config import VIEW_CACHE_MAX_ENTRIES, WATCHLIST_PAGE_SIZE
+from database import database_path, get_connection, get_data_version
+
+TRADINGVIEW_URL = 'https://www.tradingview.com/chart/?symbol=NSE:'
+
+# Sort options shown in the UI -> column of WATCHLIST_PAGE_QUERY. Only these names reach ORDER BY.
+SORT_COLUMNS = {
+    'RSI Rank': 'wsm.rsi_rank',
+    '200 DMA Rank': 'wsm.dma_200_rank',
+    'RSI': 'wd.rsi',
+    '% Change': 'wd.per_change',
+    '% Away from 200 DMA': 'wd.percent_away_from_dma_200',
+    'Price': 'wd.stock_price',
+    'Symbol': 'wd.stock_symbol',
+}
+
+# One page of a watchlist. Ranks are the per-watchlist ranks stored on the mapping rows at every
+# refresh and membership change (database.MAPPING_RANK_UPDATE), so they cover the whole watchlist,
+# not the page.
+WATCHLIST_PAGE_QUERY = '''
+    SELECT
+        ? || wd.stock_symbol AS "Symbol",
+        wd.stock_price AS "Price",
+        wd.price_50dma_200dma AS "Price < 50DMA <200DMA",
+        wsm.rsi_rank AS "RSI Rank",
+        wsm.dma_200_rank AS "200 DMA Rank",
+        wd.rsi AS "RSI",
+        wd.per_change AS "% Change",
+        wd.dma_200_close AS "200 DMA Close",
+        wd.percent_away_from_dma_200 AS "% Away from 200 DMA",
+        wd.dma_50_close AS "50 DMA Close"
+    FROM watchlist_data AS wd
+    JOIN watchlist_stock_mapping AS wsm ON wd.id = wsm.stock_id
+    JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+    WHERE wn.name = ?
+    ORDER BY {column} IS NULL, {column} {direction}, wd.stock_symbol
+    LIMIT ? OFFSET ?
+'''
+
+# Render timings of the Display Watchlist table, see get_render_stats
+render_stats = {
+    'renders': 0,
+    'last_seconds': None,
+    'total_seconds': 0.0,
+}
+stats_lock = threading.Lock()
+
+
+def record_render(seconds):
+    with stats_lock:
+        render_stats['renders'] += 1
+        render_stats['last_seconds'] = seconds
+        render_stats['total_seconds'] += seconds
+
+
+def get_render_stats():
+    with stats_lock:
+        stats = dict(render_stats)
+    stats['average_seconds'] = stats['total_seconds'] / stats['renders'] if stats['renders'] else None
+    return stats
+
+
+def format_updated_at(timestamp_str):
+    # UTC timestamp as stored by update_database -> readable Asia/Kolkata time. Raises ValueError.
+    if '.' in timestamp_str:
+        # Split the timestamp string to separate milliseconds and time zone offset
+        timestamp_parts = timestamp_str.split(".")
+        timestamp_without_milliseconds = timestamp_parts[0]
+        milliseconds_and_timezone = timestamp_parts[1]  # Contains milliseconds and time zone offset
+
+        # Convert the string without milliseconds to a datetime object
+        timestamp_datetime = datetime.strptime(timestamp_without_milliseconds, "%Y-%m-%d %H:%M:%S")
+
+        # Extract milliseconds from the milliseconds_and_timezone string
+        milliseconds = int(milliseconds_and_timezone.split("+")[0])
+
+        # Truncate milliseconds to the maximum allowed microseconds value (999999)
+        microseconds = min(milliseconds * 1000, 999999)
+
+        # Add the extracted microseconds to the datetime object
+        timestamp_datetime = timestamp_datetime.replace(microsecond=microseconds)
+    else:
+        # If there are no milliseconds in the timestamp string
+        timestamp_datetime = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
 
-def create_tradingview_link(symbol):
-    tradingview_url = f"https://www.tradingview.com/chart/?symbol=NSE:{symbol}"
-    return f'<a href="{tradingview_url}" target="_blank">{symbol}</a>'
+    # Convert the datetime object to UTC timezone
+    utc_timezone = pytz.timezone('UTC')
+    timestamp_in_utc = utc_timezone.localize(timestamp_datetime)
 
-def display_watchlist_data(cursor, selected_watchlist):
+    # Convert UTC timestamp to IST timezone
+    ist_timezone = pytz.timezone('Asia/Kolkata')
+    timestamp_in_ist = timestamp_in_utc.astimezone(ist_timezone)
+
+    # Format the timestamp in a more readable way
+    return timestamp_in_ist.strftime("%Y-%m-%d %I:%M:%S %p")
+
+
+@st.cache_data(show_spinner=False, max_entries=VIEW_CACHE_MAX_ENTRIES)
+def load_watchlist_summary(db_path, selected_watchlist, data_version):
+    # (updated_at, number of stocks) of a watchlist, or None if it does not exist
+    cursor = get_connection(db_path).cursor()
     cursor.execute('''
-        SELECT
-            wd.stock_symbol,
-            wd.stock_price,
-            wd.per_change,
-            wd.dma_200_close,
-            wd.percent_away_from_dma_200,
-            wd.dma_50_close,
-            wd.price_50dma_200dma,
-            wd.rsi,
-            wn.updated_at  -- Include the updated_at column from watchlist_names
-        FROM watchlist_data AS wd
-        JOIN watchlist_stock_mapping AS wsm ON wd.id = wsm.stock_id
-        JOIN watchlist_names AS wn ON wsm.watchlist_id = wn.id
+        SELECT wn.updated_at, COUNT(wsm.id)
+        FROM watchlist_names AS wn
+        LEFT JOIN watchlist_stock_mapping AS wsm ON wsm.watchlist_id = wn.id
         WHERE wn.name = ?
+        GROUP BY wn.id
     ''', (selected_watchlist,))
+    return cursor.fetchone()
+
+
+@st.cache_data(show_spinner=False, max_entries=VIEW_CACHE_MAX_ENTRIES)
+def load_watchlist_page(db_path, selected_watchlist, data_version, sort_by='RSI Rank', descending=False, page=1,
+                        page_size=WATCHLIST_PAGE_SIZE):
+    # One sorted page read with LIMIT/OFFSET. Cached per watchlist, data version, sort and page,
+    # so reruns reuse it until update_database (or a watchlist edit) bumps the version.
+    column = SORT_COLUMNS[sort_by]
+    query = WATCHLIST_PAGE_QUERY.format(column=column, direction='DESC' if descending else 'ASC')
+    cursor = get_connection(db_path).cursor()
+    cursor.execute(query, (TRADINGVIEW_URL, selected_watchlist, page_size, (page - 1) * page_size))
+    df = pd.DataFrame(cursor.fetchall(), columns=[description[0] for description in cursor.description])
+    df['Price < 50DMA <200DMA'] = df['Price < 50DMA <200DMA'].astype('boolean')
+    return df
+
+
+def watchlist_column_config():
+    # Symbols are sent as TradingView URLs and shown as links, no pre-rendered HTML
+    return {
+        'Symbol': st.column_config.LinkColumn('Symbol', display_text=r'symbol=NSE:(.*)$'),
+        'Price < 50DMA <200DMA': st.column_config.CheckboxColumn('Price < 50DMA <200DMA'),
+        'RSI Rank': st.column_config.NumberColumn('RSI Rank', format='%d'),
+        '200 DMA Rank': st.column_config.NumberColumn('200 DMA Rank', format='%d'),
+    }
 
-    watchlist_data = cursor.fetchall()
 
-    if not watchlist_data:
+def display_watchlist_data(cursor, selected_watchlist):
+    started = time.perf_counter()
+    db_path = database_path(cursor.connection)
+    data_version = get_data_version(cursor)
+
+    summary = load_watchlist_summary(db_path, selected_watchlist, data_version)
+    if summary is None or summary[1] == 0:
         st.warning("No data available for the selected watchlist.")
-    else:
-        # Convert the result to a DataFrame and add column names
-        column_names = [description[0] for description in cursor.description]
-        df = pd.DataFrame(watchlist_data, columns=column_names)
-
-        custom_column_names = {
-            'stock_symbol': 'Symbol',
-            'stock_price': 'Price',
-            'price_50dma_200dma': 'Price < 50DMA <200DMA',
-            'rsi': 'RSI',
-            'per_change': '% Change',
-            'dma_200_close': '200 DMA Close',
-            'percent_away_from_dma_200': '% Away from 200 DMA',
-            'dma_50_close': '50 DMA Close',
-            'updated_at': 'Updated At'  # Rename the updated_at column
-        }
-        # Define a dictionary to map original column names to custom names
-
-        # Rename the columns using the custom names
-        df = df.rename(columns=custom_column_names)
-
-        # Calculate RSI Rank and DMA 200 Rank and update them in the DataFrame
-        df = calculate_ranks(df)
-
-        # Add TradingView links to the Symbol column
-        df['Symbol'] = df['Symbol'].apply(create_tradingview_link)
-
-        # Rearrange column order as per your requirement
-        column_order = ['Symbol', 'Price', 'Price < 50DMA <200DMA', 'RSI Rank', '200 DMA Rank', 'RSI']
-        remaining_columns = [col for col in df.columns if col not in column_order]
-        column_order += remaining_columns
-
-        df = df[column_order]
-
-        # Assuming df['Updated At'].iloc[0] is a string representation of a timestamp
-        timestamp_str = df['Updated At'].iloc[0]
-
-        try:
-            if '.' in timestamp_str:
-                # Split the timestamp string to separate milliseconds and time zone offset
-                timestamp_parts = timestamp_str.split(".")
-                timestamp_without_milliseconds = timestamp_parts[0]
-                milliseconds_and_timezone = timestamp_parts[1]  # Contains milliseconds and time zone offset
-
-                # Convert the string without milliseconds to a datetime object
-                timestamp_datetime = datetime.strptime(timestamp_without_milliseconds, "%Y-%m-%d %H:%M:%S")
-
-                # Extract milliseconds from the milliseconds_and_timezone string
-                milliseconds = int(milliseconds_and_timezone.split("+")[0])
-
-                # Truncate milliseconds to the maximum allowed microseconds value (999999)
-                microseconds = min(milliseconds * 1000, 999999)
-
-                # Add the extracted microseconds to the datetime object
-                timestamp_datetime = timestamp_datetime.replace(microsecond=microseconds)
-            else:
-                # If there are no milliseconds in the timestamp string
-                timestamp_datetime = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-
-            # Convert the datetime object to UTC timezone
-            utc_timezone = pytz.timezone('UTC')
-            timestamp_in_utc = utc_timezone.localize(timestamp_datetime)
-
-            # Convert UTC timestamp to IST timezone
-            ist_timezone = pytz.timezone('Asia/Kolkata')
-            timestamp_in_ist = timestamp_in_utc.astimezone(ist_timezone)
-
-            # Format the timestamp in a more readable way
-            formatted_time = timestamp_in_ist.strftime("%Y-%m-%d %I:%M:%S %p")
-
-            # Display the formatted timestamp
-            st.markdown(f"### Watchlist Data: Updated At {formatted_time} (Asia/Kolkata) and {timestamp_str} (UTC)")
-
-            # Display the DataFrame as a table with custom headers
-            st.write(df.drop(columns=['Updated At']).to_html(escape=False), unsafe_allow_html=True)  # Exclude Updated At from table display
-
-        except ValueError as e:
-            st.error("Error: Invalid timestamp format.")
-            st.write(e)
-        except Exception as e:
-            st.error("An error occurred while processing the timestamp.")
-            st.write(e)
+        return
+    timestamp_str, total_rows = summary
+
+    try:
+        formatted_time = format_updated_at(timestamp_str)
+    except ValueError as e:
+        st.error("Error: Invalid timestamp format.")
+        st.write(e)
+        return
+    except Exception as e:
+        st.error("An error occurred while processing the timestamp.")
+        st.write(e)
+        return
+
+    # Display the formatted timestamp
+    st.markdown(f"### Watchlist Data: Updated At {formatted_time} (Asia/Kolkata) and {timestamp_str} (UTC)")
+
+    # Sorting and paging happen in SQL; only the visible page is sent to the browser
+    pages = max(1, math.ceil(total_rows / WATCHLIST_PAGE_SIZE))
+    if st.session_state.get('watchlist_page', 1) > pages:
+        st.session_state.watchlist_page = pages
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        sort_by = st.selectbox("Sort by", list(SORT_COLUMNS), key="watchlist_sort")
+    with col2:
+        descending = st.toggle("Descending", key="watchlist_descending")
+    with col3:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="watchlist_page")
+
+    df = load_watchlist_page(db_path, selected_watchlist, data_version, sort_by, descending, int(page),
+                             WATCHLIST_PAGE_SIZE)
+    st.dataframe(df, column_config=watchlist_column_config(), hide_index=True, use_container_width=True)
+
+    record_render(time.perf_counter() - started)
+    stats = get_render_stats()
+    first_row = (int(page) - 1) * WATCHLIST_PAGE_SIZE + 1
+    st.caption(f"Rows {first_row}-{first_row + len(df) - 1} of {total_rows}. "
+               f"Rendered in {stats['last_seconds'] * 1000:.0f} ms "
+               f"(average {stats['average_seconds'] * 1000:.0f} ms over {stats['renders']} renders).")
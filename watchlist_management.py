@@ -1,56 +1,32 @@
 import csv
 import sqlite3
 
+import pandas as pd
 import streamlit as st
 
-from update_data import update_database
+from config import VIEW_CACHE_MAX_ENTRIES
+from database import bump_data_version, database_path, get_connection, get_data_version, init_schema, \
+    update_mapping_ranks
+from job_queue import enqueue_refresh, get_queue_depth, get_recent_jobs
 
 
 def create_watchlist_tables(cursor):
-    # Create a table to store watchlist names
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS watchlist_names (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP  -- Add updated_at column
-        )
-    ''')
-
-    # Create a table to store watchlist data with a UNIQUE constraint on stock_symbol
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS watchlist_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            stock_symbol TEXT UNIQUE,  -- Add UNIQUE constraint here
-            stock_price REAL,
-            per_change REAL,
-            dma_200_close REAL,
-            percent_away_from_dma_200 REAL,
-            dma_50_close REAL,
-            price_50dma_200dma REAL,
-            rsi REAL,
-            rsi_rank INTEGER,
-            dma_200_rank INTEGER
-        )
-    ''')
-
-    # Create a table to store the mapping between watchlists and stocks
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS watchlist_stock_mapping (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            watchlist_id INTEGER,
-            stock_id INTEGER,
-            FOREIGN KEY (watchlist_id) REFERENCES watchlist_names (id),
-            FOREIGN KEY (stock_id) REFERENCES watchlist_data (id)
-        )
-    ''')
+    # Create or upgrade the watchlist tables and their join indexes (see database.MIGRATIONS).
+    # Runs once per process and database file, not on every rerun.
+    init_schema(cursor.connection)
 
 
+@st.cache_data(show_spinner=False, max_entries=VIEW_CACHE_MAX_ENTRIES)
+def load_watchlist_names(db_path, data_version):
+    # Cached per database and data version; any write to the watchlists bumps the version
+    cursor = get_connection(db_path).cursor()
+    cursor.execute("SELECT name FROM watchlist_names")
+    return [row[0] for row in cursor.fetchall()]
+
 
 def get_watchlists(cursor):
     try:
-        cursor.execute("SELECT name FROM watchlist_names")
-        watchlists = cursor.fetchall()
-        return [row[0] for row in watchlists]
+        return load_watchlist_names(database_path(cursor.connection), get_data_version(cursor))
     except sqlite3.Error as e:
         print(f"Error retrieving watchlists: {e}")
         return []
@@ -59,6 +35,7 @@ def get_watchlists(cursor):
 def insert_watchlist_name(cursor, watchlist_name):
     try:
         cursor.execute("INSERT INTO watchlist_names (name) VALUES (?)", (watchlist_name,))
+        bump_data_version(cursor)
         return True  # Return True on success
     except sqlite3.Error as e:
         print(f"Error inserting watchlist name: {e}")
@@ -117,7 +94,10 @@ def insert_stocks_from_csv(cursor, watchlist_name, csv_content):
                             failed_stocks.append(stock_symbol)
                             stocks_failed += 1
 
+            # New members are ranked from their stored metrics, the rest of the watchlist re-ranked around them
+            update_mapping_ranks(cursor, watchlist_name)
             # Commit the changes to the database
+            bump_data_version(cursor)
             cursor.connection.commit()
 
             return stocks_added, stocks_failed, failed_stocks
@@ -134,6 +114,7 @@ def insert_stocks_from_csv(cursor, watchlist_name, csv_content):
 def update_watchlist_name(cursor, old_name, new_name):
     try:
         cursor.execute("UPDATE watchlist_names SET name = ? WHERE name = ?", (new_name, old_name))
+        bump_data_version(cursor)
         return True  # Return True on success
     except sqlite3.Error as e:
         print(f"Error updating watchlist name: {e}")
@@ -165,8 +146,10 @@ def delete_stock_from_watchlist(cursor, selected_watchlist, stock_to_delete):
                     DELETE FROM watchlist_stock_mapping
                     WHERE watchlist_id = ? AND stock_id = ?
                 """, (watchlist_id[0], stock_id[0]))
+                update_mapping_ranks(cursor, selected_watchlist)
 
                 # Commit the changes to the database
+                bump_data_version(cursor)
                 cursor.connection.commit()
 
                 return True
@@ -201,6 +184,7 @@ def delete_watchlist(cursor, watchlist_name):
     try:
         cursor.execute("DELETE FROM watchlist_names WHERE name = ?", (watchlist_name,))
         cursor.execute("DELETE FROM watchlist_stock_mapping WHERE watchlist_id IN (SELECT id FROM watchlist_names WHERE name = ?)", (watchlist_name,))
+        bump_data_version(cursor)
         cursor.connection.commit()
         return True
     except sqlite3.Error as e:
@@ -214,11 +198,15 @@ def manage_watchlists(cursor, conn):
     #Relaod All
     st.subheader(f"Reload All Data")
     if st.button("Reload All"):
-        watchlists = get_watchlists(cursor)
-        for watchlist_name in watchlists:
-            with st.spinner(f"Reloading data for '{watchlist_name}'..."):
-                update_database(conn, watchlist_name)
-                st.success(f"Data for '{watchlist_name}' reloaded.")
+        # The refresh itself runs in refresh_worker.py; the app only queues it
+        job_id = enqueue_refresh(cursor, 'all')
+        st.success(f"Reload of all watchlists queued (job {job_id}).")
+
+    # Latest refresh jobs and their outcome
+    recent_jobs = get_recent_jobs(cursor)
+    if recent_jobs:
+        st.caption(f"Refresh jobs waiting: {get_queue_depth(cursor)}. Run `python refresh_worker.py` to process them.")
+        st.dataframe(pd.DataFrame(recent_jobs), hide_index=True)
 
     # User interaction section
     watchlist_name = st.text_input("Enter a new watchlist name:")